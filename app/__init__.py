@@ -15,28 +15,70 @@ def create_app(config_class=Config):
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_object(config_class)  # Load configuration from Config class
 
+    if app.config.get('PROXY_FIX_X_FOR'):
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR']) # request.remote_addr from X-Forwarded-For
+
+    from .database import init_database
+    init_database(app) # SQLite pragmas, pool and busy retries; before the engine is created
+    from .routing import init_routing
+    init_routing(app) # Read replica binds, each with its own pool
+
     # Initialize extensions
     db.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login' # Set the login page endpoint
     migrate.init_app(app, db) # Initialize Migrate
 
+    from .hashing import init_hashing
+    init_hashing(app) # Password hashing backend (inline or process pool)
+
+    from .ratelimit import init_rate_limits
+    init_rate_limits(app) # Token bucket store for login throttling
+
+    from .broker import init_broker
+    init_broker(app) # Pub/sub for the live message inbox
+
+    from .instrumentation import init_instrumentation
+    init_instrumentation(app) # Request, SQL and template timings; X-Profile
+
+    from .querycount import init_query_detector
+    init_query_detector(app) # N+1 warnings in debug and tests
+
+    from .jobs import init_jobs
+    init_jobs(app) # Background jobs; inline in debug and tests, otherwise `flask worker`
+
     # Register blueprints
-    from .blueprints import auth, admin, sponsor, influencer, main
+    from .blueprints import auth, admin, sponsor, influencer, inbox, metrics, main
     app.register_blueprint(auth.bp, url_prefix='/auth')
     app.register_blueprint(admin.bp, url_prefix='/admin')
     app.register_blueprint(sponsor.bp, url_prefix='/sponsor')
     app.register_blueprint(influencer.bp, url_prefix='/influencer')
+    app.register_blueprint(inbox.bp, url_prefix='/inbox')
+    app.register_blueprint(metrics.bp)
     app.register_blueprint(main.bp)
 
+    # Register CLI commands
+    from .commands import register_commands
+    register_commands(app)
+
     # User loader function should be outside of create_app()
-    @login_manager.user_loader
-    def load_user(user_id):
-        """User loader function for Flask-Login."""
-        return User.query.get(int(user_id))  # Fetch the user from the database
+    from .identity import init_identity_cache, load_user
+    init_identity_cache(app)
+    login_manager.user_loader(load_user) # Served from the identity cache
+
+    from .fragment_cache import init_fragment_cache
+    init_fragment_cache(app)
+
+    from .matching import init_matching
+    init_matching(app)
 
     with app.app_context():
         db.create_all() # Create all tables 
+
+        from .search import init_search
+        init_search(app) # Create and sync the full-text search tables
+        from . import rollups, timeseries, inbox, conversations, fragment_cache, matching, notifications, lifecycle # Registers the analytics, activity, inbox, conversation, cache and matching listeners, and the job handlers
         #Print all templates
         print(app.jinja_loader.list_templates())
     return app
@@ -2,32 +2,71 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from flask_login import login_required, current_user
+import io
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort,
+                   Response, stream_with_context, current_app)
+from flask_login import login_required, current_user
+from datetime import date, timedelta
+
+from ..export import EXPORTS, FORMATS, export_query, stream_export, export_filename
+from ..importer import IMPORTS, read_rows, format_for, run_import
+from ..jobs import queue_stats
+from ..lifecycle import reopen_if_extended
+from ..hashing import PoolHasher
+from ..fragment_cache import fragment_key, cached_fragment, conditional, etag_for, html, fragment_cache
 from ..forms import AdminUserEditForm, EditCampaignForm, EditAdRequestForm, CategoryForm, SettingsForm
-from ..models import db, User, Campaign, AdRequest, Message, Category 
+from ..models import db, User, Campaign, AdRequest, Message, Category, InfluencerStats, SponsorStats, CategoryStats
+from ..identity import invalidate_user
+from ..pagination import keyset_paginate
+from ..rollups import platform_stat
+from ..search import search_users, search_campaigns
+from ..timeseries import funnel, series, GRANULARITIES, COUNT_METRICS, SPEND_METRIC, SPEND_SCOPES
+from ..querycount import query_budget
+from ..routing import read_replica
 from ..utils import admin_required
+from sqlalchemy.orm import joinedload
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+MESSAGES_PER_PAGE = 50
+MAX_PER_PAGE = 200
+SEARCH_PER_PAGE = 25
+TOP_N = 10
+MAX_REPORTED_REJECTS = 100
+FUNNEL_SPANS = {'day': timedelta(days=29), 'week': timedelta(weeks=11), 'month': timedelta(days=334)}
+
+
+def _id_arg(name, default=None):
+    """An integer id from the query string; blank counts as absent.
+
+    Raises ValueError for anything else, so a mistyped filter fails instead
+    of being dropped and widening the query to every row.
+    """
+    value = request.args.get(name, '').strip()
+    if not value:
+        return default
+    if not value.isdigit():
+        raise ValueError(f'{name} must be an integer id.')
+    return int(value)
+
 
 
 
 @bp.route('/users')
+@query_budget(4)
 @login_required
 @admin_required
+@read_replica
 def manage_users():
     """List and manage all users."""
     search_query = request.args.get('search', '')
+    page = max(request.args.get('page', 1, type=int), 1)
 
-    # Filter users based on search query
-    users = User.query.filter(
-        db.or_(
-            User.username.ilike(f'%{search_query}%'),  
-            User.email.ilike(f'%{search_query}%')      
-        )
-    ).all()
+    # Ranked full-text search over username and email
+    users = search_users(search_query, page=page, per_page=SEARCH_PER_PAGE)
 
     return render_template('admin/manage_users.html', users=users)
 
@@ -48,6 +87,7 @@ def edit_user(user_id):
         user.is_flagged = form.is_flagged.data
         user.notes = form.notes.data
         db.session.commit()
+        invalidate_user(user.id)
         flash('User updated successfully', 'success')
         return redirect(url_for('admin.manage_users'))
         
@@ -61,6 +101,7 @@ def delete_user(user_id):
     user = User.query.get_or_404(user_id)
     db.session.delete(user)
     db.session.commit()
+    invalidate_user(user_id)
     flash('User deleted successfully', 'success')
     return redirect(url_for('admin.manage_users'))
 
@@ -72,30 +113,32 @@ def flag_user(user_id):
     user = User.query.get_or_404(user_id)
     user.is_flagged = not user.is_flagged  # Toggle flagged status
     db.session.commit()
+    invalidate_user(user_id)
     flash('User flagged status updated', 'success')
     return redirect(url_for('admin.manage_users'))  # Or redirect to flagged users list
 
 @bp.route('/flagged_users')
 @login_required
 @admin_required
+@read_replica
 def flagged_users():
     """List flagged users."""
     users = User.query.filter_by(is_flagged=True).all()
     return render_template('admin/flagged_users.html', users=users)
 
 @bp.route('/campaigns')
+@query_budget(4)
 @login_required
 @admin_required
+@read_replica
 def manage_campaigns():
     """List all campaigns."""
     search_query = request.args.get('search', '')
-    campaigns = Campaign.query.filter(
-        db.or_(
-            Campaign.name.ilike(f'%{search_query}%'),  
-            Campaign.sponsor.has(User.username.ilike(f'%{search_query}%')) 
-        )
-    ).all()
-   
+    page = max(request.args.get('page', 1, type=int), 1)
+
+    # Ranked full-text search over name, description, goals and sponsor username
+    campaigns = search_campaigns(search_query, page=page, per_page=SEARCH_PER_PAGE)
+
     return render_template('admin/manage_campaigns.html', campaigns=campaigns)
 
 
@@ -104,8 +147,29 @@ def manage_campaigns():
 @admin_required
 def view_campaign(campaign_id):
     """View details of a specific campaign."""
-    campaign = Campaign.query.get_or_404(campaign_id)  # Fetch the campaign by ID
-    return render_template('admin/view_campaign.html', campaign=campaign)
+    def render_detail():
+        campaign = Campaign.query.options(joinedload(Campaign.sponsor)).filter_by(id=campaign_id).first()
+        if campaign is None:
+            return None
+        return {'html': render_template('admin/_campaign_detail.html', campaign=campaign)}
+
+    def render_ad_requests():
+        ad_requests = (AdRequest.query.options(joinedload(AdRequest.influencer))
+                       .filter_by(campaign_id=campaign_id).order_by(AdRequest.id).all())
+        return {'html': render_template('admin/_campaign_ad_requests.html', ad_requests=ad_requests)}
+
+    # Both blocks are cached per version, so an unchanged campaign renders without queries
+    detail_key = fragment_key('admin_campaign_detail', [('campaign', campaign_id)])
+    ad_requests_key = fragment_key('admin_campaign_ad_requests', [('campaign_ad_requests', campaign_id)])
+    detail = cached_fragment(detail_key, render_detail)
+    if detail is None:
+        abort(404)
+
+    def build():
+        ad_requests = cached_fragment(ad_requests_key, render_ad_requests)
+        return render_template('admin/view_campaign.html', detail=html(detail['html']),
+                               ad_requests_table=html(ad_requests['html']))
+    return conditional(etag_for(detail_key, ad_requests_key, current_user.id), build)
 
 @bp.route('/edit_campaign/<int:campaign_id>', methods=['GET', 'POST'])
 @login_required
@@ -113,7 +177,7 @@ def view_campaign(campaign_id):
 def edit_campaign(campaign_id):
     """Edit campaign details."""
     campaign = Campaign.query.get_or_404(campaign_id)
-    form = EditCampaignForm(obj=campaign)
+    form = EditCampaignForm(campaign)
 
     if form.validate_on_submit():
         # Update the campaign with form data (similar to how you did in edit_user)
@@ -121,9 +185,11 @@ def edit_campaign(campaign_id):
         campaign.description = form.description.data
         campaign.start_date = form.start_date.data
         campaign.end_date = form.end_date.data
+        reopen_if_extended(campaign)  # expired ad requests stay expired
         campaign.budget = form.budget.data
         campaign.visibility = form.visibility.data
         campaign.goals = form.goals.data
+        campaign.category_id = form.category.data or None
         db.session.commit()
         flash('Campaign updated successfully!', 'success')
         return redirect(url_for('admin.manage_campaigns'))
@@ -142,12 +208,15 @@ def delete_campaign(campaign_id):
     return redirect(url_for('admin.manage_campaigns'))
 
 @bp.route('/ad_requests')
+@query_budget(4)
 @login_required
 @admin_required
+@read_replica
 def manage_ad_requests():
     """List all ad requests."""
-    ad_requests = AdRequest.query.all()
-    return render_template('admin/manage_ad_requests.html', ad_requests=ad_requests)
+    ad_requests = (AdRequest.query.options(joinedload(AdRequest.campaign), joinedload(AdRequest.influencer))
+                   .order_by(AdRequest.id).all())
+    return render_template('admin/manage_ad_request.html', ad_requests=ad_requests)
 
 @bp.route('/view_ad_request/<int:ad_request_id>')
 @login_required
@@ -241,26 +310,179 @@ def delete_category(category_id):
     return redirect(url_for('admin.manage_categories'))
 
 @bp.route('/messages')
+@query_budget(4)
 @login_required
 @admin_required
+@read_replica
 def manage_messages():
-    """View and manage messages between users."""
-    messages = Message.query.all() 
-    return render_template('admin/manage_messages.html', messages=messages)
+    """View and manage messages between users, newest first."""
+    try:
+        filters = {name: _id_arg(name) for name in ('sender_id', 'recipient_id', 'ad_request_id')}
+    except ValueError as e:
+        abort(400, description=str(e))
+    per_page = min(request.args.get('per_page', MESSAGES_PER_PAGE, type=int), MAX_PER_PAGE)
+
+    # Senders, recipients and campaign names come back in the same query as
+    # the page itself instead of being lazy loaded row by row in the template.
+    query = Message.query.options(
+        joinedload(Message.sender),
+        joinedload(Message.recipient),
+        joinedload(Message.ad_request).joinedload(AdRequest.campaign).load_only(Campaign.name),
+    )
+    for column, value in filters.items():
+        if value is not None:
+            query = query.filter(getattr(Message, column) == value)
+
+    page = keyset_paginate(query, [Message.timestamp, Message.id],
+                           cursor=request.args.get('cursor'), per_page=max(per_page, 1))
+    return render_template('admin/manage_messages.html', messages=page, page=page, filters=filters)
+
+@bp.route('/delete_message/<int:message_id>')
+@login_required
+@admin_required
+def delete_message(message_id):
+    """Delete a message."""
+    message = Message.query.get_or_404(message_id)
+    db.session.delete(message)
+    db.session.commit()
+    flash('Message deleted successfully!', 'success')
+    return redirect(url_for('admin.manage_messages'))
+
+
 
+@bp.route('/export/<kind>')
+@login_required
+@admin_required
+def export(kind):
+    """Stream campaigns, ad requests or messages as CSV or NDJSON."""
+    if kind not in EXPORTS:
+        abort(404)
+    fmt = request.args.get('format', 'csv')
+    compress = request.args.get('gzip', type=int) == 1
+    try:
+        filters = {name: _id_arg(name) if name.endswith('_id') else request.args.get(name)
+                   for name in EXPORTS[kind][3]}
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else None
+        chunks = stream_export(export_query(kind, filters, start, end), fmt, compress)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    filename = export_filename(kind, fmt, compress)
+    return Response(stream_with_context(chunks),
+                    mimetype='application/gzip' if compress else FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@bp.route('/import/<kind>', methods=['POST'])
+@login_required
+@admin_required
+def import_rows(kind):
+    """Load users, campaigns or categories from an uploaded CSV or NDJSON file."""
+    if kind not in IMPORTS:
+        abort(404)
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify(error='Attach a CSV or NDJSON file as "file".'), 400
+
+    rejects = []
+
+    def report(n, row, reason):
+        # Only the first few are returned; summary['rejected'] has the total
+        if len(rejects) < MAX_REPORTED_REJECTS:
+            rejects.append({'record': n, 'error': reason})
+
+    source = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    # Passwords go to the app's hasher pool when it has one; the inline
+    # hasher would hash a whole upload in this thread, so bring a pool
+    inline = kind == 'users' and not isinstance(current_app.extensions.get('password_hasher'), PoolHasher)
+    pool = ProcessPoolExecutor(current_app.config.get('PASSWORD_HASH_WORKERS')) if inline else nullcontext()
+    try:
+        with pool as executor:
+            summary = run_import(kind, read_rows(source, format_for(upload.filename)), executor=executor,
+                                 on_reject=report)
+    except UnicodeDecodeError:
+        db.session.rollback()  # chunks before the bad bytes stay committed
+        return jsonify(error='The file is not UTF-8 text.'), 400
+
+    summary['rejects'] = rejects
+    return jsonify(summary)
+
+@bp.route('/cache_stats')
+@login_required
+@admin_required
+def cache_stats():
+    """Hit, miss and eviction counts for the fragment and identity caches."""
+    return jsonify(fragments=fragment_cache().stats(),
+                   identity=current_app.extensions['identity_cache'].stats())
+
+@bp.route('/jobs')
+@login_required
+@admin_required
+def jobs():
+    """Background job queue depth and recent latency as JSON."""
+    return jsonify(queue_stats())
 
+@bp.route('/slow_queries')
+@login_required
+@admin_required
+def slow_queries():
+    """The most recent statements over SLOW_QUERY_THRESHOLD, newest first, with their stacks."""
+    return jsonify(current_app.extensions['slow_queries'].samples())
 
 @bp.route('/analytics')
 @login_required
 @admin_required
+@read_replica
 def analytics():
     """Display various analytics and statistics."""
-    # Example analytics:
-    top_categories = db.session.query(Category.name, db.func.count(User.id)).join(User).filter(User.role=='influencer').group_by(Category.name).order_by(db.func.count(User.id).desc()).all()
-
-    top_influencers = db.session.query(User.username, db.func.count(AdRequest.id)).join(AdRequest, User.id==AdRequest.influencer_id).filter(User.role=='influencer').group_by(User.username).order_by(db.func.count(AdRequest.id).desc()).all()
-    total_spending = db.session.query(db.func.sum(AdRequest.payment_amount)).filter(AdRequest.status == 'accepted').scalar()
-    return render_template('admin/analytics.html', top_categories=top_categories, top_influencers=top_influencers, total_spending=total_spending)
+    # Reads the rollup tables maintained by app/rollups.py instead of
+    # aggregating over every user and ad request on each page view.
+    top_categories = db.session.query(Category.name, CategoryStats.influencer_count).join(CategoryStats).order_by(CategoryStats.influencer_count.desc()).limit(TOP_N).all()
+
+    top_influencers = db.session.query(User.username, InfluencerStats.request_count).join(InfluencerStats, User.id==InfluencerStats.influencer_id).filter(User.role=='influencer').order_by(InfluencerStats.request_count.desc()).limit(TOP_N).all()
+    top_sponsors = db.session.query(User.username, SponsorStats.accepted_spend).join(SponsorStats, User.id==SponsorStats.sponsor_id).order_by(SponsorStats.accepted_spend.desc()).limit(TOP_N).all()
+    total_spending = platform_stat('accepted_spend')
+
+    # Ad request funnel over the most recent buckets from the activity store
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        granularity = 'day'
+    end = date.today()
+    start = end - FUNNEL_SPANS[granularity]
+    activity = funnel(granularity, start, end)
+    return render_template('admin/analytics.html', top_categories=top_categories, top_influencers=top_influencers, top_sponsors=top_sponsors, total_spending=total_spending, activity=activity, granularity=granularity)
+
+@bp.route('/analytics/series')
+@login_required
+@admin_required
+@read_replica
+def analytics_series():
+    """Return one activity series as JSON.
+
+    Query args: metric (created, accepted, rejected, negotiate, accepted_spend),
+    granularity (day, week, month), start/end (YYYY-MM-DD) and, for
+    accepted_spend, scope (sponsor, category) with scope_id.
+    """
+    metric = request.args.get('metric', 'created')
+    granularity = request.args.get('granularity', 'day')
+    scope = request.args.get('scope', '')
+    try:
+        scope_id = _id_arg('scope_id', 0)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    if metric not in COUNT_METRICS + (SPEND_METRIC,) or granularity not in GRANULARITIES:
+        return jsonify(error='Unknown metric or granularity.'), 400
+    if scope not in SPEND_SCOPES or (scope and (metric != SPEND_METRIC or not scope_id)):
+        return jsonify(error='Scopes apply to accepted_spend and need a scope_id.'), 400
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify(error='Dates must be YYYY-MM-DD.'), 400
+
+    points = series(metric, granularity, start, end, scope=scope, scope_id=scope_id)
+    return jsonify(metric=metric, granularity=granularity, scope=scope, scope_id=scope_id,
+                   points=[{'bucket': bucket.isoformat(), 'value': value} for bucket, value in points])
 
 @bp.route('/settings', methods=['GET', 'POST'])
 @login_required
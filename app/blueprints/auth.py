@@ -1,8 +1,11 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, session
+from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
 
 from ..forms import LoginForm, RegistrationForm
+from ..hashing import password_needs_rehash
+from ..identity import invalidate_user
 from ..models import db, User
+from ..ratelimit import check_login_rate
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
@@ -42,10 +45,16 @@ def login():
         flash('You are already logged in.', 'info')
         return redirect(url_for('main.index')) 
     elif form.validate_on_submit(): # validate on submit instead of only if
+        # Throttle before any password hashing happens
+        check_login_rate(request.remote_addr, form.username.data)
         user = User.query.filter_by(username=form.username.data).first()  
         if user and user.check_password(form.password.data):
+            if password_needs_rehash(user.password_hash):
+                # Upgrade hashes made with older parameters while we have the password
+                user.set_password(form.password.data)
+                db.session.commit()
+                invalidate_user(user.id)
             login_user(user) 
-            session['role'] = user.role
             next_page = request.args.get('next')
             return redirect(next_page or url_for('main.index')) 
         else:
@@ -0,0 +1,43 @@
+from flask import Blueprint, Response, request, current_app, stream_with_context, render_template, g
+from flask_login import login_required, current_user
+
+from ..conversations import thread_page, mark_read
+from ..inbox import stream_inbox
+from ..models import db
+from ..utils import participant_required
+
+bp = Blueprint('inbox', __name__, url_prefix='/inbox')
+
+
+@bp.route('/stream')
+@login_required
+def stream():
+    """Push the current user's new messages as Server-Sent Events."""
+    # Browsers send Last-Event-ID on reconnect; pages may pass the newest id they rendered
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('last_event_id', type=int)
+
+    events = stream_inbox(current_user.id, last_id,
+                          heartbeat=current_app.config.get('INBOX_HEARTBEAT', 15),
+                          timeout=current_app.config.get('INBOX_STREAM_TIMEOUT', 300))
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@bp.route('/thread/<int:ad_request_id>')
+@login_required
+@participant_required
+def thread(ad_request_id):
+    """Show the messages on an ad request, newest page first."""
+    ad_request = g.ad_request  # Loaded with its campaign and participant-checked
+    cursor = request.args.get('cursor')
+    page = thread_page(ad_request_id, cursor=cursor)
+
+    if cursor is None:
+        # Opening the newest page counts as reading the whole thread
+        mark_read(current_user.id, ad_request_id)
+        db.session.commit()
+
+    return render_template('inbox/thread.html', ad_request=ad_request, page=page,
+                           messages=list(reversed(page.items)))
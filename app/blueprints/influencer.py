@@ -1,8 +1,17 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, abort, g, request, current_app
 from flask_login import login_required, current_user
 
-from ..forms import InfluencerProfileForm, AdRequestResponseForm
-from ..models import db, User, AdRequest, Message, Campaign, SocialMediaLink
+from sqlalchemy.orm import contains_eager
+
+from ..conversations import unread_counts
+from ..discovery import discover_page, feed_filters, filters_key
+from ..fragment_cache import fragment_key, cached_fragment, conditional, etag_for, html
+from ..forms import InfluencerProfileForm, AdRequestResponseForm, DiscoverForm
+from ..models import db, User, AdRequest, Campaign, SocialMediaLink
+from ..identity import invalidate_user
+from ..querycount import query_budget
+from ..routing import read_replica
+from ..notifications import queue_message
 from ..utils import influencer_required  , flash_errors
 
 bp = Blueprint('influencer', __name__, url_prefix='/influencer')
@@ -36,6 +45,7 @@ def profile():
                 current_user.social_media_links.append(link)
 
             db.session.commit()
+            invalidate_user(current_user.id)
             flash('Profile updated successfully!', 'success')
             return redirect(url_for('influencer.profile'))
         except Exception as e:
@@ -45,25 +55,31 @@ def profile():
 
 
 @bp.route('/ad_requests')
+@query_budget(5)
 @login_required
 @influencer_required
+@read_replica
 def ad_requests():
-    """View all ad requests for the influencer."""
-    ad_requests = AdRequest.query.filter_by(influencer_id=current_user.id).all()
-    return render_template('influencer/ad_requests.html', ad_requests=ad_requests)
+    """View the influencer's ad requests on campaigns that are still open."""
+    ad_requests = (AdRequest.query.join(AdRequest.campaign).options(contains_eager(AdRequest.campaign))
+                   .filter(AdRequest.influencer_id == current_user.id, Campaign.status == 'active').all())
+    # Unread badges for every row from one lookup on the read markers
+    unread = unread_counts(current_user.id, [ad_request.id for ad_request in ad_requests])
+    return render_template('influencer/ad_requests.html', ad_requests=ad_requests, unread=unread)
 
 @bp.route('/view_ad_request/<int:ad_request_id>', methods=['GET', 'POST'])
 @login_required
 @influencer_required
 def view_ad_request(ad_request_id):
     """View a specific ad request and allow the influencer to respond."""
-    ad_request = AdRequest.query.get_or_404(ad_request_id)
-    if ad_request.influencer != current_user:
-        abort(403)  
+    ad_request = g.ad_request  # Loaded with its campaign and ownership-checked by influencer_required
 
     form = AdRequestResponseForm(obj=ad_request)
 
     if form.validate_on_submit():
+        if ad_request.status == 'expired':
+            flash('This ad request expired when its campaign ended.', 'warning')
+            return redirect(url_for('influencer.view_ad_request', ad_request_id=ad_request_id))
         try:
             # Update the ad request with the response (accept, reject, or negotiate)
             ad_request.status = form.status.data
@@ -80,13 +96,8 @@ def view_ad_request(ad_request_id):
             else:
                 message_content = f"The ad request has been {form.status.data}"
 
-            message = Message(
-                ad_request=ad_request,
-                sender=current_user, 
-                recipient=ad_request.campaign.sponsor,
-                content=message_content
-            )
-            db.session.add(message)
+            # Written by the job worker once this commits
+            queue_message(ad_request, current_user.id, ad_request.campaign.sponsor_id, message_content)
             db.session.commit()
 
             flash('Response sent successfully!', 'success')
@@ -108,8 +119,54 @@ def view_ad_request(ad_request_id):
 @influencer_required
 def view_campaign(campaign_id):
     """View a public campaign."""
-    campaign = Campaign.query.get_or_404(campaign_id)
-    if campaign.visibility != 'public':
+    def render_detail():
+        campaign = db.session.get(Campaign, campaign_id)
+        if campaign is None:
+            return None
+        return {'visibility': campaign.visibility,
+                'html': render_template('influencer/_campaign_detail.html', campaign=campaign)}
+
+    # The detail block is cached per campaign version; a hit needs no query at all
+    key = fragment_key('influencer_campaign_detail', [('campaign', campaign_id)])
+    detail = cached_fragment(key, render_detail)
+    if detail is None:
+        abort(404)
+    if detail['visibility'] != 'public':
         abort(403)  # Forbidden access if campaign is private
-    return render_template('influencer/view_campaign.html', campaign=campaign)
+    return conditional(etag_for(key, current_user.id),
+                       lambda: render_template('influencer/view_campaign.html', detail=html(detail['html'])))
 
+
+
+@bp.route('/discover')
+@login_required
+@influencer_required
+def discover():
+    """Browse public campaigns by date, budget, category and keyword."""
+    form = DiscoverForm(request.args)
+    if request.args and not form.validate():
+        flash_errors(form)
+        form = DiscoverForm(None)  # Fall back to the default feed
+    filters = feed_filters(form)
+    cursor = request.args.get('cursor')
+
+    def render_page():
+        page = discover_page(filters, cursor=cursor)
+        return {'html': render_template('influencer/_discover_results.html', campaigns=page.items),
+                'next_cursor': page.next_cursor}
+
+    if cursor:
+        results = render_page()
+    else:
+        # First pages are most of the traffic and the same for every influencer,
+        # so a few seconds of staleness buys skipping the queries altogether.
+        results = cached_fragment(f'discover:{filters_key(filters)}', render_page,
+                                  ttl=current_app.config.get('DISCOVER_CACHE_TTL', 30))
+
+    next_url = None
+    if results['next_cursor']:
+        args = request.args.to_dict()
+        args['cursor'] = results['next_cursor']
+        next_url = url_for('influencer.discover', **args)
+    return render_template('influencer/discover.html', form=form, results=html(results['html']),
+                           next_url=next_url)
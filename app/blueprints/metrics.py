@@ -0,0 +1,24 @@
+import hmac
+
+from flask import Blueprint, Response, request, current_app, abort
+from flask_login import current_user
+
+from ..metrics import render_prometheus
+
+bp = Blueprint('metrics', __name__)
+
+
+@bp.route('/metrics')
+def prometheus():
+    """Counters, histograms and gauges in the Prometheus text format.
+
+    Scrapers authenticate with ``Authorization: Bearer <METRICS_TOKEN>``;
+    logged-in admins may look too.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    allowed = (token and hmac.compare_digest(supplied, token)) or \
+        (current_user.is_authenticated and current_user.role == 'admin')
+    if not allowed:
+        abort(403)
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
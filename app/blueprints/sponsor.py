@@ -1,20 +1,54 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, g, request, jsonify, current_app
 from flask_login import login_required, current_user
 
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+
+from ..conversations import unread_counts
+from ..fragment_cache import fragment_key, cached_fragments, conditional, etag_for, html
 from ..forms import CampaignForm, EditCampaignForm, AdRequestForm, EditAdRequestForm
-from ..models import db, Campaign, AdRequest, User, Message
+from ..models import db, Campaign, AdRequest, AdRequestStatusChange, ConversationState, User
+from ..lifecycle import reopen_if_extended
+from ..fanout import fan_out_ad_requests, MAX_INFLUENCERS as MAX_BULK_INFLUENCERS
+from ..matching import shortlist
+from ..rollups import forget_campaign
+from ..timeseries import forget_campaign_spend
+from ..search import search_available_influencers
+from ..querycount import query_budget
+from ..routing import read_replica
+from ..notifications import queue_message
 from ..utils import sponsor_required  # Assuming you have a sponsor_required decorator for authorization
 
 # sponsor.py
 bp = Blueprint('sponsor', __name__, url_prefix='/sponsor')  # Remove template_folder
 
+TYPEAHEAD_LIMIT = 10
+TYPEAHEAD_MAX_LIMIT = 50
+RECOMMENDATIONS_MAX_LIMIT = 100
+
 @bp.route('/campaigns')
+@query_budget(5)
 @login_required
 @sponsor_required
+@read_replica
 def campaigns():
     """Displays a list of the sponsor's campaigns."""
-    campaigns = Campaign.query.filter_by(sponsor_id=current_user.id).all()
-    return render_template('sponsor/campaigns.html', campaigns=campaigns)
+    # Only ids come from the database (off the sponsor_id index); each row is
+    # a fragment cached per campaign version, and only the missing ones are loaded.
+    ids = db.session.execute(
+        db.select(Campaign.id).filter_by(sponsor_id=current_user.id).order_by(Campaign.id)
+    ).scalars().all()
+    keys = {campaign_id: fragment_key('sponsor_campaign_row', [('campaign', campaign_id)]) for campaign_id in ids}
+
+    def render_rows(missing):
+        campaigns = Campaign.query.filter(Campaign.id.in_(missing)).all()
+        return {campaign.id: render_template('sponsor/_campaign_row.html', campaign=campaign)
+                for campaign in campaigns}
+
+    def build():
+        rows = cached_fragments(keys, render_rows)
+        return render_template('sponsor/campaigns.html', rows=[html(row) for row in rows.values() if row])
+    return conditional(etag_for(list(keys.values()), current_user.id), build)
 
 @bp.route('/create_campaign', methods=['GET', 'POST'])
 @login_required
@@ -32,6 +66,7 @@ def create_campaign():
                 budget=form.budget.data,
                 visibility=form.visibility.data,
                 goals=form.goals.data,
+                category_id=form.category.data or None,
                 sponsor_id=current_user.id
             )
             db.session.add(campaign)
@@ -48,11 +83,9 @@ def create_campaign():
 @sponsor_required
 def edit_campaign(campaign_id):
     """Edits an existing campaign."""
-    campaign = Campaign.query.get_or_404(campaign_id)
-    if campaign.sponsor != current_user:
-        abort(403)  # Forbidden access if not the campaign owner
+    campaign = g.campaign  # Loaded and ownership-checked by sponsor_required
 
-    form = EditCampaignForm(obj=campaign)
+    form = EditCampaignForm(campaign)
     if form.validate_on_submit():
         try:
             # Update campaign fields
@@ -60,9 +93,11 @@ def edit_campaign(campaign_id):
             campaign.description = form.description.data
             campaign.start_date = form.start_date.data
             campaign.end_date = form.end_date.data
+            reopen_if_extended(campaign)
             campaign.budget = form.budget.data
             campaign.visibility = form.visibility.data
             campaign.goals = form.goals.data
+            campaign.category_id = form.category.data or None
             db.session.commit()
             flash('Campaign updated successfully!', 'success')
             return redirect(url_for('sponsor.campaigns'))
@@ -77,12 +112,17 @@ def edit_campaign(campaign_id):
 @sponsor_required
 def delete_campaign(campaign_id):
     """Deletes a campaign and its associated ad requests."""
-    campaign = Campaign.query.get_or_404(campaign_id)
-    if campaign.sponsor != current_user:
-        abort(403)  # Forbidden access if not the campaign owner
+    campaign = g.campaign  # Loaded and ownership-checked by sponsor_required
 
     try:
-        # Manually delete associated ad requests
+        # Manually delete associated ad requests (a bulk delete skips the
+        # rollup and activity listeners, so take them out of the analytics first)
+        forget_campaign(campaign_id)
+        forget_campaign_spend(campaign_id)
+        # ...and the per-request rows the ORM cascade would have removed
+        ad_request_ids = db.select(AdRequest.id).filter(AdRequest.campaign_id == campaign_id)
+        AdRequestStatusChange.query.filter(AdRequestStatusChange.ad_request_id.in_(ad_request_ids)).delete()
+        ConversationState.query.filter(ConversationState.ad_request_id.in_(ad_request_ids)).delete()
         AdRequest.query.filter_by(campaign_id=campaign_id).delete()
 
         # Delete the campaign itself
@@ -99,32 +139,28 @@ def delete_campaign(campaign_id):
 
 
 @bp.route('/ad_requests/<int:campaign_id>')
+@query_budget(6)
 @login_required
 @sponsor_required
 def ad_requests(campaign_id):
     """Displays ad requests for a specific campaign."""
-    campaign = Campaign.query.get_or_404(campaign_id)
-    if campaign.sponsor != current_user:
-        abort(403)  # Forbidden access if not the campaign owner
+    campaign = g.campaign  # Loaded and ownership-checked by sponsor_required
 
-    ad_requests = AdRequest.query.filter_by(campaign_id=campaign_id).all()
-    return render_template('sponsor/ad_requests.html', ad_requests=ad_requests, campaign=campaign)
+    ad_requests = (AdRequest.query.options(joinedload(AdRequest.influencer))
+                   .filter_by(campaign_id=campaign_id).all())
+    # Unread badges for every row from one lookup on the read markers
+    unread = unread_counts(current_user.id, [ad_request.id for ad_request in ad_requests])
+    return render_template('sponsor/ad_requests.html', ad_requests=ad_requests, campaign=campaign, unread=unread)
 
 @bp.route('/create_ad_request/<int:campaign_id>', methods=['GET', 'POST'])
 @login_required
 @sponsor_required
 def create_ad_request(campaign_id):
     """Creates a new ad request for a specific campaign."""
-    campaign = Campaign.query.get_or_404(campaign_id)
-    if campaign.sponsor != current_user:
-        abort(403) 
+    campaign = g.campaign  # Loaded and ownership-checked by sponsor_required
 
     form = AdRequestForm(campaign_id=campaign_id)
 
-    # Populate influencer choices dynamically from the database
-    influencers = User.query.filter_by(role='influencer').all()
-    form.influencer_id.choices = [(i.id, i.username) for i in influencers]
-
     if form.validate_on_submit():
         try:
             ad_request = AdRequest(
@@ -137,10 +173,83 @@ def create_ad_request(campaign_id):
             db.session.commit()
             flash('Ad request created successfully!', 'success')
             return redirect(url_for('sponsor.ad_requests', campaign_id=campaign_id))
+        except IntegrityError:
+            # Assigned by a concurrent request after the form's check ran
+            db.session.rollback()
+            flash('This influencer is already on the campaign.', 'warning')
         except Exception as e:
             db.session.rollback()
             flash('An error occurred while creating the ad request.', 'danger')
-    return render_template('sponsor/create_ad_request.html', form=form, campaign=campaign)
+    recommended = _recommended(campaign, current_app.config.get('MATCHING_SHORTLIST_SIZE', 10))
+    return render_template('sponsor/create_ad_request.html', form=form, campaign=campaign,
+                           recommended=recommended)
+
+
+def _recommended(campaign, k):
+    """The shortlist for ``campaign`` as dicts with id, username and score, best first."""
+    matches = shortlist(campaign, k=k)
+    usernames = dict(db.session.execute(
+        db.select(User.id, User.username).filter(User.id.in_([i for i, _ in matches]))
+    ).all()) if matches else {}
+    return [{'id': i, 'username': usernames[i], 'score': round(score, 3)}
+            for i, score in matches if i in usernames]
+
+
+@bp.route('/recommended_influencers/<int:campaign_id>')
+@login_required
+@sponsor_required
+def recommended_influencers(campaign_id):
+    """Returns the best matching influencers not yet on the campaign as JSON."""
+    k = min(max(request.args.get('limit', current_app.config.get('MATCHING_SHORTLIST_SIZE', 10), type=int), 1),
+            RECOMMENDATIONS_MAX_LIMIT)
+    return jsonify(_recommended(g.campaign, k))
+
+
+@bp.route('/bulk_ad_requests/<int:campaign_id>', methods=['POST'])
+@login_required
+@sponsor_required
+def bulk_ad_requests(campaign_id):
+    """Sends the same ad request to many influencers in one transaction.
+
+    JSON body: requirements, payment_amount and either influencer_ids (a list)
+    or a category_id and/or niche filter. Returns a per-influencer summary.
+    """
+    data = request.get_json(silent=True) or {}
+    requirements = (data.get('requirements') or '').strip()
+    payment_amount = data.get('payment_amount')
+    influencer_ids = data.get('influencer_ids')
+    category_id = data.get('category_id')
+    niche = data.get('niche')
+
+    if not requirements:
+        return jsonify(error='requirements is required.'), 400
+    if not isinstance(payment_amount, int) or isinstance(payment_amount, bool) or payment_amount <= 0:
+        return jsonify(error='payment_amount must be a positive integer.'), 400
+    if influencer_ids is not None:
+        if (not isinstance(influencer_ids, list) or len(influencer_ids) > MAX_BULK_INFLUENCERS
+                or not all(isinstance(i, int) and not isinstance(i, bool) for i in influencer_ids)):
+            return jsonify(error=f'influencer_ids must be a list of at most {MAX_BULK_INFLUENCERS} ids.'), 400
+    elif category_id is None and not niche:
+        return jsonify(error='Give influencer_ids, category_id or niche.'), 400
+    if category_id is not None and not isinstance(category_id, int):
+        return jsonify(error='category_id must be an integer.'), 400
+
+    try:
+        summary = fan_out_ad_requests(g.campaign, current_user.id, requirements, payment_amount,
+                                      influencer_ids=influencer_ids, category_id=category_id, niche=niche)
+    except Exception as e:
+        return jsonify(error=f'An error occurred while creating the ad requests: {str(e)}'), 500
+    return jsonify(summary), 201 if summary['created'] else 200
+
+
+@bp.route('/influencer_typeahead/<int:campaign_id>')
+@login_required
+@sponsor_required
+def influencer_typeahead(campaign_id):
+    """Returns influencers not yet on the campaign whose username starts with ?q= as JSON."""
+    limit = min(max(request.args.get('limit', TYPEAHEAD_LIMIT, type=int), 1), TYPEAHEAD_MAX_LIMIT)
+    matches = search_available_influencers(campaign_id, request.args.get('q', ''), limit=limit)
+    return jsonify([{'id': id, 'username': username} for id, username in matches])
 
 
 @bp.route('/edit_ad_request/<int:ad_request_id>', methods=['GET', 'POST'])
@@ -151,11 +260,7 @@ def edit_ad_request(ad_request_id):
 
     print("current user role in edit_ad_request", current_user.role)
     print("ad request id", ad_request_id)
-    ad_request = AdRequest.query.get_or_404(ad_request_id)
-
-    # Check if sponsor owns the campaign
-    if ad_request.campaign.sponsor != current_user:
-        abort(403)  
+    ad_request = g.ad_request  # Loaded with its campaign and ownership-checked by sponsor_required
 
     form = EditAdRequestForm(obj=ad_request) 
 
@@ -166,15 +271,10 @@ def edit_ad_request(ad_request_id):
             ad_request.payment_amount = form.payment_amount.data
             # removed ad_request.influencer_id = form.influencer_id.data  
 
-            # Add a message to notify the influencer
-            message = Message(
-                ad_request=ad_request,
-                sender=current_user,
-                recipient=ad_request.influencer,
-                content="The ad request has been updated. Please review."
-            )
-            db.session.add(message)
-            
+            # Notify the influencer; the message is written by the job worker
+            queue_message(ad_request, current_user.id, ad_request.influencer_id,
+                          "The ad request has been updated. Please review.")
+
             db.session.commit()
             flash('Ad request updated successfully!', 'success')
             return redirect(url_for('sponsor.ad_requests', campaign_id=ad_request.campaign_id))
@@ -191,9 +291,7 @@ def edit_ad_request(ad_request_id):
 @sponsor_required
 def delete_ad_request(ad_request_id):
     """Deletes an ad request."""
-    ad_request = AdRequest.query.get_or_404(ad_request_id)
-    if ad_request.campaign.sponsor != current_user:
-        abort(403)
+    ad_request = g.ad_request  # Loaded and ownership-checked by sponsor_required
     try:
         db.session.delete(ad_request)
         db.session.commit()
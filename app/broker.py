@@ -0,0 +1,189 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from .jobs import jobs_eager
+from .metrics import counters
+
+
+class Subscription:
+    """One listener's bounded buffer of events on a channel.
+
+    When the buffer is full further events are dropped and ``overflowed`` is
+    set, so a slow reader never holds up publishers or grows without limit.
+    """
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            if not self.overflowed:
+                counters.inc('broker_buffer_overflow_total')
+            self.overflowed = True
+
+    def get(self, timeout=None):
+        """Returns the next event, or None if nothing arrived within ``timeout`` seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self):
+        """Drops everything buffered and clears ``overflowed``; returns the dropped events."""
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self.overflowed = False
+        return events
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MemoryBroker:
+    """Publishes events to subscribers in this process."""
+
+    def __init__(self, buffer_size=100):
+        self.buffer_size = buffer_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.buffer_size)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, event):
+        self._deliver(channel, event)
+
+    def _deliver(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+
+class SQLiteBroker(MemoryBroker):
+    """Relays events through a local SQLite file so every worker process sees them.
+
+    A stand-in for a shared pub/sub service such as Redis on single-host
+    deployments. publish() appends a row; one tailing thread per process
+    reads new rows and hands them to local subscribers, so the file is
+    polled once per interval per process rather than once per connection.
+    """
+
+    # Published events are kept this many seconds, then swept
+    RETAIN = 60
+    SWEEP_EVERY = 1000
+
+    def __init__(self, path, buffer_size=100, poll_interval=0.25):
+        super().__init__(buffer_size)
+        self.path = path
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._publishes = 0
+        self._tail_pid = None
+        self._tail_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect().execute('CREATE TABLE IF NOT EXISTS event (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                                'channel TEXT NOT NULL, payload TEXT NOT NULL, created_at REAL NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def subscribe(self, channel):
+        self._ensure_tailing()
+        return super().subscribe(channel)
+
+    def publish(self, channel, event):
+        now = time.time()
+        conn = self._connect()
+        conn.execute('INSERT INTO event (channel, payload, created_at) VALUES (?, ?, ?)',
+                     (channel, json.dumps(event), now))
+        self._publishes += 1
+        if self._publishes % self.SWEEP_EVERY == 0:
+            conn.execute('DELETE FROM event WHERE created_at < ?', (now - self.RETAIN,))
+
+    def _ensure_tailing(self):
+        # Started lazily, and again after a fork, so every worker process tails the file
+        with self._tail_lock:
+            if self._tail_pid != os.getpid():
+                self._tail_pid = os.getpid()
+                threading.Thread(target=self._tail, name='broker-tail', daemon=True).start()
+
+    def _tail(self):
+        conn = self._connect()
+        last_id = conn.execute('SELECT coalesce(max(id), 0) FROM event').fetchone()[0]
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                rows = conn.execute('SELECT id, channel, payload FROM event WHERE id > ? ORDER BY id',
+                                    (last_id,)).fetchall()
+            except sqlite3.OperationalError:
+                continue  # locked by a writer; try again next tick
+            for last_id, channel, payload in rows:
+                self._deliver(channel, json.loads(payload))
+
+
+def broker_backend(app):
+    """BROKER_BACKEND; None means 'memory' when jobs run eagerly and the shared 'sqlite' broker otherwise.
+
+    Jobs run by `flask worker` publish from another process, which a
+    'memory' broker never relays to the web workers' streams.
+    """
+    setting = app.config.get('BROKER_BACKEND')
+    if setting is None:
+        return 'memory' if jobs_eager(app) else 'sqlite'
+    return setting
+
+
+def init_broker(app):
+    """Creates the pub/sub broker configured by BROKER_* settings."""
+    backend = broker_backend(app)
+    buffer_size = app.config.get('BROKER_BUFFER_SIZE', 100)
+    if backend == 'memory':
+        broker = MemoryBroker(buffer_size)
+    elif backend == 'sqlite':
+        broker = SQLiteBroker(app.config['BROKER_PATH'], buffer_size,
+                              poll_interval=app.config.get('BROKER_POLL_INTERVAL', 0.25))
+    else:
+        raise ValueError(f'Unknown broker backend: {backend}')
+    app.extensions['broker'] = broker
@@ -0,0 +1,210 @@
+import os
+
+import click
+
+from .models import db
+
+
+def register_commands(app):
+    """Registers the app's `flask` CLI commands."""
+
+    @app.cli.command('explain-queries')
+    @click.option('--verbose', '-v', is_flag=True, help='Print the full plan for every query.')
+    def explain_queries(verbose):
+        """Run EXPLAIN QUERY PLAN over the app's known queries and fail on full table scans."""
+        from .query_plans import check_known_queries
+
+        if db.engine.dialect.name != 'sqlite':
+            click.echo(f'EXPLAIN QUERY PLAN is SQLite specific; skipping on {db.engine.dialect.name}.')
+            return
+
+        failures = 0
+        for name, plan, scans, allow_scan in check_known_queries():
+            if scans and not allow_scan:
+                failures += 1
+                click.secho(f'FULL SCAN  {name}', fg='red')
+                for line in scans:
+                    click.echo(f'    {line}')
+            else:
+                click.echo(f'ok         {name}')
+            if verbose:
+                for line in plan:
+                    click.echo(f'    {line}')
+
+        if failures:
+            raise click.ClickException(f'{failures} known queries do a full table scan.')
+
+    @app.cli.command('rebuild-search')
+    def rebuild_search():
+        """Rebuild the full-text search tables from the User and Campaign tables."""
+        from .search import fts_enabled, rebuild_search_index
+
+        if not fts_enabled():
+            raise click.ClickException('Full-text search needs SQLite with FTS5.')
+        users, campaigns = rebuild_search_index()
+        click.echo(f'Indexed {users} users and {campaigns} campaigns.')
+
+    @app.cli.command('rebuild-rollups')
+    @click.option('--check', 'check_only', is_flag=True, help='Only compare the rollups with live aggregates.')
+    def rebuild_rollups_command(check_only):
+        """Rebuild the analytics rollup tables and check them against live aggregates."""
+        from .rollups import rebuild_rollups, check_rollups
+
+        if not check_only:
+            counts = rebuild_rollups()
+            for table, rows in counts.items():
+                click.echo(f'Rebuilt {table}: {rows} rows')
+
+        mismatches = check_rollups()
+        for line in mismatches:
+            click.secho(line, fg='red')
+        if mismatches:
+            raise click.ClickException(f'{len(mismatches)} rollup rows disagree with the live data.')
+        click.echo('Rollups match the live aggregates.')
+
+    @app.cli.command('export')
+    @click.argument('kind', type=click.Choice(['campaigns', 'ad_requests', 'messages']))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv', show_default=True)
+    @click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+    @click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write to a file instead of stdout.')
+    @click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='First day to include.')
+    @click.option('--end', type=click.DateTime(['%Y-%m-%d']), help='Last day to include.')
+    @click.option('--filter', 'filters', multiple=True, metavar='NAME=VALUE',
+                  help='Same filters as the admin export, e.g. --filter status=pending.')
+    def export_command(kind, fmt, compress, output, start, end, filters):
+        """Stream campaigns, ad requests or messages as CSV or NDJSON."""
+        from .export import export_query, stream_export
+
+        parsed = {}
+        for item in filters:
+            name, sep, value = item.partition('=')
+            if not sep:
+                raise click.BadParameter(f'{item} is not NAME=VALUE', param_hint='--filter')
+            if name.endswith('_id'):
+                if not value.strip().isdigit():
+                    raise click.BadParameter(f'{name} must be an integer id, not {value!r}', param_hint='--filter')
+                value = int(value)
+            parsed[name] = value
+        try:
+            query = export_query(kind, parsed, start and start.date(), end and end.date())
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+        chunks = stream_export(query, fmt, compress)
+        if output:
+            with open(output, 'wb' if compress else 'w', newline=None if compress else '') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        else:
+            stream = click.get_binary_stream('stdout') if compress else click.get_text_stream('stdout')
+            for chunk in chunks:
+                stream.write(chunk)
+            stream.flush()
+
+    @app.cli.command('import')
+    @click.argument('kind', type=click.Choice(['users', 'campaigns', 'categories']))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+    @click.option('--workers', type=int, help='Password hashing processes (default: one per CPU).')
+    @click.option('--chunk-size', type=int, default=1000, show_default=True, help='Rows per transaction.')
+    @click.option('--checkpoint', 'checkpoint_path', type=click.Path(dir_okay=False),
+                  help='Progress file to resume from (default: PATH.checkpoint).')
+    @click.option('--rejects', 'rejects_path', type=click.Path(dir_okay=False),
+                  help='Where rejected rows are appended as NDJSON (default: PATH.rejects.ndjson).')
+    @click.option('--restart', is_flag=True, help='Ignore an existing checkpoint and start from the top.')
+    def import_command(kind, path, fmt, workers, chunk_size, checkpoint_path, rejects_path, restart):
+        """Load users, campaigns or categories from a CSV or NDJSON file."""
+        from concurrent.futures import ProcessPoolExecutor
+        from contextlib import nullcontext
+        from .importer import Checkpoint, format_for, read_rows, reject_writer, run_import
+
+        checkpoint = Checkpoint(checkpoint_path or path + '.checkpoint', kind)
+        if restart and os.path.exists(checkpoint.path):
+            os.remove(checkpoint.path)
+        rejects_path = rejects_path or path + '.rejects.ndjson'
+
+        # Only users carry passwords worth spreading over processes
+        pool = ProcessPoolExecutor(max_workers=workers) if kind == 'users' else nullcontext()
+        with open(path, newline='', encoding='utf-8-sig') as source, \
+                open(rejects_path, 'a') as rejects, pool as executor:
+            try:
+                summary = run_import(kind, read_rows(source, fmt or format_for(path)), executor=executor,
+                                     chunk_size=chunk_size, checkpoint=checkpoint,
+                                     on_reject=reject_writer(rejects))
+            except ValueError as e:
+                raise click.ClickException(str(e))
+
+        click.echo(f"Imported {summary['imported']} {kind}, rejected {summary['rejected']}, "
+                   f"skipped {summary['skipped']} already done.")
+        if summary['rejected']:
+            click.echo(f'Rejected rows are in {rejects_path}')
+
+    @app.cli.command('sync-replica')
+    @click.option('--interval', type=float, help='Keep copying every INTERVAL seconds, simulating replication lag.')
+    def sync_replica(interval):
+        """Copy the SQLite primary over the SQLite read replicas (the local stand-in for replication)."""
+        import time
+        from .routing import sync_sqlite_replicas
+
+        while True:
+            written = sync_sqlite_replicas()
+            if not written:
+                raise click.ClickException('No SQLite replicas configured; set DATABASE_REPLICA_URLS.')
+            click.echo(f'Copied the primary to {", ".join(written)}')
+            if not interval:
+                return
+            time.sleep(interval)
+
+    @app.cli.command('worker')
+    @click.option('--concurrency', '-c', type=int, help='Worker threads (default: JOB_WORKER_CONCURRENCY).')
+    @click.option('--batch-size', type=int, help='Most jobs of one kind per batch (default: JOB_BATCH_SIZE).')
+    @click.option('--kind', 'kinds', multiple=True, help='Only run jobs of this kind; repeatable.')
+    @click.option('--once', is_flag=True, help='Exit once no job is ready instead of polling.')
+    def worker_command(concurrency, batch_size, kinds, once):
+        """Run queued background jobs until interrupted."""
+        from .broker import broker_backend
+        from .jobs import Worker
+
+        config = app.config
+        if broker_backend(app) == 'memory':
+            click.echo("Warning: BROKER_BACKEND is 'memory', so messages sent by jobs here never reach "
+                       "the web workers' live inbox streams; use 'sqlite'.", err=True)
+        worker = Worker(app, concurrency=concurrency or config.get('JOB_WORKER_CONCURRENCY', 4),
+                        batch_size=batch_size or config.get('JOB_BATCH_SIZE', 100),
+                        poll_interval=config.get('JOB_POLL_INTERVAL', 0.5), kinds=list(kinds) or None)
+        click.echo(f'Worker {worker.name} running {worker.concurrency} threads'
+                   + (f' for {", ".join(kinds)}' if kinds else ''))
+        worker.run(once=once)
+
+    @app.cli.command('close-campaigns')
+    @click.option('--today', type=click.DateTime(formats=['%Y-%m-%d']),
+                  help='Close campaigns that ended before this date (default: today).')
+    @click.option('--batch-size', type=int, help='Campaigns per pass and ad requests per UPDATE '
+                                                  '(default: CAMPAIGN_SWEEP_BATCH_SIZE).')
+    def close_campaigns(today, batch_size):
+        """Close campaigns past their end date and expire their pending ad requests."""
+        from .lifecycle import close_expired_campaigns
+
+        summary = close_expired_campaigns(today=today.date() if today else None,
+                                          batch_size=batch_size or app.config.get('CAMPAIGN_SWEEP_BATCH_SIZE', 500))
+        click.echo(f"Closed {summary['campaigns']} campaigns and expired {summary['ad_requests']} pending ad requests.")
+
+    @app.cli.command('jobs-status')
+    def jobs_status():
+        """Show background job queue depth and recent wait and run times."""
+        from .jobs import queue_stats
+
+        stats = queue_stats()
+        kinds = sorted(set(stats['depth']) | set(stats['wait_seconds']))
+        if not kinds:
+            click.echo('No queued, running, failed or recently finished jobs.')
+        for kind in kinds:
+            depth = stats['depth'].get(kind, {})
+            line = (f"{kind}: {depth.get('queued', 0)} queued, {depth.get('running', 0)} running, "
+                    f"{depth.get('failed', 0)} failed")
+            if kind in stats['oldest_ready_seconds']:
+                line += f", oldest ready for {stats['oldest_ready_seconds'][kind]:.1f}s"
+            wait = stats['wait_seconds'].get(kind)
+            if wait:
+                line += f"; last 15 min: {wait['count']} done, wait p50 {wait['p50']:.2f}s p95 {wait['p95']:.2f}s"
+            click.echo(line)
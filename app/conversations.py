@@ -0,0 +1,97 @@
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
+
+from .models import db, ConversationState, Message
+from .pagination import keyset_paginate
+
+
+THREAD_PER_PAGE = 30
+
+UPSERT_UNREAD = db.text(
+    'INSERT INTO conversation_state (user_id, ad_request_id, last_read_message_id, unread_count) '
+    'VALUES (:recipient_id, :ad_request_id, 0, 1) ON CONFLICT (user_id, ad_request_id) DO UPDATE SET '
+    'unread_count = conversation_state.unread_count + 1')
+UPDATE_LAST_MESSAGE = db.text(
+    'UPDATE ad_request SET last_message_id = :id, '
+    'last_message_at = (SELECT timestamp FROM message WHERE id = :id) '
+    'WHERE id = :ad_request_id AND coalesce(last_message_id, 0) < :id')
+FORGET_UNREAD = db.text(
+    'UPDATE conversation_state SET unread_count = CASE WHEN unread_count > 0 THEN unread_count - 1 ELSE 0 END '
+    'WHERE user_id = :recipient_id AND ad_request_id = :ad_request_id AND last_read_message_id < :id')
+RECOMPUTE_LAST_MESSAGE = db.text(
+    'UPDATE ad_request SET '
+    'last_message_id = (SELECT max(id) FROM message WHERE ad_request_id = :ad_request_id), '
+    'last_message_at = (SELECT timestamp FROM message WHERE ad_request_id = :ad_request_id '
+    'ORDER BY id DESC LIMIT 1) '
+    'WHERE id = :ad_request_id AND last_message_id = :id')
+
+
+def record_messages(conn, messages):
+    """Counts new messages as unread for their recipients and moves each thread's
+    last message forward.
+
+    ``messages`` holds dicts with id, ad_request_id and recipient_id. Used by
+    the flush listener and by bulk writers that bypass the ORM unit of work.
+    """
+    if messages:
+        conn.execute(UPSERT_UNREAD, messages)
+        conn.execute(UPDATE_LAST_MESSAGE, messages)
+
+
+def forget_messages(conn, messages):
+    """Undoes record_messages for deleted messages (same dict shape)."""
+    if messages:
+        conn.execute(FORGET_UNREAD, messages)
+        conn.execute(RECOMPUTE_LAST_MESSAGE, messages)
+
+
+def _values(message):
+    return {'id': message.id, 'ad_request_id': message.ad_request_id, 'recipient_id': message.recipient_id}
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_deleted(session, flush_context, instances):
+    deleted = [_values(obj) for obj in session.deleted if isinstance(obj, Message)]
+    if deleted:
+        session.info.setdefault('deleted_messages', []).extend(deleted)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _update_conversations(session, flush_context):
+    conn = session.connection()
+    record_messages(conn, [_values(obj) for obj in session.new if isinstance(obj, Message)])
+    forget_messages(conn, session.info.pop('deleted_messages', []))
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_deleted(session):
+    session.info.pop('deleted_messages', None)
+
+
+def mark_read(user_id, ad_request_id):
+    """Marks every message on the thread read for ``user_id``; the caller commits."""
+    db.session.execute(db.text(
+        'INSERT INTO conversation_state (user_id, ad_request_id, last_read_message_id, unread_count) '
+        'SELECT :user_id, id, coalesce(last_message_id, 0), 0 FROM ad_request WHERE id = :ad_request_id '
+        'ON CONFLICT (user_id, ad_request_id) DO UPDATE SET '
+        'last_read_message_id = excluded.last_read_message_id, unread_count = 0'),
+        {'user_id': user_id, 'ad_request_id': ad_request_id})
+
+
+def unread_counts(user_id, ad_request_ids):
+    """Returns {ad_request_id: unread count} for ``user_id`` in one primary key lookup."""
+    if not ad_request_ids:
+        return {}
+    return dict(db.session.execute(
+        db.select(ConversationState.ad_request_id, ConversationState.unread_count)
+        .filter(ConversationState.user_id == user_id,
+                ConversationState.ad_request_id.in_(ad_request_ids),
+                ConversationState.unread_count > 0)
+    ).all())
+
+
+def thread_page(ad_request_id, cursor=None, per_page=THREAD_PER_PAGE):
+    """Returns one KeysetPage of the thread, newest first, walking (timestamp, id)."""
+    query = (Message.query.options(joinedload(Message.sender))
+             .filter(Message.ad_request_id == ad_request_id))
+    return keyset_paginate(query, [Message.timestamp, Message.id], cursor=cursor, per_page=per_page)
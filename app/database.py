@@ -0,0 +1,114 @@
+import random
+import sqlite3
+import time
+
+from sqlalchemy.engine import make_url
+
+
+# Passed straight to PRAGMA, so only these values are accepted from config
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+JOURNAL_MODES = ('WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY')
+
+
+def is_busy(error):
+    """Whether a sqlite3 error is SQLITE_BUSY (another connection holds the lock)."""
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff == sqlite3.SQLITE_BUSY
+    return 'database is locked' in str(error)
+
+
+class SQLiteConnection(sqlite3.Connection):
+    """A sqlite3 connection that applies the engine profile's pragmas when it
+    opens and retries a COMMIT that fails with SQLITE_BUSY.
+
+    busy_timeout already makes statements wait for a lock; the retry covers
+    commits that still lose to a long checkpoint or a burst of writers.
+    Profiles are subclasses made by connection_class().
+    """
+
+    pragmas = ()
+    commit_retries = 0
+    retry_delay = 0.01  # seconds; doubles per attempt, with full jitter
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for pragma in self.pragmas:
+            self.execute(f'PRAGMA {pragma}').fetchall()
+
+    def commit(self):
+        for attempt in range(self.commit_retries + 1):
+            try:
+                return super().commit()
+            except sqlite3.OperationalError as e:
+                if attempt == self.commit_retries or not is_busy(e):
+                    raise
+                # Full jitter, so writers that collided don't retry in lockstep
+                time.sleep(random.uniform(0, self.retry_delay * 2 ** attempt))
+
+
+def connection_class(config):
+    """A SQLiteConnection subclass carrying the SQLITE_* settings in ``config``."""
+    journal_mode = config.get('SQLITE_JOURNAL_MODE', 'WAL').upper()
+    synchronous = config.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+    if journal_mode not in JOURNAL_MODES:
+        raise ValueError(f'SQLITE_JOURNAL_MODE must be one of {", ".join(JOURNAL_MODES)}')
+    if synchronous not in SYNCHRONOUS_LEVELS:
+        raise ValueError(f'SQLITE_SYNCHRONOUS must be one of {", ".join(SYNCHRONOUS_LEVELS)}')
+    pragmas = (
+        f'journal_mode={journal_mode}',
+        f'synchronous={synchronous}',
+        # Negative cache sizes are in KiB rather than pages
+        f'cache_size={-int(config.get("SQLITE_CACHE_SIZE_KB", 65536))}',
+        f'mmap_size={int(config.get("SQLITE_MMAP_SIZE", 0))}',
+        f'busy_timeout={int(config.get("SQLITE_BUSY_TIMEOUT", 5000))}',
+    )
+    return type('SQLiteConnection', (SQLiteConnection,), {
+        'pragmas': pragmas,
+        'commit_retries': int(config.get('SQLITE_COMMIT_RETRIES', 5)),
+        'retry_delay': float(config.get('SQLITE_COMMIT_RETRY_DELAY', 0.01)),
+    })
+
+
+def is_file_database(uri):
+    url = make_url(uri)
+    if not url.drivername.startswith('sqlite'):
+        return False
+    database = url.database or ''
+    return database not in ('', ':memory:') and 'mode=memory' not in str(url)
+
+
+def engine_options(config):
+    """SQLAlchemy engine options for the SQLite profile described by ``config``.
+
+    Only file databases are tuned; in-memory and non-SQLite URIs get no extra options.
+    """
+    if not is_file_database(config['SQLALCHEMY_DATABASE_URI']):
+        return {}
+    return {
+        'pool_size': config.get('SQLITE_POOL_SIZE', 5),
+        'max_overflow': config.get('SQLITE_POOL_MAX_OVERFLOW', 5),
+        'pool_timeout': config.get('SQLITE_POOL_TIMEOUT', 30),
+        'connect_args': {
+            'factory': connection_class(config),
+            # The driver's own busy wait, in seconds; the pragma above takes over once connected
+            'timeout': config.get('SQLITE_BUSY_TIMEOUT', 5000) / 1000,
+        },
+    }
+
+
+def init_database(app):
+    """Applies the SQLite engine profile (SQLITE_* settings) to the app's engine options.
+
+    Must run before db.init_app(), which creates the engine. Explicit
+    SQLALCHEMY_ENGINE_OPTIONS win over the profile.
+    """
+    if not app.config.get('SQLITE_TUNING_ENABLED', True):
+        return
+    options = engine_options(app.config)
+    configured = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    connect_args = {**options.pop('connect_args', {}), **configured.get('connect_args', {})}
+    options.update(configured)
+    if connect_args:
+        options['connect_args'] = connect_args
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
@@ -0,0 +1,80 @@
+import hashlib
+import json
+from datetime import date
+
+from sqlalchemy.orm import joinedload
+
+from .models import db, Campaign
+from .pagination import keyset_paginate, KeysetPage
+from .search import campaign_filter
+
+
+DISCOVER_PER_PAGE = 20
+
+# sort name -> (keyset columns, descending); each matches an ix_campaign_discover_* index
+SORTS = {
+    'budget': ([Campaign.budget, Campaign.id], True),
+    'end_date': ([Campaign.end_date, Campaign.id], False),
+}
+
+
+def feed_filters(form, today=None):
+    """Normalises a validated DiscoverForm into a plain dict of feed filters.
+
+    With no dates given the feed shows campaigns running ``today``.
+    """
+    today = today or date.today()
+    active_from = form.active_from.data or today
+    return {
+        'q': (form.q.data or '').strip(),
+        'category': form.category.data or None,
+        'min_budget': form.min_budget.data,
+        'max_budget': form.max_budget.data,
+        'active_from': active_from,
+        'active_to': form.active_to.data or max(active_from, today),
+        'sort': form.sort.data if form.sort.data in SORTS else 'budget',
+    }
+
+
+def filters_key(filters):
+    """A short stable digest of ``filters``, for cache keys."""
+    raw = json.dumps(filters, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def _feed_query(filters):
+    # Only the indexed columns, so the whole walk stays inside the covering index
+    columns, _ = SORTS[filters['sort']]
+    query = db.session.query(*columns).filter(
+        Campaign.visibility == 'public',
+        Campaign.status == 'active',
+        # Running at some point in [active_from, active_to]
+        Campaign.start_date <= filters['active_to'],
+        Campaign.end_date >= filters['active_from'],
+    )
+    if filters['min_budget'] is not None:
+        query = query.filter(Campaign.budget >= filters['min_budget'])
+    if filters['max_budget'] is not None:
+        query = query.filter(Campaign.budget <= filters['max_budget'])
+    if filters['category']:
+        query = query.filter(Campaign.category_id == filters['category'])
+    if filters['q']:
+        query = query.filter(campaign_filter(filters['q']))
+    return query
+
+
+def discover_page(filters, cursor=None, per_page=DISCOVER_PER_PAGE):
+    """Returns a KeysetPage of open public campaigns matching ``filters``.
+
+    The keyset walk reads (sort key, id) pairs off the covering index; only
+    the campaigns on the page are then loaded, in one primary key lookup.
+    """
+    columns, descending = SORTS[filters['sort']]
+    keys = keyset_paginate(_feed_query(filters), columns, cursor=cursor, per_page=per_page,
+                           descending=descending)
+    ids = [row.id for row in keys]
+    campaigns = {campaign.id: campaign for campaign in
+                 Campaign.query.options(joinedload(Campaign.category))
+                 .filter(Campaign.id.in_(ids)).all()} if ids else {}
+    items = [campaigns[campaign_id] for campaign_id in ids if campaign_id in campaigns]
+    return KeysetPage(items, next_cursor=keys.next_cursor, per_page=per_page)
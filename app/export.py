@@ -0,0 +1,166 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy.orm import aliased
+
+from .models import db, User, Campaign, AdRequest, Message
+from .search import campaign_filter
+
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# Rows fetched per server-side cursor batch
+YIELD_PER = 1000
+# Rows buffered into each chunk handed to the response
+ROWS_PER_CHUNK = 500
+
+
+def _campaigns():
+    sponsor = aliased(User)
+    return (db.select(Campaign.id, Campaign.name, Campaign.description, Campaign.start_date,
+                      Campaign.end_date, Campaign.budget, Campaign.visibility, Campaign.goals,
+                      Campaign.sponsor_id, sponsor.username.label('sponsor'))
+            .join(sponsor, sponsor.id == Campaign.sponsor_id))
+
+
+def _ad_requests():
+    influencer = aliased(User)
+    return (db.select(AdRequest.id, AdRequest.campaign_id, Campaign.name.label('campaign'),
+                      AdRequest.influencer_id, influencer.username.label('influencer'),
+                      AdRequest.requirements, AdRequest.payment_amount, AdRequest.status,
+                      AdRequest.created_at)
+            .join(Campaign, Campaign.id == AdRequest.campaign_id)
+            .join(influencer, influencer.id == AdRequest.influencer_id))
+
+
+def _messages():
+    sender, recipient = aliased(User), aliased(User)
+    return (db.select(Message.id, Message.ad_request_id, Message.sender_id,
+                      sender.username.label('sender'), Message.recipient_id,
+                      recipient.username.label('recipient'), Message.content, Message.timestamp)
+            .join(sender, sender.id == Message.sender_id)
+            .join(recipient, recipient.id == Message.recipient_id))
+
+
+# kind -> (select builder, primary key, column the date range applies to,
+#          {filter name: column compared with ==, or a function returning a clause})
+EXPORTS = {
+    'campaigns': (_campaigns, Campaign.id, Campaign.start_date, {
+        'search': campaign_filter,
+        'sponsor_id': Campaign.sponsor_id,
+        'visibility': Campaign.visibility,
+    }),
+    'ad_requests': (_ad_requests, AdRequest.id, AdRequest.created_at, {
+        'campaign_id': AdRequest.campaign_id,
+        'influencer_id': AdRequest.influencer_id,
+        'status': AdRequest.status,
+    }),
+    'messages': (_messages, Message.id, Message.timestamp, {
+        'sender_id': Message.sender_id,
+        'recipient_id': Message.recipient_id,
+        'ad_request_id': Message.ad_request_id,
+    }),
+}
+
+
+def _bound(column, day):
+    # DateTime columns need a datetime bind; Date columns take the date as is
+    if isinstance(column.type, db.DateTime):
+        return datetime.combine(day, time.min)
+    return day
+
+
+def export_query(kind, filters=None, start=None, end=None):
+    """Builds the select() for an export, ordered by primary key.
+
+    ``filters`` maps filter names from EXPORTS to values (None and '' are
+    ignored). ``start`` and ``end`` are inclusive dates. Raises ValueError
+    for an unknown kind or filter.
+    """
+    if kind not in EXPORTS:
+        raise ValueError(f'Unknown export: {kind}')
+    build, pk, date_column, allowed = EXPORTS[kind]
+    query = build().order_by(pk)
+
+    for name, value in (filters or {}).items():
+        if value is None or value == '':
+            continue
+        if name not in allowed:
+            raise ValueError(f'{kind} cannot be filtered by {name}')
+        target = allowed[name]
+        query = query.filter(target(value) if callable(target) else target == value)
+
+    if start is not None:
+        query = query.filter(date_column >= _bound(date_column, start))
+    if end is not None:
+        query = query.filter(date_column < _bound(date_column, end + timedelta(days=1)))
+    return query
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _encode(rows, columns, fmt):
+    """Yields text chunks of ROWS_PER_CHUNK rows each, the header first."""
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        write = writer.writerow
+    else:
+        def write(row):
+            buffer.write(json.dumps(dict(zip(columns, row)), default=_json_value))
+            buffer.write('\n')
+
+    # Hand the header over straight away so the download starts immediately
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    pending = 0
+    try:
+        for row in rows:
+            write(row)
+            pending += 1
+            if pending == ROWS_PER_CHUNK:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        if pending:
+            yield buffer.getvalue()
+    finally:
+        rows.close()  # releases the cursor if the client goes away mid-download
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(query, fmt='csv', compress=False):
+    """Streams the rows of ``query`` as CSV or NDJSON, optionally gzipped.
+
+    Rows come off a server-side cursor in batches of YIELD_PER, so memory
+    stays flat however many rows there are. Yields str chunks, or bytes when
+    ``compress`` is set.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown export format: {fmt}')
+    result = db.session.execute(query.execution_options(yield_per=YIELD_PER))
+    chunks = _encode(result, list(result.keys()), fmt)
+    return _gzip(chunks) if compress else chunks
+
+
+def export_filename(kind, fmt, compress=False):
+    return f'{kind}-{date.today().isoformat()}.{fmt}' + ('.gz' if compress else '')
@@ -0,0 +1,122 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .conversations import record_messages
+from .fragment_cache import invalidate_fragments
+from .inbox import notify_inbox
+from .models import db, User, AdRequest, Message
+from .rollups import RollupDeltas
+from .timeseries import record_transitions
+
+
+# Ids per IN (...) lookup, kept well under SQLite's bound parameter limit
+CHUNK_SIZE = 500
+MAX_INFLUENCERS = 5000
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _resolve_influencers(influencer_ids=None, category_id=None, niche=None):
+    """Returns (candidate influencer ids in request order, ids that are not influencers)."""
+    if influencer_ids is not None:
+        requested = list(dict.fromkeys(influencer_ids))  # de-duplicate, keep order
+        found = set()
+        for chunk in _chunks(requested):
+            found.update(db.session.execute(
+                db.select(User.id).filter(User.id.in_(chunk), User.role == 'influencer')
+            ).scalars())
+        return [i for i in requested if i in found], [i for i in requested if i not in found]
+
+    query = db.select(User.id).filter(User.role == 'influencer').order_by(User.id)
+    if category_id is not None:
+        query = query.filter(User.category_id == category_id)
+    if niche:
+        query = query.filter(db.func.lower(User.niche) == niche.strip().lower())
+    return list(db.session.execute(query.limit(MAX_INFLUENCERS)).scalars()), []
+
+
+def fan_out_ad_requests(campaign, sender_id, requirements, payment_amount,
+                        influencer_ids=None, category_id=None, niche=None):
+    """Creates one pending ad request plus a notification message per influencer.
+
+    Influencers come from ``influencer_ids`` or, if that is None, from the
+    category/niche filter. Influencers already on the campaign are skipped.
+    Everything is written in one transaction with a single executemany per
+    table. Bulk inserts skip the flush listeners, so the rollups, activity
+    buckets and conversation counters are updated here directly.
+
+    Returns a summary dict with per-influencer results.
+    """
+    candidates, invalid = _resolve_influencers(influencer_ids, category_id, niche)
+
+    assigned = set()
+    for chunk in _chunks(candidates):
+        assigned.update(db.session.execute(
+            db.select(AdRequest.influencer_id)
+            .filter(AdRequest.campaign_id == campaign.id, AdRequest.influencer_id.in_(chunk))
+        ).scalars())
+    targets = [i for i in candidates if i not in assigned]
+
+    created = {}
+    try:
+        if targets:
+            # The check above is only a fast path: a concurrent fan-out (or a
+            # double-submitted form) may assign the same influencers meanwhile.
+            # The unique (campaign_id, influencer_id) index skips those rows, and
+            # RETURNING reports just the rows this call inserted.
+            dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+            created.update(db.session.execute(
+                dialect.insert(AdRequest).on_conflict_do_nothing(index_elements=['campaign_id', 'influencer_id'])
+                .returning(AdRequest.influencer_id, AdRequest.id), [
+                    {'campaign_id': campaign.id, 'influencer_id': influencer_id, 'status': 'pending',
+                     'requirements': requirements, 'payment_amount': payment_amount}
+                    for influencer_id in targets
+                ]).all())
+            assigned.update(i for i in targets if i not in created)
+            targets = [i for i in targets if i in created]
+
+        if targets:
+            db.session.execute(db.insert(Message), [
+                {'ad_request_id': created[influencer_id], 'sender_id': sender_id,
+                 'recipient_id': influencer_id,
+                 'content': f'You have a new ad request for {campaign.name}.'}
+                for influencer_id in targets
+            ])
+            messages = []
+            for chunk in _chunks(list(created.values())):
+                messages.extend(db.session.execute(
+                    db.select(Message.id, Message.ad_request_id, Message.recipient_id)
+                    .filter(Message.ad_request_id.in_(chunk))
+                ).mappings())
+
+            conn = db.session.connection()
+            record_messages(conn, messages)
+            deltas = RollupDeltas()
+            for influencer_id in targets:
+                deltas.ad_request(influencer_id, campaign.id, 'pending', payment_amount)
+            deltas.apply(conn)
+            record_transitions(conn, [
+                {'ad_request_id': created[influencer_id], 'influencer_id': influencer_id,
+                 'campaign_id': campaign.id, 'old_status': None, 'new_status': 'pending',
+                 'payment_amount': payment_amount, 'old_payment_amount': None}
+                for influencer_id in targets
+            ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # The bulk inserts skipped the session's commit hooks
+    notify_inbox(targets)
+    invalidate_fragments([('campaign_ad_requests', campaign.id)])
+
+    results = [{'influencer_id': i, 'status': 'created', 'ad_request_id': created[i]} for i in targets]
+    results += [{'influencer_id': i, 'status': 'already_assigned'} for i in candidates if i in assigned]
+    results += [{'influencer_id': i, 'status': 'not_an_influencer'} for i in invalid]
+    return {
+        'created': len(targets),
+        'already_assigned': len(assigned),
+        'not_an_influencer': len(invalid),
+        'results': results,
+    }
@@ -1,9 +1,10 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, TextAreaField, IntegerField, SelectField, BooleanField,DateField
-from wtforms.validators import DataRequired, Email, EqualTo, Length, NumberRange
+from wtforms.validators import DataRequired, Email, EqualTo, Length, NumberRange, Optional
 from wtforms.validators import DataRequired, ValidationError
 from wtforms import FieldList, FormField
 from .models import Category, User, AdRequest
+from .search import influencer_available
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -35,8 +36,16 @@ class CampaignForm(FlaskForm):
     budget = IntegerField('Budget', validators=[DataRequired()])
     visibility = SelectField('Visibility', choices=[('public', 'Public'), ('private', 'Private')], default='public') 
     goals = TextAreaField('Goals')
+    category = SelectField('Category', coerce=int, default=0)
     submit = SubmitField('Create Campaign')
 
+    def __init__(self, *args, categories=None, **kwargs):
+        """``categories`` is a list of (id, name) choices; they are queried when not given."""
+        super().__init__(*args, **kwargs)
+        if categories is None:
+            categories = [(c.id, c.name) for c in Category.query.order_by(Category.name)]
+        self.category.choices = [(0, 'None')] + list(categories)
+
     def validate_end_date(self, field):
         if field.data < self.start_date.data:
             raise ValidationError('End date must not be before start date.')
@@ -46,6 +55,8 @@ class EditCampaignForm(CampaignForm):  # Inherit from CampaignForm
 
     def __init__(self, campaign, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        if self.is_submitted():
+            return  # keep the posted values
         self.name.data = campaign.name
         self.description.data = campaign.description
         self.start_date.data = campaign.start_date
@@ -53,8 +64,11 @@ class EditCampaignForm(CampaignForm):  # Inherit from CampaignForm
         self.budget.data = campaign.budget
         self.visibility.data = campaign.visibility
         self.goals.data = campaign.goals
+        self.category.data = campaign.category_id or 0
 
 class AdRequestForm(FlaskForm):
+    # Filled in by the typeahead on the page (sponsor.influencer_typeahead)
+    influencer_id = IntegerField('Influencer', validators=[DataRequired(message='Pick an influencer from the list.')])
     requirements = TextAreaField('Requirements', validators=[DataRequired()])
     payment_amount = IntegerField('Payment Amount', validators=[DataRequired()])
     submit = SubmitField('Send Ad Request')
@@ -62,13 +76,11 @@ class AdRequestForm(FlaskForm):
     def __init__(self, campaign_id, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.campaign_id = campaign_id
-        self.influencer_id.choices = [(i.id, i.username) for i in self._get_available_influencers()]
 
-    def _get_available_influencers(self):
-        """Helper function to get influencers not already assigned to the campaign."""
-        existing_ad_requests = AdRequest.query.filter_by(campaign_id=self.campaign_id).all()
-        assigned_influencer_ids = [ar.influencer_id for ar in existing_ad_requests]
-        return User.query.filter(User.role == 'influencer', User.id.notin_(assigned_influencer_ids)).all()
+    def validate_influencer_id(self, field):
+        """Checks the one submitted id instead of building a list of every influencer."""
+        if not influencer_available(self.campaign_id, field.data):
+            raise ValidationError('That influencer is unavailable or already on this campaign.')
 
     def validate_payment_amount(self, field):
         if field.data <= 0:
@@ -140,3 +152,24 @@ class AdRequestResponseForm(FlaskForm):
     )
     counter_offer = IntegerField('Counter Offer (if negotiating)')
     submit = SubmitField('Submit Response')
+
+class DiscoverForm(FlaskForm):
+    """Filters for the influencer campaign discovery feed, read from the query string."""
+    class Meta:
+        csrf = False
+
+    q = StringField('Keyword', validators=[Optional()])
+    category = SelectField('Category', coerce=int, default=0)
+    min_budget = IntegerField('Min Budget', validators=[Optional(), NumberRange(min=0)])
+    max_budget = IntegerField('Max Budget', validators=[Optional(), NumberRange(min=0)])
+    active_from = DateField('Active From', format='%Y-%m-%d', validators=[Optional()])
+    active_to = DateField('Active To', format='%Y-%m-%d', validators=[Optional()])
+    sort = SelectField('Sort By', choices=[('budget', 'Highest budget'), ('end_date', 'Ending soonest')], default='budget')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.category.choices = [(0, 'Any')] + [(c.id, c.name) for c in Category.query.order_by(Category.name)]
+
+    def validate_active_to(self, field):
+        if field.data and self.active_from.data and field.data < self.active_from.data:
+            raise ValidationError('Active To must not be before Active From.')
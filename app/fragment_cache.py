@@ -0,0 +1,232 @@
+import hashlib
+import uuid
+
+from flask import current_app, request, session, make_response
+from markupsafe import Markup
+from sqlalchemy import event, inspect
+
+from .cache import MemoryCache, make_cache
+from .metrics import counters
+from .models import db, User, Campaign, AdRequest
+from .routing import from_primary
+
+
+class FragmentCache:
+    """Rendered template fragments in a bounded local LRU, optionally backed by a shared cache.
+
+    Fragment keys embed a version token per entity they depend on.
+    Invalidating an entity just drops its token; the next reader mints a
+    fresh one, so every fragment built on the old token stops matching and
+    ages out of the LRU. Tokens live in the shared cache when there is one,
+    so an invalidation in one worker reaches all of them.
+    """
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+
+    def _versions(self):
+        return self.shared or self.local
+
+    def version(self, kind, entity_id):
+        key = f'ver:{kind}:{entity_id}'
+        token = self._versions().get(key)
+        if token is None:
+            # Random rather than a counter, so a token lost to eviction can never come back
+            token = uuid.uuid4().hex[:12]
+            self._versions().set(key, token)
+        return token
+
+    def invalidate(self, kind, entity_id):
+        self._versions().delete(f'ver:{kind}:{entity_id}')
+        counters.inc('fragment_cache_invalidations_total', kind=kind)
+
+    def key(self, name, deps):
+        """Builds the cache key for fragment ``name`` depending on (kind, id) pairs."""
+        return f'frag:{name}:' + ':'.join(f'{kind}{entity_id}.{self.version(kind, entity_id)}'
+                                          for kind, entity_id in deps)
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+                counters.inc('fragment_cache_hits_total', tier='shared')
+                return value
+        if value is None:
+            counters.inc('fragment_cache_misses_total')
+        else:
+            counters.inc('fragment_cache_hits_total', tier='local')
+        return value
+
+    def set(self, key, value, ttl=None):
+        evictions = self.local.evictions
+        self.local.set(key, value, ttl)
+        if self.local.evictions > evictions:
+            counters.inc('fragment_cache_evictions_total', self.local.evictions - evictions)
+        if self.shared is not None:
+            self.shared.set(key, value, ttl)
+
+    def stats(self):
+        stats = {'local': self.local.stats()}
+        if self.shared is not None:
+            stats['shared'] = self.shared.stats()
+        return stats
+
+
+def cache_backend(app):
+    """FRAGMENT_CACHE_BACKEND; None means 'memory' in debug and testing and the shared 'sqlite' cache otherwise.
+
+    With 'memory' the version tokens are per process, so an invalidation
+    only reaches the process that made it; the others serve stale
+    fragments (and 304s for them) for up to FRAGMENT_CACHE_TTL.
+    """
+    setting = app.config.get('FRAGMENT_CACHE_BACKEND')
+    if setting is None:
+        return 'memory' if app.debug or app.testing else 'sqlite'
+    return setting
+
+
+def init_fragment_cache(app):
+    """Creates the fragment cache configured by FRAGMENT_CACHE_* settings."""
+    ttl = app.config.get('FRAGMENT_CACHE_TTL', 300)
+    local = MemoryCache(maxsize=app.config.get('FRAGMENT_CACHE_SIZE', 2000), ttl=ttl)
+    backend = cache_backend(app)
+    shared = None
+    if backend != 'memory':
+        shared = make_cache(backend, path=app.config.get('FRAGMENT_CACHE_PATH'),
+                            maxsize=app.config.get('FRAGMENT_CACHE_SHARED_SIZE', 20000), ttl=ttl)
+    app.extensions['fragment_cache'] = FragmentCache(local, shared)
+
+
+def fragment_cache():
+    return current_app.extensions['fragment_cache']
+
+
+def enabled():
+    return current_app.config.get('FRAGMENT_CACHE_ENABLED', True)
+
+
+def fragment_key(name, deps):
+    """The cache key for fragment ``name`` built from (kind, id) pairs; also feeds ETags."""
+    if not enabled():
+        return f'frag:{name}:' + ':'.join(f'{kind}{entity_id}' for kind, entity_id in deps)
+    return fragment_cache().key(name, deps)
+
+
+def cached_fragment(key, render, ttl=None):
+    """Returns the value cached under ``key``, building it with ``render()`` on a miss.
+
+    ``render`` returns a JSON-serialisable value (typically a dict holding
+    the rendered HTML), or None for "nothing to cache". ``ttl`` overrides
+    FRAGMENT_CACHE_TTL, for keys no invalidation reaches. ``render`` reads
+    from the primary, so a replica's lag is never cached.
+    """
+    if not enabled():
+        return render()
+    cache = fragment_cache()
+    value = cache.get(key)
+    if value is None:
+        with from_primary():
+            value = render()
+        if value is not None:
+            cache.set(key, value, ttl)
+    return value
+
+
+def cached_fragments(keys, render_many):
+    """Like cached_fragment for many entities at once.
+
+    ``keys`` maps entity ids to fragment keys; ``render_many(ids)`` builds
+    the missing ones in a single pass and returns {id: value}. Returns
+    {id: value} in the order of ``keys``. Like ``render``, ``render_many``
+    reads from the primary.
+    """
+    cache = fragment_cache() if enabled() else None
+    values = {entity_id: cache.get(key) if cache else None for entity_id, key in keys.items()}
+    missing = [entity_id for entity_id, value in values.items() if value is None]
+    if missing:
+        with from_primary():
+            rendered = render_many(missing)
+        for entity_id, value in rendered.items():
+            values[entity_id] = value
+            if cache:
+                cache.set(keys[entity_id], value)
+    return values
+
+
+def html(value):
+    """Marks cached fragment HTML safe for {{ }} in templates."""
+    return Markup(value)
+
+
+def etag_for(*parts):
+    """An ETag value over the fragment keys a page is built from and the viewer."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def conditional(etag, build):
+    """Answers 304 when the client already has ``etag``, else returns ``build()`` tagged with it.
+
+    Pages with pending flash messages are built fresh and not tagged, since
+    the flashes are part of the body.
+    """
+    if not enabled() or session.get('_flashes'):
+        return build()
+    if request.if_none_match.contains_weak(etag):
+        counters.inc('http_not_modified_total', endpoint=request.endpoint)
+        response = make_response('', 304)
+    else:
+        response = make_response(build())
+    # Weak: the same page may differ byte for byte (e.g. CSRF tokens in forms)
+    response.set_etag(etag, weak=True)
+    # Personalised pages: browsers may keep them, but must check back each time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _dependencies(session, obj):
+    if isinstance(obj, Campaign):
+        return [('campaign', obj.id), ('campaign_ad_requests', obj.id)]
+    if isinstance(obj, AdRequest):
+        return [('campaign_ad_requests', obj.campaign_id)]
+    if isinstance(obj, User) and obj not in session.new and inspect(obj).attrs.username.history.has_changes():
+        # Usernames show up on campaign pages; renames are rare, so look the pages up
+        conn = session.connection()
+        campaigns = conn.execute(db.select(Campaign.id).filter(Campaign.sponsor_id == obj.id)).scalars()
+        assigned = conn.execute(db.select(AdRequest.campaign_id).filter(AdRequest.influencer_id == obj.id)
+                                .distinct()).scalars()
+        return [('campaign', c) for c in campaigns] + [('campaign_ad_requests', c) for c in assigned]
+    return []
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changes(session, flush_context):
+    stale = session.info.setdefault('stale_fragments', set())
+    for obj in session.new | session.deleted:
+        stale.update(_dependencies(session, obj))
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            stale.update(_dependencies(session, obj))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_changed(session):
+    stale = session.info.pop('stale_fragments', None)
+    if stale and current_app:
+        invalidate_fragments(stale)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('stale_fragments', None)
+
+
+def invalidate_fragments(deps):
+    """Drops the version tokens for (kind, id) pairs; for writers that bypass the ORM."""
+    cache = current_app.extensions.get('fragment_cache')
+    if cache is None:
+        return
+    for kind, entity_id in deps:
+        cache.invalidate(kind, entity_id)
@@ -0,0 +1,187 @@
+import atexit
+import os
+import threading
+from collections import deque
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingBusy(ServiceUnavailable):
+    """Raised when the hashing pool is saturated; Flask turns it into a fast 503."""
+    description = 'The server is busy. Please try logging in again in a moment.'
+
+
+# Passwords per pool task in hash_many(); a hash takes tens of milliseconds
+BULK_BATCH = 16
+
+
+def _method_prefix(pwhash):
+    return pwhash.split('$', 1)[0] if pwhash else ''
+
+
+def _hash_batch(passwords, method):
+    return [generate_password_hash(password, method=method) for password in passwords]
+
+
+class InlineHasher:
+    """Hashes passwords in the calling thread (werkzeug's default behaviour)."""
+
+    def __init__(self, method='scrypt'):
+        self.method = method
+        self._target_prefix = None
+
+    def hash(self, password):
+        return generate_password_hash(password, method=self.method)
+
+    def verify(self, pwhash, password):
+        return check_password_hash(pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True when ``pwhash`` was made with different method or cost parameters."""
+        if self._target_prefix is None:
+            # werkzeug fills in default cost parameters, so read them off a real hash
+            self._target_prefix = _method_prefix(self.hash('x'))
+        return _method_prefix(pwhash) != self._target_prefix
+
+    def hash_many(self, passwords):
+        """Hashes ``passwords`` in order, for bulk loads."""
+        return _hash_batch(passwords, self.method)
+
+    def shutdown(self):
+        pass
+
+
+class PoolHasher(InlineHasher):
+    """Hashes passwords on a bounded process pool so request threads stay responsive.
+
+    At most ``max_pending`` hashes may be queued or running at once; beyond
+    that HashingBusy is raised immediately instead of queueing more work.
+    """
+
+    def __init__(self, method='scrypt', workers=None, max_pending=64, timeout=10):
+        super().__init__(method)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+
+    def _executor(self):
+        # Created lazily, and again after a fork, so every worker process owns its pool
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy(retry_after=1)
+        try:
+            future = self._executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the pool finishes the hash, not until this
+        # caller stops waiting, so timed-out work still counts against max_pending
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HashingBusy(retry_after=1)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def hash_many(self, passwords):
+        """Hashes ``passwords`` in order on the pool, for bulk loads.
+
+        At most one batch per worker is in flight, each holding a
+        max_pending slot, so logins queue behind one batch at most. Waits
+        for slots rather than raising HashingBusy.
+        """
+        passwords = list(passwords)
+        hashes, in_flight = [], deque()
+        for start in range(0, len(passwords), BULK_BATCH):
+            if len(in_flight) >= self.workers:
+                hashes.extend(in_flight.popleft().result())
+            self._slots.acquire()
+            try:
+                future = self._executor().submit(_hash_batch, passwords[start:start + BULK_BATCH], self.method)
+            except BaseException:
+                self._slots.release()
+                raise
+            future.add_done_callback(lambda _: self._slots.release())
+            in_flight.append(future)
+        while in_flight:
+            hashes.extend(in_flight.popleft().result())
+        return hashes
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def init_hashing(app):
+    """Creates the password hasher configured by PASSWORD_HASH_* settings."""
+    backend = app.config.get('PASSWORD_HASH_BACKEND', 'inline')
+    method = app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+    if backend == 'inline':
+        hasher = InlineHasher(method)
+    elif backend == 'pool':
+        hasher = PoolHasher(method,
+                            workers=app.config.get('PASSWORD_HASH_WORKERS'),
+                            max_pending=app.config.get('PASSWORD_HASH_MAX_PENDING', 64),
+                            timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 10))
+        atexit.register(hasher.shutdown)
+    else:
+        raise ValueError(f'Unknown password hash backend: {backend}')
+    app.extensions['password_hasher'] = hasher
+
+
+def _hasher():
+    if current_app:
+        hasher = current_app.extensions.get('password_hasher')
+        if hasher is not None:
+            return hasher
+    return _default_hasher
+
+
+_default_hasher = InlineHasher()
+
+
+def hash_password(password):
+    return _hasher().hash(password)
+
+
+def verify_password(pwhash, password):
+    return _hasher().verify(pwhash, password)
+
+
+def password_needs_rehash(pwhash):
+    return _hasher().needs_rehash(pwhash)
+
+
+def hash_many(passwords, executor=None):
+    """Hashes ``passwords`` with the configured method, in order, for bulk loads.
+
+    Spread over ``executor`` (a ProcessPoolExecutor) when one is given, for
+    one-off command line loads; otherwise the configured hasher does it, on
+    the app's own pool when PASSWORD_HASH_BACKEND is 'pool'.
+    """
+    if executor is None:
+        return _hasher().hash_many(passwords)
+    hash_one = partial(generate_password_hash, method=_hasher().method)
+    # A hash takes tens of milliseconds, so small batches per task are plenty
+    return list(executor.map(hash_one, passwords, chunksize=BULK_BATCH))
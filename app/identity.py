@@ -0,0 +1,69 @@
+from flask import current_app
+from sqlalchemy.orm import make_transient_to_detached
+
+from .cache import make_cache
+from .models import db, User
+
+
+# What the auth decorators and base templates read. Other columns (password
+# hash, admin notes, profile text) are never cached; on a rebuilt User they
+# are unloaded and lazy load on first access.
+USER_FIELDS = ('id', 'username', 'email', 'role', 'is_active', 'is_flagged')
+
+
+def cache_backend(app):
+    """USER_CACHE_BACKEND; None means 'memory' in debug and testing and the shared 'sqlite' cache otherwise.
+
+    With 'memory' each worker has its own cache, and invalidate_user() only
+    reaches the worker that ran it, so the others keep a demoted or
+    deactivated account for up to USER_CACHE_TTL.
+    """
+    setting = app.config.get('USER_CACHE_BACKEND')
+    if setting is None:
+        return 'memory' if app.debug or app.testing else 'sqlite'
+    return setting
+
+
+def init_identity_cache(app):
+    """Creates the user identity cache configured by USER_CACHE_* settings."""
+    app.extensions['identity_cache'] = make_cache(
+        cache_backend(app),
+        path=app.config.get('USER_CACHE_PATH'),
+        maxsize=app.config.get('USER_CACHE_SIZE', 10000),
+        ttl=app.config.get('USER_CACHE_TTL', 300),
+    )
+
+
+def _cache():
+    return current_app.extensions['identity_cache']
+
+
+def _key(user_id):
+    return f'user:{user_id}'
+
+
+def load_user(user_id):
+    """Returns the User for a session, from the identity cache when possible.
+
+    A cache hit is attached to the request's session with merge(load=False),
+    which issues no query; relationships still lazy load as usual.
+    """
+    user_id = int(user_id)
+    values = _cache().get(_key(user_id))
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            _cache().set(_key(user_id), {field: getattr(user, field) for field in USER_FIELDS})
+        return user
+
+    user = db.session.identity_map.get(db.session.identity_key(User, user_id))
+    if user is not None:
+        return user
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def invalidate_user(user_id):
+    """Drops a user from the identity cache after their row changes."""
+    _cache().delete(_key(user_id))
@@ -0,0 +1,277 @@
+import csv
+import json
+import os
+from itertools import islice
+
+from werkzeug.datastructures import MultiDict
+
+from .forms import RegistrationForm, CampaignForm, CategoryForm
+from .hashing import hash_many
+from .models import db, User, Campaign, Category
+from .rollups import RollupDeltas
+from .search import index_users, index_campaigns
+
+
+# Rows validated, hashed and inserted per transaction
+CHUNK_SIZE = 1000
+# Never copied into the reject file
+SECRET_FIELDS = ('password', 'confirm_password')
+
+
+def read_rows(stream, fmt):
+    """Yields (record number, row dict, parse error) from a CSV or NDJSON text stream."""
+    if fmt == 'csv':
+        for n, row in enumerate(csv.DictReader(stream), start=1):
+            yield n, row, None
+    elif fmt == 'ndjson':
+        n = 0
+        for line in stream:
+            if not line.strip():
+                continue
+            n += 1
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield n, {'raw': line.rstrip('\n')}, f'Invalid JSON: {e}'
+                continue
+            if isinstance(row, dict):
+                yield n, row, None
+            else:
+                yield n, {'raw': line.rstrip('\n')}, 'Expected a JSON object'
+    else:
+        raise ValueError(f'Unknown import format: {fmt}')
+
+
+def format_for(filename):
+    """Guesses the import format from a file name."""
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+class Checkpoint:
+    """How many input records are done (inserted or rejected), kept in a small JSON file.
+
+    Saved after every committed chunk, so a rerun skips straight past them.
+    """
+
+    def __init__(self, path, kind):
+        self.path = path
+        self.kind = kind
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path) as f:
+            data = json.load(f)
+        if data.get('kind') != self.kind:
+            raise ValueError(f'{self.path} is a checkpoint for a {data.get("kind")} import')
+        return data['done']
+
+    def save(self, done):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'kind': self.kind, 'done': done}, f)
+        os.replace(tmp, self.path)  # atomic, so a crash never leaves half a checkpoint
+
+
+def reject_writer(stream):
+    """Returns an on_reject callback appending NDJSON lines to ``stream``."""
+    def write(n, row, reason):
+        row = {k: v for k, v in row.items() if k not in SECRET_FIELDS}
+        stream.write(json.dumps({'record': n, 'error': reason, 'row': row}, default=str) + '\n')
+    return write
+
+
+def _form_errors(form):
+    return '; '.join(f'{name}: {message}' for name, messages in form.errors.items() for message in messages)
+
+
+def _validated(records, form_class, rejects, **form_kwargs):
+    """Runs each row through ``form_class`` and yields (number, row, form) for the valid ones.
+
+    ``form_kwargs`` go to every form, e.g. choices loaded once for the whole file.
+    """
+    for n, row, error in records:
+        if error:
+            rejects.append((n, row, error))
+            continue
+        # Import files name categories; they are resolved to ids after validation
+        formdata = MultiDict({k: str(v) for k, v in row.items() if v is not None and k != 'category'})
+        if form_class is RegistrationForm:
+            formdata.setdefault('confirm_password', formdata.get('password', ''))
+        form = form_class(formdata=formdata, meta={'csrf': False}, **form_kwargs)
+        if form.validate():
+            yield n, row, form
+        else:
+            rejects.append((n, row, _form_errors(form)))
+
+
+def _existing(column, values):
+    if not values:
+        return set()
+    return set(db.session.execute(db.select(column).filter(column.in_(values))).scalars())
+
+
+def _prepare_users(records, executor):
+    rejects = []
+    valid = list(_validated(records, RegistrationForm, rejects))
+
+    taken_names = _existing(User.username, [form.username.data for _, _, form in valid])
+    taken_emails = _existing(User.email, [form.email.data for _, _, form in valid])
+    category_names = {(row.get('category') or '').strip() for _, row, _ in valid} - {''}
+    categories = dict(db.session.execute(
+        db.select(Category.name, Category.id).filter(Category.name.in_(category_names))
+    ).all()) if category_names else {}
+
+    accepted = []
+    for n, row, form in valid:
+        username, email = form.username.data, form.email.data
+        category = (row.get('category') or '').strip()
+        if username in taken_names:
+            rejects.append((n, row, 'username: Username already exists.'))
+        elif email in taken_emails:
+            rejects.append((n, row, 'email: Email already exists.'))
+        elif category and category not in categories:
+            rejects.append((n, row, f'category: Unknown category {category!r}.'))
+        else:
+            taken_names.add(username)  # catches repeats within the file too
+            taken_emails.add(email)
+            accepted.append((form, categories.get(category), (row.get('niche') or '').strip() or None,
+                             (row.get('bio') or '').strip() or None))
+
+    hashes = hash_many([form.password.data for form, _, _, _ in accepted], executor)
+    values = [{'username': form.username.data, 'email': form.email.data, 'role': form.role.data,
+               'password_hash': pwhash,
+               'category_id': category_id if form.role.data == 'influencer' else None,
+               'niche': niche if form.role.data == 'influencer' else None,
+               'bio': bio if form.role.data == 'influencer' else None}
+              for (form, category_id, niche, bio), pwhash in zip(accepted, hashes)]
+    return values, rejects
+
+
+def _insert_users(values):
+    db.session.execute(db.insert(User), values)
+    ids = db.session.execute(
+        db.select(User.id).filter(User.username.in_([v['username'] for v in values]))
+    ).scalars().all()
+
+    # Bulk inserts skip the flush listeners, so keep search and rollups in step here
+    conn = db.session.connection()
+    index_users(conn, ids)
+    deltas = RollupDeltas()
+    for value in values:
+        deltas.influencer(value['role'], value['category_id'])
+    deltas.apply(conn)
+
+
+def _prepare_campaigns(records, executor):
+    rejects = []
+    # The form never sees the category column, so it needs no choices from the database
+    valid = list(_validated(records, CampaignForm, rejects, categories=()))
+
+    usernames = {(row.get('sponsor') or '').strip() for _, row, _ in valid} - {''}
+    sponsors = dict(db.session.execute(
+        db.select(User.username, User.id).filter(User.username.in_(usernames), User.role == 'sponsor')
+    ).all()) if usernames else {}
+    category_names = {(row.get('category') or '').strip() for _, row, _ in valid} - {''}
+    categories = dict(db.session.execute(
+        db.select(Category.name, Category.id).filter(Category.name.in_(category_names))
+    ).all()) if category_names else {}
+
+    values = []
+    for n, row, form in valid:
+        sponsor = (row.get('sponsor') or '').strip()
+        category = (row.get('category') or '').strip()
+        if sponsor not in sponsors:
+            rejects.append((n, row, f'sponsor: Unknown sponsor {sponsor!r}.'))
+            continue
+        if category and category not in categories:
+            rejects.append((n, row, f'category: Unknown category {category!r}.'))
+            continue
+        values.append({'name': form.name.data, 'description': form.description.data,
+                       'start_date': form.start_date.data, 'end_date': form.end_date.data,
+                       'budget': form.budget.data, 'visibility': form.visibility.data,
+                       'goals': form.goals.data or None, 'sponsor_id': sponsors[sponsor],
+                       'category_id': categories.get(category)})
+    return values, rejects
+
+
+def _insert_campaigns(values):
+    before = db.session.execute(db.select(db.func.max(Campaign.id))).scalar() or 0
+    db.session.execute(db.insert(Campaign), values)
+    # Campaigns have no natural key to look the new ids up by. Anything above
+    # the old maximum is ours, or was committed alongside; reindexing that too
+    # is harmless.
+    ids = db.session.execute(db.select(Campaign.id).filter(Campaign.id > before)).scalars().all()
+    index_campaigns(db.session.connection(), ids)
+
+
+def _prepare_categories(records, executor):
+    rejects, values = [], []
+    valid = list(_validated(records, CategoryForm, rejects))
+    taken = _existing(db.func.lower(Category.name), [form.name.data.strip().lower() for _, _, form in valid])
+    for n, row, form in valid:
+        name = form.name.data.strip()
+        if name.lower() in taken:
+            rejects.append((n, row, 'name: Category already exists.'))
+        else:
+            taken.add(name.lower())
+            values.append({'name': name})
+    return values, rejects
+
+
+def _insert_categories(values):
+    db.session.execute(db.insert(Category), values)
+
+
+# kind -> (validate a chunk into (insert values, rejects), insert the values)
+IMPORTS = {
+    'users': (_prepare_users, _insert_users),
+    'campaigns': (_prepare_campaigns, _insert_campaigns),
+    'categories': (_prepare_categories, _insert_categories),
+}
+
+
+def run_import(kind, records, executor=None, chunk_size=CHUNK_SIZE, checkpoint=None, on_reject=None):
+    """Loads ``records`` (from read_rows) in chunks, one transaction per chunk.
+
+    Rows failing the same checks as the web forms go to ``on_reject(number,
+    row, reason)`` instead of stopping the load. Passwords are hashed on
+    ``executor`` when one is given. With a ``checkpoint``, records it already
+    covers are skipped and it is advanced after every commit.
+
+    Returns counts of imported, rejected and skipped records.
+    """
+    if kind not in IMPORTS:
+        raise ValueError(f'Unknown import: {kind}')
+    prepare, insert = IMPORTS[kind]
+    done = checkpoint.load() if checkpoint else 0
+    summary = {'imported': 0, 'rejected': 0, 'skipped': 0}
+
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        fresh = [record for record in chunk if record[0] > done]
+        summary['skipped'] += len(chunk) - len(fresh)
+        if not fresh:
+            continue
+
+        values, rejects = prepare(fresh, executor)
+        try:
+            if values:
+                insert(values)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        # Only after the commit, so a rerun of a failed chunk doesn't reject rows twice
+        if on_reject:
+            for reject in sorted(rejects, key=lambda r: r[0]):
+                on_reject(*reject)
+        if checkpoint:
+            checkpoint.save(fresh[-1][0])
+        summary['imported'] += len(values)
+        summary['rejected'] += len(rejects)
+    return summary
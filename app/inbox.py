@@ -0,0 +1,115 @@
+import json
+import time
+
+from flask import current_app
+from sqlalchemy import event
+
+from .models import db, User, Campaign, AdRequest, Message
+
+
+# Messages read per catch-up query
+CATCH_UP_LIMIT = 200
+
+
+def channel(user_id):
+    return f'inbox:{user_id}'
+
+
+def notify_inbox(recipient_ids):
+    """Wakes the open inbox streams of ``recipient_ids``; call after the commit.
+
+    Events only say "look again"; streams read the messages themselves, so a
+    dropped or coalesced event never loses a message.
+    """
+    broker = current_app.extensions.get('broker') if current_app else None
+    if broker is None:
+        return
+    for recipient_id in set(recipient_ids):
+        broker.publish(channel(recipient_id), {})
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_new_messages(session, flush_context):
+    recipients = [obj.recipient_id for obj in session.new if isinstance(obj, Message)]
+    if recipients:
+        session.info.setdefault('inbox_recipients', set()).update(recipients)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_new_messages(session):
+    recipients = session.info.pop('inbox_recipients', None)
+    if recipients:
+        notify_inbox(recipients)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_new_messages(session):
+    session.info.pop('inbox_recipients', None)
+
+
+def latest_message_id(user_id):
+    return db.session.execute(
+        db.select(db.func.max(Message.id)).filter(Message.recipient_id == user_id)
+    ).scalar() or 0
+
+
+def messages_since(user_id, after_id, limit=CATCH_UP_LIMIT):
+    """Returns ``user_id``'s messages with ids above ``after_id``, oldest first."""
+    return db.session.execute(
+        db.select(Message.id, Message.ad_request_id, Message.sender_id, User.username.label('sender'),
+                  Campaign.name.label('campaign'), Message.content, Message.timestamp)
+        .join(User, User.id == Message.sender_id)
+        .join(AdRequest, AdRequest.id == Message.ad_request_id)
+        .join(Campaign, Campaign.id == AdRequest.campaign_id)
+        .filter(Message.recipient_id == user_id, Message.id > after_id)
+        .order_by(Message.id)
+        .limit(limit)
+    ).all()
+
+
+def _event(name, data, event_id=None):
+    lines = [f'event: {name}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream_inbox(user_id, last_id=None, heartbeat=15, timeout=300):
+    """Yields Server-Sent Events for ``user_id``'s new messages.
+
+    Subscribes before reading, then reads every message above ``last_id``
+    (the client's Last-Event-ID) and sleeps until the broker signals more.
+    Ends after ``timeout`` seconds; the browser reconnects with the last id
+    it saw, so nothing is missed in between.
+    """
+    broker = current_app.extensions['broker']
+    with broker.subscribe(channel(user_id)) as subscription:
+        if last_id is None:
+            last_id = latest_message_id(user_id)
+        # Pins the browser's Last-Event-ID even if no message arrives before a reconnect
+        yield 'retry: 3000\n' + _event('ready', {}, last_id)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            rows = messages_since(user_id, last_id)
+            # Don't keep a pooled connection (and a read snapshot) while idle
+            db.session.close()
+            for row in rows:
+                last_id = row.id
+                yield _event('message', {
+                    'id': row.id, 'ad_request_id': row.ad_request_id, 'sender_id': row.sender_id,
+                    'sender': row.sender, 'campaign': row.campaign, 'content': row.content,
+                    'timestamp': row.timestamp.isoformat() if row.timestamp else None,
+                }, row.id)
+            if len(rows) == CATCH_UP_LIMIT:
+                continue  # more are waiting
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if subscription.get(timeout=min(heartbeat, remaining)) is None:
+                yield ': keepalive\n\n'
+                continue
+            # One query covers everything queued so far, including after an overflow
+            subscription.drain()
@@ -0,0 +1,184 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import traceback
+from collections import deque
+
+from flask import current_app, g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import counters, histograms
+
+
+sql_logger = logging.getLogger('app.sql')
+
+histograms.define('http_request_queries', (1, 2, 5, 10, 20, 50, 100, 200, 500))
+
+# Only frames from our own code are kept in slow query stacks
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+STACK_DEPTH = 12
+
+# cProfile allows one active profiler per process
+_profile_lock = threading.Lock()
+
+
+class SlowQueries:
+    """The most recent slow statements, each with its duration, endpoint and app stack."""
+
+    def __init__(self, maxlen=100):
+        self._samples = deque(maxlen=maxlen)
+
+    def add(self, statement, duration):
+        stack = [f'{os.path.relpath(frame.filename, APP_ROOT)}:{frame.lineno} in {frame.name}'
+                 for frame in traceback.extract_stack()[:-3]
+                 if frame.filename.startswith(APP_ROOT) and not frame.filename.endswith('instrumentation.py')]
+        self._samples.append({
+            'statement': statement,
+            'duration_ms': round(duration * 1000, 2),
+            'endpoint': request.endpoint if has_request_context() else None,
+            'at': time.time(),
+            'stack': stack[-STACK_DEPTH:],
+        })
+
+    def samples(self):
+        return list(reversed(self._samples))
+
+
+def init_instrumentation(app):
+    """Registers request, SQL and template timing, plus the X-Profile mode.
+
+    Controlled by INSTRUMENTATION_ENABLED, SLOW_QUERY_THRESHOLD,
+    SLOW_QUERY_SAMPLES, SQL_LOG_SAMPLE_RATE and PROFILING_ENABLED.
+    """
+    app.extensions['slow_queries'] = SlowQueries(app.config.get('SLOW_QUERY_SAMPLES', 100))
+    if not app.config.get('INSTRUMENTATION_ENABLED', True):
+        return
+    if not sql_logger.handlers:
+        # One JSON object per line on stderr, replacing SQLALCHEMY_ECHO
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        sql_logger.addHandler(handler)
+        sql_logger.setLevel(logging.INFO)
+        sql_logger.propagate = False
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_release_profiler)
+    before_render_template.connect(_start_template, app)
+    template_rendered.connect(_finish_template, app)
+
+
+def _start_request():
+    g.instrumentation = {'started': time.perf_counter(), 'queries': 0, 'query_time': 0.0,
+                         'template_time': 0.0, 'templates': []}
+    if (current_app.config.get('PROFILING_ENABLED', True) and request.headers.get('X-Profile')
+            and _may_profile() and _profile_lock.acquire(blocking=False)):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _may_profile():
+    # Profiles expose code paths and timings; admins and local debugging only
+    from flask_login import current_user
+    return current_app.debug or (current_user.is_authenticated and current_user.role == 'admin')
+
+
+def _finish_request(response):
+    stats = g.pop('instrumentation', None)
+    if stats is None:
+        return response
+    # For streamed responses (exports, the inbox) this is the time to the first byte
+    elapsed = time.perf_counter() - stats['started']
+    endpoint = request.endpoint or 'unmatched'
+    counters.inc('http_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+    histograms.observe('http_request_duration_seconds', elapsed, endpoint=endpoint)
+    histograms.observe('http_request_queries', stats['queries'], endpoint=endpoint)
+    histograms.observe('http_request_query_seconds', stats['query_time'], endpoint=endpoint)
+    response.headers['Server-Timing'] = (
+        f'db;dur={stats["query_time"] * 1000:.1f};desc="{stats["queries"]} queries", '
+        f'tpl;dur={stats["template_time"] * 1000:.1f}, total;dur={elapsed * 1000:.1f}')
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+        return _profile_response(profiler, response, stats, elapsed)
+    return response
+
+
+def _release_profiler(exc):
+    # after_request is skipped when the view raised; don't leave the profiler running
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+
+
+def _profile_response(profiler, response, stats, elapsed):
+    out = io.StringIO()
+    out.write(f'{request.method} {request.full_path} -> {response.status_code} '
+              f'in {elapsed * 1000:.1f} ms, {stats["queries"]} queries '
+              f'({stats["query_time"] * 1000:.1f} ms), templates {stats["template_time"] * 1000:.1f} ms\n\n')
+    sort = request.headers.get('X-Profile')
+    sort = sort if sort in ('cumulative', 'tottime', 'ncalls') else 'cumulative'
+    pstats.Stats(profiler, stream=out).strip_dirs().sort_stats(sort).print_stats(40)
+    summary = current_app.response_class(out.getvalue(), mimetype='text/plain')
+    summary.headers['X-Profile-Status'] = str(response.status_code)
+    return summary
+
+
+def _start_template(sender, template, context, **extra):
+    stats = g.get('instrumentation')
+    if stats is not None:
+        stats['templates'].append(time.perf_counter())
+
+
+def _finish_template(sender, template, context, **extra):
+    stats = g.get('instrumentation')
+    if stats is not None and stats['templates']:
+        elapsed = time.perf_counter() - stats['templates'].pop()
+        if not stats['templates']:  # nested renders are already inside the outer one
+            stats['template_time'] += elapsed
+        histograms.observe('template_render_seconds', elapsed, template=template.name or 'string')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _finish_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    # Scripts outside an app context (and apps with instrumentation off) aren't measured
+    if not current_app or not current_app.config.get('INSTRUMENTATION_ENABLED', True):
+        return
+    histograms.observe('sql_query_duration_seconds', elapsed)
+
+    if has_request_context():
+        stats = g.get('instrumentation')
+        if stats is not None:
+            stats['queries'] += 1
+            stats['query_time'] += elapsed
+
+    config = current_app.config
+    slow = elapsed >= config.get('SLOW_QUERY_THRESHOLD', 0.1)
+    if slow:
+        counters.inc('sql_slow_queries_total')
+        current_app.extensions['slow_queries'].add(statement, elapsed)
+    # Slow statements are always logged; the rest are sampled
+    if slow or random.random() < config.get('SQL_LOG_SAMPLE_RATE', 0.0):
+        sql_logger.info(json.dumps({
+            'event': 'sql', 'statement': ' '.join(statement.split()),
+            'duration_ms': round(elapsed * 1000, 2), 'rows': cursor.rowcount, 'executemany': executemany,
+            'endpoint': request.endpoint if has_request_context() else None, 'slow': slow,
+        }))
@@ -0,0 +1,346 @@
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from flask import current_app, g, has_request_context
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .metrics import counters, gauges, histograms
+from .models import db, Job
+from .timeseries import utcnow
+
+
+logger = logging.getLogger('app.jobs')
+
+Handler = namedtuple('Handler', 'func batch max_attempts')
+HANDLERS = {}  # kind -> Handler
+PERIODIC = {}  # kind -> config key holding its interval in seconds
+
+# Seconds between a worker's housekeeping passes (stalled jobs, pruning)
+MAINTENANCE_INTERVAL = 60
+# Finished jobs read for the latency figures
+STATS_SAMPLE = 5000
+
+histograms.define('job_wait_seconds', (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300))
+
+
+def job(kind, batch=False, max_attempts=None, every=None):
+    """Registers the handler for ``kind``.
+
+    A handler gets one payload, or with ``batch`` a list of payloads from
+    jobs of the same kind claimed together. It runs in the worker's app
+    context, and its database changes commit together with the jobs being
+    marked done. A handler that raises has its whole batch retried with
+    backoff, so handlers must tolerate seeing a payload again.
+
+    ``every`` names a config key holding an interval in seconds; workers
+    then queue the job (with an empty payload) once per interval.
+    """
+    def register(func):
+        HANDLERS[kind] = Handler(func, batch, max_attempts)
+        if every:
+            PERIODIC[kind] = every
+        return func
+    return register
+
+
+def enqueue(kind, payload, idempotency_key=None, delay=0):
+    """Adds a job to the current transaction; it becomes visible to workers when the caller commits.
+
+    Returns False if a job with ``idempotency_key`` is already queued or
+    recently finished, in which case nothing is added.
+    """
+    handler = HANDLERS.get(kind)
+    if handler is None:
+        raise ValueError(f'Unknown job kind: {kind}')
+    now = utcnow()
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    result = db.session.execute(dialect.insert(Job).values(
+        kind=kind, payload=json.dumps(payload), status='queued', idempotency_key=idempotency_key,
+        attempts=0, max_attempts=handler.max_attempts or current_app.config.get('JOB_MAX_ATTEMPTS', 5),
+        run_at=now + timedelta(seconds=delay), created_at=now,
+    ).on_conflict_do_nothing(index_elements=['idempotency_key']))
+    if not result.rowcount:
+        counters.inc('jobs_deduplicated_total', kind=kind)
+        return False
+    counters.inc('jobs_enqueued_total', kind=kind)
+    if has_request_context():
+        g.jobs_enqueued = True
+    return True
+
+
+def claim(worker, batch_size=100, kinds=None):
+    """Marks the oldest ready job running, together with up to ``batch_size``
+    ready jobs of the same kind when its handler takes batches.
+
+    Returns (kind, rows); rows is empty when nothing is ready.
+    """
+    now = utcnow()
+    ready = db.select(Job.kind).filter(Job.status == 'queued', Job.run_at <= now)
+    if kinds:
+        ready = ready.filter(Job.kind.in_(kinds))
+    kind = db.session.execute(ready.order_by(Job.run_at, Job.id).limit(1)).scalar()
+    if kind is None:
+        db.session.rollback()  # end the read transaction
+        return None, []
+
+    handler = HANDLERS.get(kind)
+    ids = (db.select(Job.id)
+           .filter(Job.status == 'queued', Job.kind == kind, Job.run_at <= now)
+           .order_by(Job.run_at, Job.id)
+           .limit(batch_size if handler is not None and handler.batch else 1)
+           # Postgres workers skip rows another worker is claiming; SQLite has one writer anyway
+           .with_for_update(skip_locked=True))
+    rows = db.session.execute(
+        db.update(Job).filter(Job.id.in_(ids), Job.status == 'queued')
+        .values(status='running', attempts=Job.attempts + 1, started_at=now, worker=worker)
+        .returning(Job.id, Job.payload, Job.attempts, Job.max_attempts, Job.run_at)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return kind, rows
+
+
+def run_claimed(kind, rows):
+    """Runs one claimed batch and records the outcome. Returns True on success."""
+    handler = HANDLERS.get(kind)
+    ids = [row.id for row in rows]
+    now = utcnow()
+    for row in rows:
+        histograms.observe('job_wait_seconds', (now - row.run_at).total_seconds(), kind=kind)
+    started = time.perf_counter()
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for job kind {kind!r}')
+        payloads = [json.loads(row.payload) for row in rows]
+        if handler.batch:
+            handler.func(payloads)
+        else:
+            handler.func(payloads[0])
+        db.session.execute(
+            db.update(Job).filter(Job.id.in_(ids))
+            .values(status='done', finished_at=utcnow(), last_error=None)
+            .execution_options(synchronize_session=False))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc(limit=5)
+        logger.exception('Job batch %s (%d jobs) failed', kind, len(rows))
+        _retry_or_fail(rows, error)
+        counters.inc('jobs_total', len(rows), kind=kind, outcome='error')
+        return False
+    finally:
+        histograms.observe('job_run_seconds', time.perf_counter() - started, kind=kind)
+    counters.inc('jobs_total', len(rows), kind=kind, outcome='done')
+    return True
+
+
+def backoff(attempts):
+    """Seconds before retry number ``attempts``: exponential, capped, with jitter."""
+    config = current_app.config
+    delay = min(config.get('JOB_RETRY_BASE', 2) * 2 ** (attempts - 1), config.get('JOB_RETRY_MAX', 600))
+    return delay * random.uniform(0.5, 1.5)
+
+
+def _retry_or_fail(rows, error):
+    now = utcnow()
+    for row in rows:
+        if row.attempts >= row.max_attempts:
+            values = {'status': 'failed', 'finished_at': now}
+        else:
+            values = {'status': 'queued', 'run_at': now + timedelta(seconds=backoff(row.attempts))}
+        db.session.execute(db.update(Job).filter(Job.id == row.id).values(last_error=error, **values)
+                           .execution_options(synchronize_session=False))
+    db.session.commit()
+
+
+def requeue_stalled(timeout):
+    """Puts back jobs left running longer than ``timeout`` seconds (their worker died),
+    or fails them once they are out of attempts. Returns the number of jobs touched."""
+    now = utcnow()
+    result = db.session.execute(
+        db.update(Job).filter(Job.status == 'running', Job.started_at < now - timedelta(seconds=timeout))
+        .values(status=db.case((Job.attempts >= Job.max_attempts, 'failed'), else_='queued'), run_at=now,
+                last_error='Worker stopped before finishing the job.')
+        .execution_options(synchronize_session=False))
+    db.session.commit()
+    return result.rowcount
+
+
+def prune_finished(retention):
+    """Deletes jobs that finished successfully more than ``retention`` seconds ago,
+    which also frees their idempotency keys. Failed jobs are kept for inspection."""
+    result = db.session.execute(
+        db.delete(Job).filter(Job.status == 'done', Job.finished_at < utcnow() - timedelta(seconds=retention))
+        .execution_options(synchronize_session=False))
+    db.session.commit()
+    return result.rowcount
+
+
+def schedule_periodic():
+    """Queues each periodic job for the current interval, unless already queued.
+
+    The idempotency key names the interval, so every worker can call this
+    and the job still runs once per interval. Returns the kinds queued.
+    """
+    queued = []
+    for kind, key in PERIODIC.items():
+        interval = current_app.config.get(key)
+        if not interval:
+            continue
+        slot = int(time.time() // interval)
+        if enqueue(kind, {}, idempotency_key=f'periodic:{kind}:{slot}'):
+            queued.append(kind)
+    db.session.commit()
+    return queued
+
+
+def run_pending(worker='inline', batch_size=100, kinds=None, limit=None):
+    """Runs ready jobs in this thread until none are left (or ``limit`` batches ran).
+    Returns the number of batches run."""
+    batches = 0
+    while limit is None or batches < limit:
+        kind, rows = claim(worker, batch_size, kinds)
+        if not rows:
+            break
+        run_claimed(kind, rows)
+        batches += 1
+    return batches
+
+
+class Worker:
+    """A pool of threads claiming and running jobs until stopped."""
+
+    def __init__(self, app, concurrency=4, batch_size=100, poll_interval=0.5, kinds=None):
+        self.app = app
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.kinds = kinds
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self._stop = threading.Event()
+
+    def run(self, once=False):
+        """Blocks until stop() (or, with ``once``, until no job is ready)."""
+        threads = [threading.Thread(target=self._loop, args=(n, once), name=f'job-worker-{n}', daemon=True)
+                   for n in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)  # wakes for KeyboardInterrupt
+        except KeyboardInterrupt:
+            self.stop()
+            for thread in threads:
+                thread.join()
+
+    def stop(self):
+        """Lets running batches finish, then ends every thread."""
+        self._stop.set()
+
+    def _loop(self, n, once):
+        name = f'{self.name}/{n}'
+        last_maintenance = 0
+        with self.app.app_context():
+            config = self.app.config
+            while not self._stop.is_set():
+                try:
+                    if n == 0 and time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                        last_maintenance = time.monotonic()
+                        requeue_stalled(config.get('JOB_TIMEOUT', 300))
+                        prune_finished(config.get('JOB_RETENTION', 7 * 86400))
+                        schedule_periodic()
+                    kind, rows = claim(name, self.batch_size, self.kinds)
+                    if rows:
+                        run_claimed(kind, rows)
+                        continue
+                except Exception:
+                    # The database is unreachable or locked; try again after a pause
+                    db.session.rollback()
+                    logger.exception('Job worker %s could not claim jobs', name)
+                finally:
+                    db.session.close()  # don't hold a pooled connection between polls
+                if once:
+                    return
+                self._stop.wait(self.poll_interval)
+
+
+def jobs_eager(app):
+    """JOBS_EAGER: run jobs at the end of the request that queued them; None means in debug and testing."""
+    setting = app.config.get('JOBS_EAGER')
+    return app.debug or app.testing if setting is None else setting
+
+
+def init_jobs(app):
+    """Runs queued jobs inline after each request when jobs_eager(app), so
+    development and tests don't need `flask worker`."""
+    app.after_request(_run_eagerly)
+
+
+def _run_eagerly(response):
+    if g.pop('jobs_enqueued', False) and jobs_eager(current_app):
+        run_pending(batch_size=current_app.config.get('JOB_BATCH_SIZE', 100))
+    return response
+
+
+def _depth():
+    depth = defaultdict(dict)
+    for kind, status, count in db.session.execute(
+            db.select(Job.kind, Job.status, db.func.count())
+            .filter(Job.status.in_(('queued', 'running', 'failed'))).group_by(Job.kind, Job.status)):
+        depth[kind][status] = count
+    return dict(depth)
+
+
+def _oldest_ready():
+    now = utcnow()
+    return {kind: (now - run_at).total_seconds() for kind, run_at in db.session.execute(
+        db.select(Job.kind, db.func.min(Job.run_at))
+        .filter(Job.status == 'queued', Job.run_at <= now).group_by(Job.kind))}
+
+
+def _quantiles(samples):
+    samples.sort()
+
+    def pick(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p))]
+    return {'count': len(samples), 'p50': pick(0.5), 'p95': pick(0.95), 'max': samples[-1]}
+
+
+def queue_stats(window=900):
+    """Queue depth per kind and status, age of the oldest ready job, and
+    wait (ready to started) and run times of jobs finished in the last ``window`` seconds."""
+    now = utcnow()
+    waits, runs = defaultdict(list), defaultdict(list)
+    for kind, run_at, started_at, finished_at in db.session.execute(
+            db.select(Job.kind, Job.run_at, Job.started_at, Job.finished_at)
+            .filter(Job.finished_at >= now - timedelta(seconds=window), Job.status == 'done')
+            .order_by(Job.finished_at.desc()).limit(STATS_SAMPLE)):
+        waits[kind].append((started_at - run_at).total_seconds())
+        runs[kind].append((finished_at - started_at).total_seconds())
+    return {
+        'depth': _depth(),
+        'oldest_ready_seconds': _oldest_ready(),
+        'wait_seconds': {kind: _quantiles(samples) for kind, samples in waits.items()},
+        'run_seconds': {kind: _quantiles(samples) for kind, samples in runs.items()},
+    }
+
+
+# Read from the job table at scrape time, so they cover every worker process
+gauges.register('job_queue_depth', lambda: {
+    (('kind', kind), ('status', status)): count
+    for kind, statuses in _depth().items() for status, count in statuses.items()})
+gauges.register('job_oldest_ready_seconds', lambda: {
+    (('kind', kind),): age for kind, age in _oldest_ready().items()})
+gauges.register('job_recent_wait_seconds', lambda: {
+    (('kind', kind), ('quantile', quantile)): figures[key]
+    for kind, figures in queue_stats()['wait_seconds'].items()
+    for quantile, key in (('0.5', 'p50'), ('0.95', 'p95'))})
@@ -0,0 +1,97 @@
+from datetime import date
+
+from flask import current_app
+
+from .fragment_cache import invalidate_fragments
+from .jobs import job
+from .models import db, Campaign, AdRequest
+from .timeseries import record_transitions, utcnow
+
+
+SWEEP_BATCH_SIZE = 500
+
+
+def _expire_pending(campaign_ids, batch_size, now):
+    """Moves up to ``batch_size`` pending ad requests on ``campaign_ids`` to expired.
+
+    One UPDATE ... RETURNING; the returned rows feed the activity log,
+    which a bulk UPDATE otherwise skips. Returns the number expired.
+    """
+    pending = (db.select(AdRequest.id)
+               .filter(AdRequest.campaign_id.in_(campaign_ids), AdRequest.status == 'pending')
+               .limit(batch_size))
+    rows = db.session.execute(
+        db.update(AdRequest).filter(AdRequest.id.in_(pending), AdRequest.status == 'pending')
+        .values(status='expired')
+        .returning(AdRequest.id, AdRequest.influencer_id, AdRequest.campaign_id, AdRequest.payment_amount)
+        .execution_options(synchronize_session=False)
+    ).all()
+    # pending -> expired moves no rollup or matching figure, only the activity log
+    record_transitions(db.session.connection(), [
+        {'ad_request_id': row.id, 'influencer_id': row.influencer_id, 'campaign_id': row.campaign_id,
+         'old_status': 'pending', 'new_status': 'expired',
+         'payment_amount': row.payment_amount, 'old_payment_amount': row.payment_amount}
+        for row in rows
+    ], now=now)
+    return len(rows)
+
+
+def close_expired_campaigns(today=None, batch_size=SWEEP_BATCH_SIZE):
+    """Closes active campaigns whose end date is before ``today`` and expires their pending ad requests.
+
+    Campaigns are taken ``batch_size`` at a time off ix_campaign_status_end_date.
+    Their pending ad requests are expired ``batch_size`` rows per transaction,
+    so no write lock is held for long; the last pass commits together with
+    closing the campaigns. A sweep that stops part way leaves its campaigns
+    active, and the next one picks them up again.
+
+    Returns a dict with the number of campaigns closed and ad requests expired.
+    """
+    today = today or date.today()
+    closed = expired = 0
+    while True:
+        ids = db.session.execute(
+            db.select(Campaign.id).filter(Campaign.status == 'active', Campaign.end_date < today)
+            .order_by(Campaign.end_date, Campaign.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            db.session.rollback()  # end the read transaction
+            break
+        try:
+            while True:
+                now = utcnow()
+                count = _expire_pending(ids, batch_size, now)
+                expired += count
+                if count < batch_size:
+                    break
+                db.session.commit()
+            db.session.execute(
+                db.update(Campaign).filter(Campaign.id.in_(ids), Campaign.status == 'active')
+                .values(status='closed', closed_at=now)
+                .execution_options(synchronize_session=False))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        closed += len(ids)
+        # The bulk UPDATEs skipped the session's commit hooks
+        invalidate_fragments([(kind, campaign_id) for campaign_id in ids
+                              for kind in ('campaign', 'campaign_ad_requests')])
+    return {'campaigns': closed, 'ad_requests': expired}
+
+
+def reopen_if_extended(campaign, today=None):
+    """Reopens a closed campaign whose end date has been moved to ``today`` or later.
+
+    Its expired ad requests stay expired. Returns True if it was reopened.
+    """
+    if campaign.status != 'closed' or campaign.end_date < (today or date.today()):
+        return False
+    campaign.status, campaign.closed_at = 'active', None
+    return True
+
+
+@job('close_expired_campaigns', max_attempts=3, every='CAMPAIGN_SWEEP_INTERVAL')
+def close_expired_campaigns_job(payload):
+    """The periodic sweep, queued by `flask worker` every CAMPAIGN_SWEEP_INTERVAL seconds."""
+    close_expired_campaigns(batch_size=current_app.config.get('CAMPAIGN_SWEEP_BATCH_SIZE', SWEEP_BATCH_SIZE))
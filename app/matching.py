@@ -0,0 +1,260 @@
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import event
+
+from .models import db, User, AdRequest, SocialMediaLink
+
+
+# Matches the platform choices on SocialMediaLinkForm; anything else counts as 'other'
+PLATFORMS = ('facebook', 'instagram', 'twitter', 'youtube', 'linkedin', 'tiktok', 'other')
+# Terms are hashed into a fixed-width bitset per influencer, so text overlap
+# is an AND and a popcount rather than a set intersection per row
+TEXT_BITS = 1024
+TEXT_WORDS = TEXT_BITS // 64
+WEIGHTS = {'acceptance': 0.35, 'payment': 0.2, 'platforms': 0.15, 'text': 0.3}
+STOPWORDS = frozenset('the and for with our you your are this that from will into have has was were '
+                      'not but all can its out who get more new'.split())
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def terms(*texts):
+    """Lowercased words of three letters or more, minus common stopwords."""
+    words = set()
+    for text in texts:
+        words.update(w for w in _WORD.findall((text or '').lower()) if len(w) > 2 and w not in STOPWORDS)
+    return words
+
+
+def term_bitsets(term_sets):
+    """Hashes each set of words into a TEXT_BITS-wide bitset; returns an (n, TEXT_WORDS) uint64 array."""
+    rows, hashes = [], []
+    for row, words in enumerate(term_sets):
+        for word in words:
+            rows.append(row)
+            hashes.append(zlib.crc32(word.encode()) % TEXT_BITS)  # stable across processes, unlike hash()
+    bits = np.zeros((len(term_sets), TEXT_WORDS), dtype=np.uint64)
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    np.bitwise_or.at(bits, (np.asarray(rows, dtype=np.int64), (hashes >> np.uint64(6)).astype(np.int64)),
+                     np.uint64(1) << (hashes & np.uint64(63)))
+    return bits
+
+
+def term_bits(words):
+    """The bitset of a single set of words."""
+    return term_bitsets([words])[0]
+
+
+class MatchIndex:
+    """Feature matrices for every influencer, scored against a campaign in one pass.
+
+    One row per influencer: smoothed acceptance rate, average accepted
+    payment, share of platforms covered and a bitset of niche/bio terms.
+    Rows are refreshed incrementally: writers mark influencers stale and the
+    next shortlist() reloads just those rows (plus influencers created
+    since). A full rebuild every ``rebuild_interval`` seconds picks up
+    changes committed by other processes.
+    """
+
+    def __init__(self, capacity=1024, rebuild_interval=600):
+        self.rebuild_interval = rebuild_interval
+        self.size = 0
+        self.rows = {}  # influencer id -> row
+        self.max_id = 0
+        self.built_at = None
+        self._allocate(capacity)
+        self._stale = set()
+        self._lock = threading.Lock()
+
+    def _allocate(self, capacity):
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.acceptance = np.zeros(capacity, dtype=np.float32)
+        self.avg_payment = np.full(capacity, np.nan, dtype=np.float32)
+        self.platforms = np.zeros(capacity, dtype=np.float32)
+        self.bits = np.zeros((capacity, TEXT_WORDS), dtype=np.uint64)
+
+    def _grow(self, needed):
+        capacity = len(self.ids)
+        if needed <= capacity:
+            return
+        old = (self.ids, self.active, self.acceptance, self.avg_payment, self.platforms, self.bits)
+        self._allocate(max(needed, capacity * 2))
+        for new, array in zip((self.ids, self.active, self.acceptance, self.avg_payment,
+                               self.platforms, self.bits), old):
+            new[:self.size] = array[:self.size]
+
+    def update(self, ids, active, acceptance, avg_payment, platforms, bits):
+        """Writes feature rows for ``ids``, adding rows for influencers not seen before."""
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = np.empty(len(ids), dtype=np.int64)
+        for i, influencer_id in enumerate(ids.tolist()):
+            row = self.rows.get(influencer_id)
+            if row is None:
+                row = self.rows[influencer_id] = len(self.rows)
+            rows[i] = row
+        self._grow(len(self.rows))
+        self.size = len(self.rows)
+        self.ids[rows] = ids
+        self.active[rows] = active
+        self.acceptance[rows] = acceptance
+        self.avg_payment[rows] = avg_payment
+        self.platforms[rows] = platforms
+        self.bits[rows] = bits
+        if len(ids):
+            self.max_id = max(self.max_id, int(ids.max()))
+
+    def mark_stale(self, influencer_ids):
+        with self._lock:
+            self._stale.update(influencer_ids)
+
+    def refresh(self, force=False):
+        """Reloads stale rows, or everything when forced or past the rebuild interval."""
+        with self._lock:
+            if force or self.built_at is None or time.monotonic() - self.built_at > self.rebuild_interval:
+                self._stale.clear()
+                self.size, self.rows, self.max_id = 0, {}, 0
+                self.update(*load_features())
+                self.built_at = time.monotonic()
+                return
+            stale, self._stale = self._stale, set()
+            if stale:
+                features = load_features(ids=stale)
+                self.update(*features)
+                # Deleted, or no longer an influencer
+                gone = [self.rows[i] for i in stale - set(features[0]) if i in self.rows]
+                self.active[gone] = False
+            # New influencers, including bulk imports that skip the session hooks
+            self.update(*load_features(after_id=self.max_id))
+
+    def scores(self, words, budget):
+        """Scores every row against a campaign's terms and budget; inactive rows get -inf."""
+        n = self.size
+        campaign_bits = term_bits(words)
+        # Fraction of the campaign's terms found in the influencer's niche and bio
+        wanted = max(int(np.bitwise_count(campaign_bits).sum()), 1)
+        text = np.bitwise_count(self.bits[:n] & campaign_bits).sum(axis=1, dtype=np.float32) / wanted
+        # Influencers who have usually been paid within the budget fit; no history is neutral
+        payment = np.minimum(np.float32(budget) / np.maximum(self.avg_payment[:n], 1), 1)
+        payment = np.where(np.isnan(payment), np.float32(0.5), payment)
+        total = (WEIGHTS['acceptance'] * self.acceptance[:n] + WEIGHTS['payment'] * payment
+                 + WEIGHTS['platforms'] * self.platforms[:n] + WEIGHTS['text'] * text)
+        return np.where(self.active[:n], total, -np.inf)
+
+    def top(self, words, budget, k=10, exclude=()):
+        """Returns up to ``k`` (influencer id, score) pairs, best first, skipping ``exclude`` ids."""
+        with self._lock:
+            total = self.scores(words, budget)
+            rows = [self.rows[i] for i in exclude if i in self.rows]
+            total[rows] = -np.inf
+            k = min(k, len(total))
+            if k == 0:
+                return []
+            # argpartition finds the k best in linear time; only those k are sorted
+            best = np.argpartition(-total, k - 1)[:k]
+            best = best[np.argsort(-total[best], kind='stable')]
+            return [(int(self.ids[row]), float(total[row])) for row in best if np.isfinite(total[row])]
+
+
+def load_features(ids=None, after_id=None):
+    """Reads feature arrays for influencers (all of them, ``ids``, or those above ``after_id``).
+
+    Returns (ids, active, acceptance, avg_payment, platforms, bits) for
+    MatchIndex.update.
+    """
+    users = db.select(User.id, User.is_active, User.niche, User.bio).filter(User.role == 'influencer')
+    if ids is not None:
+        users = users.filter(User.id.in_(list(ids)))
+    if after_id is not None:
+        users = users.filter(User.id > after_id)
+    users = db.session.execute(users.order_by(User.id)).all()
+    found = [u.id for u in users]
+
+    def scoped(column, query):
+        if ids is not None:
+            return query.filter(column.in_(found))
+        if after_id is not None:
+            return query.filter(column > after_id)
+        return query
+
+    # Acceptance over decided requests, smoothed towards 50% so one answer doesn't dominate
+    history = dict((row[0], row[1:]) for row in db.session.execute(scoped(AdRequest.influencer_id, db.select(
+        AdRequest.influencer_id,
+        db.func.sum(db.case((AdRequest.status == 'accepted', 1), else_=0)),
+        db.func.sum(db.case((AdRequest.status.in_(('accepted', 'rejected')), 1), else_=0)),
+        db.func.avg(db.case((AdRequest.status == 'accepted', AdRequest.payment_amount))),
+    ).group_by(AdRequest.influencer_id))))
+    platforms = {}
+    for influencer_id, platform in db.session.execute(scoped(SocialMediaLink.influencer_id, db.select(
+            SocialMediaLink.influencer_id, SocialMediaLink.platform).distinct())):
+        platforms.setdefault(influencer_id, set()).add(platform if platform in PLATFORMS else 'other')
+
+    n = len(users)
+    active = np.zeros(n, dtype=bool)
+    acceptance = np.zeros(n, dtype=np.float32)
+    avg_payment = np.full(n, np.nan, dtype=np.float32)
+    coverage = np.zeros(n, dtype=np.float32)
+    for i, user in enumerate(users):
+        accepted, decided, payment = history.get(user.id, (0, 0, None))
+        active[i] = user.is_active is not False
+        acceptance[i] = ((accepted or 0) + 1) / ((decided or 0) + 2)
+        if payment is not None:
+            avg_payment[i] = payment
+        coverage[i] = len(platforms.get(user.id, ())) / len(PLATFORMS)
+    bits = term_bitsets([terms(user.niche, user.bio) for user in users])
+    return found, active, acceptance, avg_payment, coverage, bits
+
+
+def init_matching(app):
+    """Creates the (lazily built) influencer match index."""
+    app.extensions['match_index'] = MatchIndex(
+        rebuild_interval=app.config.get('MATCHING_REBUILD_INTERVAL', 600))
+
+
+def shortlist(campaign, k=10):
+    """Returns the ``k`` best (influencer id, score) pairs for ``campaign``,
+    leaving out influencers already on it."""
+    index = current_app.extensions['match_index']
+    index.refresh()
+    assigned = db.session.execute(
+        db.select(AdRequest.influencer_id).filter(AdRequest.campaign_id == campaign.id)
+    ).scalars().all()
+    return index.top(terms(campaign.description, campaign.goals), campaign.budget, k=k, exclude=assigned)
+
+
+def _stale_influencers(session, obj):
+    if isinstance(obj, AdRequest):
+        return [obj.influencer_id]
+    if isinstance(obj, SocialMediaLink):
+        return [obj.influencer_id]
+    if isinstance(obj, User):
+        return [obj.id]
+    return []
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changes(session, flush_context):
+    stale = session.info.setdefault('stale_influencers', set())
+    for obj in session.new | session.deleted:
+        stale.update(_stale_influencers(session, obj))
+    for obj in session.dirty:
+        if session.is_modified(obj):
+            stale.update(_stale_influencers(session, obj))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _mark_stale(session):
+    stale = session.info.pop('stale_influencers', None)
+    index = current_app.extensions.get('match_index') if current_app else None
+    if stale and index is not None:
+        # Unlinked social links lose their influencer_id; the user is marked through its collection
+        index.mark_stale(i for i in stale if i is not None)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('stale_influencers', None)
@@ -0,0 +1,139 @@
+import threading
+from collections import defaultdict
+
+
+class Counters:
+    """Thread-safe named counters with optional labels, e.g. inc('x_total', scope='ip')."""
+
+    def __init__(self):
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] += value
+
+    def get(self, name, **labels):
+        return self._values.get((name, tuple(sorted(labels.items()))), 0)
+
+    def snapshot(self):
+        """Returns {(name, ((label, value), ...)): count} for every counter."""
+        with self._lock:
+            return dict(self._values)
+
+
+# Process-wide registry
+counters = Counters()
+
+
+# Seconds; Prometheus' default latency buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histograms:
+    """Thread-safe bucketed histograms with optional labels, e.g. observe('x_seconds', 0.2, endpoint='a')."""
+
+    def __init__(self):
+        self._buckets = {}  # name -> upper bounds
+        self._values = {}   # (name, labels) -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def define(self, name, buckets):
+        """Sets the bucket bounds for ``name``; names not defined use DEFAULT_BUCKETS."""
+        self._buckets[name] = tuple(sorted(buckets))
+
+    def observe(self, name, value, **labels):
+        bounds = self._buckets.get(name, DEFAULT_BUCKETS)
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(bounds) + 2)
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    values[i] += 1
+                    break
+            values[-2] += value
+            values[-1] += 1
+
+    def snapshot(self):
+        """Returns {(name, labels): (bounds, cumulative bucket counts, sum, count)}."""
+        with self._lock:
+            items = [(key, list(values)) for key, values in self._values.items()]
+        result = {}
+        for (name, labels), values in items:
+            bounds = self._buckets.get(name, DEFAULT_BUCKETS)
+            cumulative, total = [], 0
+            for count in values[:len(bounds)]:
+                total += count
+                cumulative.append(total)
+            result[(name, labels)] = (bounds, cumulative, values[-2], values[-1])
+        return result
+
+
+histograms = Histograms()
+
+
+class Gauges:
+    """Values read when metrics are scraped, e.g. from the database.
+
+    register('x', fn) where fn() returns {labels dict as tuple of pairs: value}.
+    """
+
+    def __init__(self):
+        self._collectors = {}
+
+    def register(self, name, collect):
+        self._collectors[name] = collect
+
+    def snapshot(self):
+        """Returns {name: {labels: value}}; a collector that fails is left out."""
+        result = {}
+        for name, collect in list(self._collectors.items()):
+            try:
+                result[name] = collect()
+            except Exception:
+                continue
+        return result
+
+
+gauges = Gauges()
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def render_prometheus():
+    """Every counter, histogram and gauge in the Prometheus text exposition format."""
+    lines = []
+    by_name = defaultdict(list)
+    for (name, labels), value in counters.snapshot().items():
+        by_name[name].append((labels, value))
+    for name in sorted(by_name):
+        lines.append(f'# TYPE {name} counter')
+        for labels, value in sorted(by_name[name]):
+            lines.append(f'{name}{_labels(labels)} {value:g}')
+
+    by_name = defaultdict(list)
+    for (name, labels), values in histograms.snapshot().items():
+        by_name[name].append((labels, values))
+    for name in sorted(by_name):
+        lines.append(f'# TYPE {name} histogram')
+        for labels, (bounds, cumulative, total, count) in sorted(by_name[name], key=lambda item: item[0]):
+            for bound, n in zip(bounds, cumulative):
+                lines.append(f'{name}_bucket{_labels(labels, [("le", f"{bound:g}")])} {n}')
+            lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{name}_sum{_labels(labels)} {total:g}')
+            lines.append(f'{name}_count{_labels(labels)} {count}')
+
+    for name, values in sorted(gauges.snapshot().items()):
+        lines.append(f'# TYPE {name} gauge')
+        for labels, value in sorted(values.items()):
+            lines.append(f'{name}{_labels(labels)} {value:g}')
+    return '\n'.join(lines) + '\n'
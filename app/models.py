@@ -1,30 +1,39 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from .hashing import hash_password, verify_password
+from .routing import RoutingSession
 
-db = SQLAlchemy()
+# Reads in @read_replica views may go to a replica; see app/routing.py
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(20), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(128))
-    role = db.Column(db.String(10), nullable=False)  # 'admin', 'sponsor', 'influencer'
+    role = db.Column(db.String(10), nullable=False, index=True)  # 'admin', 'sponsor', 'influencer'
     is_active = db.Column(db.Boolean, default=True)
-    is_flagged = db.Column(db.Boolean, default=False)
+    is_flagged = db.Column(db.Boolean, default=False, index=True)
     notes = db.Column(db.Text)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), index=True)  # influencers only
+    niche = db.Column(db.String(100))  # influencers only
+    bio = db.Column(db.Text)  # influencers only
 
     # Relationships
+    category = db.relationship('Category', backref='influencers')
     campaigns = db.relationship('Campaign', backref='sponsor', lazy=True)
     ad_requests = db.relationship('AdRequest', backref='influencer', lazy=True)
     
     social_media_links = db.relationship('SocialMediaLink', backref='influencer', lazy=True)
 
+    # Case-insensitive username prefix search within a role (influencer typeahead)
+    __table_args__ = (db.Index('ix_user_role_username_lower', 'role', db.func.lower(username)),)
+
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -37,19 +46,68 @@ class Campaign(db.Model):
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
     budget = db.Column(db.Integer, nullable=False)
-    visibility = db.Column(db.String(10), default='public') 
+    visibility = db.Column(db.String(10), default='public', index=True)
+    # 'active', or 'closed' once app/lifecycle.py has swept it past its end date
+    status = db.Column(db.String(10), nullable=False, default='active', server_default='active')
+    closed_at = db.Column(db.DateTime)
     goals = db.Column(db.Text)
-    sponsor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    sponsor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'))
+    category = db.relationship('Category', backref='campaigns')
     ad_requests = db.relationship('AdRequest', backref='campaign', lazy=True)
 
+    # Covering indexes for the discovery feed, one per sort order. The sort
+    # key and id come first so each page is a range scan in order; the other
+    # filter columns ride along so rows are filtered without touching the table.
+    __table_args__ = (
+        db.Index('ix_campaign_discover_budget',
+                 'visibility', 'status', 'budget', 'id', 'end_date', 'start_date', 'category_id'),
+        db.Index('ix_campaign_discover_end_date',
+                 'visibility', 'status', 'end_date', 'id', 'start_date', 'budget', 'category_id'),
+        # The lifecycle sweep: active campaigns in end date order, a range scan up to today
+        db.Index('ix_campaign_status_end_date', 'status', 'end_date', 'id'),
+    )
+
 class AdRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     campaign_id = db.Column(db.Integer, db.ForeignKey('campaign.id'), nullable=False)
     influencer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     requirements = db.Column(db.Text, nullable=False)
     payment_amount = db.Column(db.Integer, nullable=False)
-    status = db.Column(db.String(20), default='pending') 
+    status = db.Column(db.String(20), default='pending', index=True)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+    # Newest message in the thread, kept up to date by app/conversations.py
+    last_message_id = db.Column(db.Integer)
+    last_message_at = db.Column(db.DateTime)
     messages = db.relationship('Message', backref='ad_request', lazy=True)
+    status_changes = db.relationship('AdRequestStatusChange', backref='ad_request', lazy=True, cascade='all, delete-orphan')
+    conversation_states = db.relationship('ConversationState', backref='ad_request', lazy=True, cascade='all, delete-orphan')
+
+    __table_args__ = (
+        # campaign_id leads so sponsor.ad_requests and the "already assigned" check share it;
+        # unique so concurrent fan-outs can't assign an influencer twice
+        db.Index('ix_ad_request_campaign_id_influencer_id', 'campaign_id', 'influencer_id', unique=True),
+        db.Index('ix_ad_request_influencer_id_status', 'influencer_id', 'status'),
+        # The lifecycle sweep's pending ad requests of a batch of campaigns
+        db.Index('ix_ad_request_campaign_id_status', 'campaign_id', 'status'),
+    )
+
+class AdRequestStatusChange(db.Model):
+    """One status transition of an ad request, recorded by app/timeseries.py."""
+    id = db.Column(db.Integer, primary_key=True)
+    ad_request_id = db.Column(db.Integer, db.ForeignKey('ad_request.id'), nullable=False)
+    old_status = db.Column(db.String(20))  # None when the ad request was created
+    new_status = db.Column(db.String(20), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
+
+    __table_args__ = (db.Index('ix_ad_request_status_change_ad_request_id', 'ad_request_id', 'changed_at'),)
+
+class ConversationState(db.Model):
+    """One participant's read marker and unread count on an ad request's thread."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    ad_request_id = db.Column(db.Integer, db.ForeignKey('ad_request.id'), primary_key=True)
+    last_read_message_id = db.Column(db.Integer, nullable=False, default=0)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
 
 class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -59,6 +117,17 @@ class Message(db.Model):
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=db.func.now())
 
+    # Keyset pagination in admin.manage_messages walks these indexes newest first;
+    # the filtered variants also serve as the foreign key indexes.
+    __table_args__ = (
+        db.Index('ix_message_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_message_ad_request_id_timestamp', 'ad_request_id', 'timestamp', 'id'),
+        db.Index('ix_message_sender_id_timestamp', 'sender_id', 'timestamp', 'id'),
+        db.Index('ix_message_recipient_id_timestamp', 'recipient_id', 'timestamp', 'id'),
+        # Inbox streams catch up on a recipient's messages by id (Last-Event-ID)
+        db.Index('ix_message_recipient_id_id', 'recipient_id', 'id'),
+    )
+
     # Define relationships to User model
     sender = db.relationship('User', foreign_keys=[sender_id])
     recipient = db.relationship('User', foreign_keys=[recipient_id])
@@ -67,8 +136,71 @@ class Message(db.Model):
 
 class SocialMediaLink(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    influencer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    influencer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     platform = db.Column(db.String(50), nullable=False)
     url = db.Column(db.String(200), nullable=False)
 
 
+# Rollups maintained by app/rollups.py in the same transaction as the
+# AdRequest and User changes they summarise. Rebuild with `flask rebuild-rollups`.
+
+class InfluencerStats(db.Model):
+    influencer_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    request_count = db.Column(db.Integer, nullable=False, default=0, index=True)
+    accepted_count = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+class CampaignStats(db.Model):
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaign.id'), primary_key=True)
+    request_count = db.Column(db.Integer, nullable=False, default=0)
+    accepted_count = db.Column(db.Integer, nullable=False, default=0)
+    accepted_spend = db.Column(db.Integer, nullable=False, default=0)
+
+class SponsorStats(db.Model):
+    sponsor_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    accepted_spend = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+class CategoryStats(db.Model):
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), primary_key=True)
+    influencer_count = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+class PlatformStats(db.Model):
+    name = db.Column(db.String(50), primary_key=True)  # e.g. 'accepted_spend'
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class ActivityBucket(db.Model):
+    """A counter for one metric in one day, week or month, appended to as events happen.
+
+    scope is '' for platform-wide series, or 'sponsor'/'category' with scope_id set.
+    """
+    granularity = db.Column(db.String(5), primary_key=True)  # 'day', 'week', 'month'
+    metric = db.Column(db.String(20), primary_key=True)  # 'created', 'accepted', ..., 'accepted_spend'
+    scope = db.Column(db.String(10), primary_key=True, default='')
+    scope_id = db.Column(db.Integer, primary_key=True, default=0)
+    bucket_start = db.Column(db.Date, primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Job(db.Model):
+    """A unit of background work, run by `flask worker` (see app/jobs.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    status = db.Column(db.String(10), nullable=False, default='queued')  # 'queued', 'running', 'done', 'failed'
+    # Enqueueing a key that is already present is a no-op, until the old job is pruned
+    idempotency_key = db.Column(db.String(200), unique=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    worker = db.Column(db.String(100))
+    last_error = db.Column(db.Text)
+
+    __table_args__ = (
+        # Workers claim the oldest ready jobs, optionally of one kind
+        db.Index('ix_job_status_run_at', 'status', 'run_at', 'id'),
+        db.Index('ix_job_status_kind_run_at', 'status', 'kind', 'run_at', 'id'),
+        # Pruning and latency stats read finished jobs by time
+        db.Index('ix_job_finished_at', 'finished_at'),
+    )
@@ -0,0 +1,37 @@
+import hashlib
+from datetime import datetime
+
+from .jobs import enqueue, job
+from .models import db, AdRequest, Message
+from .timeseries import utcnow
+
+
+def queue_message(ad_request, sender_id, recipient_id, content):
+    """Queues a thread message on ``ad_request``; it is written by the worker after the caller commits.
+
+    Resubmitting the same message before the thread moves on (a double
+    click, a retried POST) is a no-op: the idempotency key covers the
+    thread's current last message and the content.
+    """
+    digest = hashlib.sha1(content.encode()).hexdigest()[:16]
+    return enqueue('send_message', {
+        'ad_request_id': ad_request.id, 'sender_id': sender_id, 'recipient_id': recipient_id,
+        'content': content, 'sent_at': utcnow().isoformat(),
+    }, idempotency_key=f'message:{ad_request.id}:{sender_id}:{ad_request.last_message_id or 0}:{digest}')
+
+
+@job('send_message', batch=True)
+def send_messages(payloads):
+    """Writes a batch of queued messages in one flush.
+
+    The flush listeners update unread counts and thread summaries, and
+    wake the recipients' inbox streams on commit. Messages on ad requests
+    deleted in the meantime are dropped.
+    """
+    ids = {payload['ad_request_id'] for payload in payloads}
+    existing = set(db.session.execute(db.select(AdRequest.id).filter(AdRequest.id.in_(ids))).scalars())
+    db.session.add_all(
+        Message(ad_request_id=payload['ad_request_id'], sender_id=payload['sender_id'],
+                recipient_id=payload['recipient_id'], content=payload['content'],
+                timestamp=datetime.fromisoformat(payload['sent_at']))
+        for payload in payloads if payload['ad_request_id'] in existing)
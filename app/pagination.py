@@ -0,0 +1,89 @@
+import base64
+import json
+from datetime import date, datetime
+
+from .models import db
+
+
+class KeysetPage:
+    """One page of results from a keyset (cursor) paginated query."""
+
+    def __init__(self, items, next_cursor=None, per_page=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(values):
+    """Encodes a tuple of sort key values into an opaque URL-safe cursor."""
+    payload = [v.isoformat() if isinstance(v, date) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Decodes a cursor back into sort key values, or None if it is invalid."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(payload, list) or len(payload) != len(columns):
+        return None
+
+    values = []
+    for column, value in zip(columns, payload):
+        if value is not None and isinstance(column.type, (db.DateTime, db.Date)):
+            parse = datetime.fromisoformat if isinstance(column.type, db.DateTime) else date.fromisoformat
+            try:
+                value = parse(value)
+            except (TypeError, ValueError):
+                return None
+        values.append(value)
+    return values
+
+
+def _after(columns, values, descending):
+    """Builds the WHERE clause selecting rows strictly past the cursor."""
+    # Expanded form of (a, b) < (x, y) so it works on every backend and
+    # still lets the planner use a composite index on (a, b).
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        beyond = column < value if descending else column > value
+        equal = [c == v for c, v in zip(columns[:i], values[:i])]
+        clauses.append(db.and_(*equal, beyond))
+    return db.or_(*clauses)
+
+
+def keyset_paginate(query, columns, cursor=None, per_page=50, descending=True):
+    """Returns a KeysetPage for ``query`` ordered by ``columns``.
+
+    ``columns`` must form a unique sort key (end it with the primary key).
+    Only ``per_page + 1`` rows are fetched, so the cost of a page does not
+    grow with the size of the table.
+    """
+    values = decode_cursor(cursor, columns)
+    if values is not None:
+        query = query.filter(_after(columns, values, descending))
+
+    order = [c.desc() if descending else c.asc() for c in columns]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+    return KeysetPage(rows, next_cursor=next_cursor, per_page=per_page)
@@ -0,0 +1,34 @@
+"""Pytest fixtures for query budgets.
+
+Enable with ``pytest -p app.pytest_plugin`` or ``pytest_plugins =
+['app.pytest_plugin']`` in a conftest. The request-level fixtures expect the
+project to provide an ``app`` fixture.
+
+    def test_ad_request_list(client, query_budget):
+        with query_budget(4):
+            client.get('/sponsor/ad_requests/1')
+
+    def test_manage_messages(client, no_n_plus_one):
+        client.get('/admin/messages')  # fails on a per-row lazy load
+"""
+import pytest
+
+from .querycount import query_budget as _query_budget, REPEAT_THRESHOLD
+
+
+@pytest.fixture
+def query_budget():
+    """The query_budget context manager, always enforced regardless of app config."""
+    def budget(max_queries=None, repeat_threshold=REPEAT_THRESHOLD):
+        return _query_budget(max_queries, repeat_threshold=repeat_threshold, always=True)
+    return budget
+
+
+@pytest.fixture
+def no_n_plus_one(app):
+    """Fails any request in the test that repeats a statement QUERY_REPEAT_THRESHOLD times."""
+    saved = {key: app.config.get(key) for key in ('QUERY_DETECTOR_ENABLED', 'QUERY_DETECTOR_RAISE',
+                                                   'QUERY_BUDGETS_ENFORCED')}
+    app.config.update(QUERY_DETECTOR_ENABLED=True, QUERY_DETECTOR_RAISE=True, QUERY_BUDGETS_ENFORCED=True)
+    yield
+    app.config.update(saved)
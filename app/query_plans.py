@@ -0,0 +1,94 @@
+from .models import db, User, Campaign, AdRequest, ConversationState, Message, SocialMediaLink
+
+
+# Representative queries behind the dashboards, keyed by the view that runs
+# them. Each entry is (name, builder, allow_scan); builders return a select()
+# with placeholder ids, which is all EXPLAIN needs to pick a plan.
+KNOWN_QUERIES = [
+    ('sponsor.campaigns',
+     lambda: db.select(Campaign).filter_by(sponsor_id=1), False),
+    ('sponsor.ad_requests',
+     lambda: db.select(AdRequest).filter_by(campaign_id=1), False),
+    ('sponsor.create_ad_request assigned check',
+     lambda: db.select(AdRequest.id).filter_by(campaign_id=1, influencer_id=1), False),
+    ('influencer.ad_requests',
+     lambda: db.select(AdRequest).join(AdRequest.campaign)
+     .filter(AdRequest.influencer_id == 1, Campaign.status == 'active'), False),
+    ('influencer.ad_requests by status',
+     lambda: db.select(AdRequest).filter_by(influencer_id=1, status='pending'), False),
+    ('influencer list',
+     lambda: db.select(User).filter_by(role='influencer'), False),
+    ('sponsor.influencer_typeahead',
+     lambda: db.select(User.id, User.username)
+     .filter(User.role == 'influencer', db.func.lower(User.username) >= 'ab',
+             db.func.lower(User.username) < 'ab\U0010ffff',
+             ~db.select(AdRequest.id).filter(AdRequest.campaign_id == 1,
+                                             AdRequest.influencer_id == User.id).exists())
+     .order_by(db.func.lower(User.username)).limit(10), False),
+    ('admin.flagged_users',
+     lambda: db.select(User).filter_by(is_flagged=True), False),
+    ('public campaigns',
+     lambda: db.select(Campaign).filter_by(visibility='public'), False),
+    ('influencer.discover by budget',
+     lambda: db.select(Campaign.budget, Campaign.id)
+     .filter(Campaign.visibility == 'public', Campaign.status == 'active', Campaign.start_date <= '2026-01-01',
+             Campaign.end_date >= '2026-01-01', Campaign.budget.between(100, 1000), Campaign.category_id == 1)
+     .order_by(Campaign.budget.desc(), Campaign.id.desc()).limit(21), False),
+    ('influencer.discover by end date',
+     lambda: db.select(Campaign.end_date, Campaign.id)
+     .filter(Campaign.visibility == 'public', Campaign.status == 'active', Campaign.start_date <= '2026-01-01',
+             Campaign.end_date >= '2026-01-01')
+     .order_by(Campaign.end_date, Campaign.id).limit(21), False),
+    ('lifecycle sweep',
+     lambda: db.select(Campaign.id).filter(Campaign.status == 'active', Campaign.end_date < '2026-01-01')
+     .order_by(Campaign.end_date, Campaign.id).limit(500), False),
+    ('lifecycle sweep pending ad requests',
+     lambda: db.select(AdRequest.id).filter(AdRequest.campaign_id.in_([1, 2, 3]), AdRequest.status == 'pending')
+     .limit(500), False),
+    ('accepted spending',
+     lambda: db.select(db.func.sum(AdRequest.payment_amount)).filter(AdRequest.status == 'accepted'), False),
+    ('admin.manage_messages',
+     lambda: db.select(Message).order_by(Message.timestamp.desc(), Message.id.desc()).limit(51), False),
+    ('admin.manage_messages by sender',
+     lambda: db.select(Message).filter_by(sender_id=1)
+     .order_by(Message.timestamp.desc(), Message.id.desc()).limit(51), False),
+    ('admin.manage_messages by recipient',
+     lambda: db.select(Message).filter_by(recipient_id=1)
+     .order_by(Message.timestamp.desc(), Message.id.desc()).limit(51), False),
+    ('inbox.stream catch-up',
+     lambda: db.select(Message.id).filter(Message.recipient_id == 1, Message.id > 100)
+     .order_by(Message.id).limit(200), False),
+    ('inbox.thread',
+     lambda: db.select(Message).filter_by(ad_request_id=1)
+     .order_by(Message.timestamp.desc(), Message.id.desc()).limit(31), False),
+    ('ad request unread counts',
+     lambda: db.select(ConversationState.ad_request_id, ConversationState.unread_count)
+     .filter(ConversationState.user_id == 1, ConversationState.ad_request_id.in_([1, 2, 3])), False),
+    ('ad request messages',
+     lambda: db.select(Message).filter_by(ad_request_id=1).order_by(Message.timestamp, Message.id), False),
+    ('influencer social links',
+     lambda: db.select(SocialMediaLink).filter_by(influencer_id=1), False),
+]
+
+
+def explain(statement, session=None):
+    """Returns the EXPLAIN QUERY PLAN detail lines for a select() on SQLite."""
+    session = session or db.session
+    dialect = session.get_bind().dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    rows = session.execute(db.text('EXPLAIN QUERY PLAN ' + sql)).all()
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan):
+    """Returns the plan lines that read a whole table without an index."""
+    # "SCAN t USING INDEX ix" walks an index in order and is fine; a bare
+    # "SCAN t" reads every row of the table.
+    return [line for line in plan if line.startswith('SCAN ') and 'USING' not in line]
+
+
+def check_known_queries(session=None):
+    """Explains every known query and yields (name, plan, scans, allow_scan)."""
+    for name, build, allow_scan in KNOWN_QUERIES:
+        plan = explain(build(), session=session)
+        yield name, plan, full_scans(plan), allow_scan
@@ -0,0 +1,160 @@
+import threading
+from collections import defaultdict
+from contextlib import ContextDecorator
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import counters
+
+
+# Same statement with this many different parameter sets in one request is
+# almost always a relationship lazy loaded row by row
+REPEAT_THRESHOLD = 5
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RepeatedQueries(AssertionError):
+    pass
+
+
+class QueryLog:
+    """Statements executed on this thread while the log is active."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __len__(self):
+        return len(self.statements)
+
+    def repeats(self, threshold=REPEAT_THRESHOLD):
+        """Returns [(statement, times)] for statements run with ``threshold`` or more different parameters."""
+        params = defaultdict(set)
+        for statement, parameters in self.statements:
+            params[statement].add(repr(parameters))
+        return [(statement, len(seen)) for statement, seen in params.items() if len(seen) >= threshold]
+
+    def report(self, limit=None):
+        lines = [' '.join(statement.split()) for statement, _ in self.statements]
+        return '\n'.join(f'  {n}. {line}' for n, line in enumerate(lines[:limit], start=1))
+
+
+def _logs():
+    logs = getattr(_local, 'logs', None)
+    if logs is None:
+        logs = _local.logs = []
+    return logs
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _record(conn, cursor, statement, parameters, context, executemany):
+    for log in getattr(_local, 'logs', ()):
+        log.statements.append((statement, parameters))
+
+
+def enforced():
+    """Whether budgets are checked: QUERY_BUDGETS_ENFORCED, defaulting to debug and testing."""
+    setting = current_app.config.get('QUERY_BUDGETS_ENFORCED')
+    if setting is None:
+        return current_app.debug or current_app.testing
+    return setting
+
+
+class query_budget(ContextDecorator):
+    """Fails when the wrapped block runs more than ``max_queries`` statements,
+    or (with ``repeat_threshold``) repeats one statement that many times.
+
+    Works as ``with query_budget(5): ...`` in tests and as ``@query_budget(5)``
+    on a view, where it is only checked when budgets are enforced(). Raises
+    QueryBudgetExceeded or RepeatedQueries, both AssertionErrors.
+    """
+
+    def __init__(self, max_queries=None, repeat_threshold=None, always=False):
+        self.max_queries = max_queries
+        self.repeat_threshold = repeat_threshold
+        self.always = always
+        self._log = None
+
+    def _recreate_cm(self):
+        # A fresh instance per decorated call, so concurrent requests don't share a log
+        return type(self)(self.max_queries, self.repeat_threshold, self.always)
+
+    def __enter__(self):
+        if self.always or not current_app or enforced():
+            self._log = QueryLog()
+            _logs().append(self._log)
+        return self._log
+
+    def __exit__(self, exc_type, exc, tb):
+        log, self._log = self._log, None
+        if log is None:
+            return False
+        _logs().remove(log)
+        if exc_type is not None:
+            return False
+        if self.max_queries is not None and len(log) > self.max_queries:
+            raise QueryBudgetExceeded(
+                f'{len(log)} queries where at most {self.max_queries} were allowed:\n{log.report()}')
+        if self.repeat_threshold is not None:
+            check_repeats(log, self.repeat_threshold)
+        return False
+
+
+def check_repeats(log, threshold=REPEAT_THRESHOLD):
+    repeats = log.repeats(threshold)
+    if repeats:
+        details = '\n'.join(f'  {times}x {" ".join(statement.split())}' for statement, times in repeats)
+        raise RepeatedQueries(f'Likely N+1: the same statement ran with different parameters\n{details}')
+
+
+def init_query_detector(app):
+    """Watches every request for N+1 patterns when QUERY_DETECTOR_ENABLED
+    (by default in debug and testing).
+
+    Findings are logged and counted in n_plus_one_total; with
+    QUERY_DETECTOR_RAISE the request fails with RepeatedQueries instead.
+    """
+    app.before_request(_start_detecting)
+    app.after_request(_finish_detecting)
+    app.teardown_request(_stop_detecting)
+
+
+def _detecting():
+    setting = current_app.config.get('QUERY_DETECTOR_ENABLED')
+    return current_app.debug or current_app.testing if setting is None else setting
+
+
+def _start_detecting():
+    if _detecting():
+        g.query_log = QueryLog()
+        _logs().append(g.query_log)
+
+
+def _finish_detecting(response):
+    log = g.pop('query_log', None)
+    if log is None:
+        return response
+    _logs().remove(log)
+    threshold = current_app.config.get('QUERY_REPEAT_THRESHOLD', REPEAT_THRESHOLD)
+    repeats = log.repeats(threshold)
+    if repeats:
+        counters.inc('n_plus_one_total', endpoint=request.endpoint)
+        if current_app.config.get('QUERY_DETECTOR_RAISE'):
+            check_repeats(log, threshold)
+        for statement, times in repeats:
+            current_app.logger.warning('Likely N+1 in %s: %d runs of %s', request.endpoint, times,
+                                       ' '.join(statement.split()))
+    return response
+
+
+def _stop_detecting(exc):
+    # When the view raised, after_request never ran
+    log = g.pop('query_log', None)
+    if log is not None and log in _logs():
+        _logs().remove(log)
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from werkzeug.exceptions import TooManyRequests
+
+from .metrics import counters
+
+
+class MemoryBucketStore:
+    """Token buckets held in this process, with O(1) updates.
+
+    Buckets are kept in least-recently-used order, so idle ones are dropped
+    from the front as new requests come in.
+    """
+
+    def __init__(self, idle_ttl=3600):
+        self.idle_ttl = idle_ttl
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, per_second, cost=1):
+        """Takes ``cost`` tokens; returns (allowed, seconds until enough tokens)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * per_second)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._expire(now)
+        return allowed, 0 if allowed else (cost - tokens) / per_second
+
+    def _expire(self, now):
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated < self.idle_ttl:
+                break
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBucketStore:
+    """Token buckets in a local SQLite file shared by every worker process.
+
+    A stand-in for a shared store such as Redis on single-host deployments.
+    Each take() is one short IMMEDIATE transaction on a primary key row.
+    """
+
+    # Idle buckets are swept every this many takes
+    SWEEP_EVERY = 1000
+
+    def __init__(self, path, idle_ttl=3600):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self._local = threading.local()
+        self._takes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS bucket '
+                     '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_bucket_updated_at ON bucket (updated_at)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, capacity, per_second, cost=1):
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated_at FROM bucket WHERE key = ?', (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * per_second)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute('INSERT OR REPLACE INTO bucket (key, tokens, updated_at) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            self._takes += 1
+            if self._takes % self.SWEEP_EVERY == 0:
+                conn.execute('DELETE FROM bucket WHERE updated_at < ?', (now - self.idle_ttl,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, 0 if allowed else (cost - tokens) / per_second
+
+
+def init_rate_limits(app):
+    """Creates the token bucket store configured by RATE_LIMIT_* settings."""
+    backend = app.config.get('RATE_LIMIT_BACKEND', 'memory')
+    idle_ttl = app.config.get('RATE_LIMIT_IDLE_TTL', 3600)
+    if backend == 'memory':
+        store = MemoryBucketStore(idle_ttl=idle_ttl)
+    elif backend == 'sqlite':
+        store = SQLiteBucketStore(app.config['RATE_LIMIT_PATH'], idle_ttl=idle_ttl)
+    else:
+        raise ValueError(f'Unknown rate limit backend: {backend}')
+    app.extensions['rate_limit_store'] = store
+
+
+def check_login_rate(ip, username):
+    """Spends one login attempt for ``ip`` and ``username``, or raises a 429.
+
+    Limits are (attempts, seconds) pairs from LOGIN_RATE_LIMIT_PER_IP and
+    LOGIN_RATE_LIMIT_PER_USERNAME; attempts is also the burst size.
+    """
+    if not current_app.config.get('RATE_LIMIT_ENABLED', True):
+        return
+    store = current_app.extensions['rate_limit_store']
+    checks = [('ip', ip, current_app.config['LOGIN_RATE_LIMIT_PER_IP'])]
+    if username:
+        checks.append(('username', username.lower(), current_app.config['LOGIN_RATE_LIMIT_PER_USERNAME']))
+
+    for scope, value, (attempts, seconds) in checks:
+        allowed, retry_after = store.take(f'login:{scope}:{value}', attempts, attempts / seconds)
+        if not allowed:
+            counters.inc('login_rate_limited_total', scope=scope)
+            raise TooManyRequests('Too many login attempts. Please wait and try again.',
+                                  retry_after=max(1, int(retry_after + 0.999)))
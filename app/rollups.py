@@ -0,0 +1,258 @@
+from collections import defaultdict
+
+from sqlalchemy import event, inspect
+
+from .models import (db, User, Campaign, AdRequest, InfluencerStats, CampaignStats,
+                     SponsorStats, CategoryStats, PlatformStats)
+
+
+ROLLUP_MODELS = (InfluencerStats, CampaignStats, SponsorStats, CategoryStats, PlatformStats)
+AD_REQUEST_FIELDS = ('influencer_id', 'campaign_id', 'status', 'payment_amount')
+USER_FIELDS = ('role', 'category_id')
+
+
+class RollupDeltas:
+    """Counter changes collected during a flush, applied as a handful of upserts."""
+
+    def __init__(self):
+        self.influencers = defaultdict(lambda: [0, 0])      # id -> [requests, accepted]
+        self.campaigns = defaultdict(lambda: [0, 0, 0])     # id -> [requests, accepted, spend]
+        self.categories = defaultdict(int)                  # id -> influencers
+        self.platform = defaultdict(int)                    # name -> value
+
+    def ad_request(self, influencer_id, campaign_id, status, payment_amount, sign=1):
+        accepted = 1 if status == 'accepted' else 0
+        spend = (payment_amount or 0) if accepted else 0
+        influencer = self.influencers[influencer_id]
+        influencer[0] += sign
+        influencer[1] += sign * accepted
+        campaign = self.campaigns[campaign_id]
+        campaign[0] += sign
+        campaign[1] += sign * accepted
+        campaign[2] += sign * spend
+        self.platform['ad_requests'] += sign
+        self.platform['accepted_requests'] += sign * accepted
+        self.platform['accepted_spend'] += sign * spend
+
+    def influencer(self, role, category_id, sign=1):
+        if role == 'influencer' and category_id is not None:
+            self.categories[category_id] += sign
+
+    def apply(self, conn):
+        """Writes the deltas with one executemany per rollup table."""
+        influencers = [{'id': i, 'requests': r, 'accepted': a}
+                       for i, (r, a) in self.influencers.items() if r or a]
+        campaigns = [{'id': c, 'requests': r, 'accepted': a, 'spend': s}
+                     for c, (r, a, s) in self.campaigns.items() if r or a or s]
+        sponsors = [{'campaign_id': c, 'spend': s}
+                    for c, (_, _, s) in self.campaigns.items() if s]
+        categories = [{'id': c, 'count': n} for c, n in self.categories.items() if n]
+        platform = [{'name': k, 'value': v} for k, v in self.platform.items() if v]
+        for statement, params in ((UPSERT_INFLUENCER, influencers), (UPSERT_CAMPAIGN, campaigns),
+                                  (UPSERT_SPONSOR, sponsors), (UPSERT_CATEGORY, categories),
+                                  (UPSERT_PLATFORM, platform)):
+            if params:
+                conn.execute(statement, params)
+
+
+UPSERT_INFLUENCER = db.text(
+    'INSERT INTO influencer_stats (influencer_id, request_count, accepted_count) '
+    'VALUES (:id, :requests, :accepted) ON CONFLICT (influencer_id) DO UPDATE SET '
+    'request_count = influencer_stats.request_count + excluded.request_count, '
+    'accepted_count = influencer_stats.accepted_count + excluded.accepted_count')
+UPSERT_CAMPAIGN = db.text(
+    'INSERT INTO campaign_stats (campaign_id, request_count, accepted_count, accepted_spend) '
+    'VALUES (:id, :requests, :accepted, :spend) ON CONFLICT (campaign_id) DO UPDATE SET '
+    'request_count = campaign_stats.request_count + excluded.request_count, '
+    'accepted_count = campaign_stats.accepted_count + excluded.accepted_count, '
+    'accepted_spend = campaign_stats.accepted_spend + excluded.accepted_spend')
+UPSERT_SPONSOR = db.text(
+    'INSERT INTO sponsor_stats (sponsor_id, accepted_spend) '
+    'SELECT sponsor_id, :spend FROM campaign WHERE id = :campaign_id '
+    'ON CONFLICT (sponsor_id) DO UPDATE SET '
+    'accepted_spend = sponsor_stats.accepted_spend + excluded.accepted_spend')
+UPSERT_CATEGORY = db.text(
+    'INSERT INTO category_stats (category_id, influencer_count) VALUES (:id, :count) '
+    'ON CONFLICT (category_id) DO UPDATE SET '
+    'influencer_count = category_stats.influencer_count + excluded.influencer_count')
+UPSERT_PLATFORM = db.text(
+    'INSERT INTO platform_stats (name, value) VALUES (:name, :value) '
+    'ON CONFLICT (name) DO UPDATE SET value = platform_stats.value + excluded.value')
+
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# Load the previous value on assignment, even when the attribute was expired
+# by a commit, so the flush listeners can subtract the old contribution.
+for _model, _fields in ((AdRequest, AD_REQUEST_FIELDS), (User, USER_FIELDS)):
+    for _field in _fields:
+        event.listen(getattr(_model, _field), 'set', _keep_old_value, active_history=True)
+
+
+def _old_values(obj, fields):
+    """Returns the values ``obj`` had in the database before this flush."""
+    state = inspect(obj)
+    values = []
+    for field in fields:
+        history = state.attrs[field].history
+        if history.deleted:
+            values.append(history.deleted[0])
+        elif history.unchanged:
+            values.append(history.unchanged[0])
+        else:
+            values.append(getattr(obj, field))  # expired; the row is still there
+    return values
+
+
+def _changed(obj, fields):
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_deleted(session, flush_context, instances):
+    # Deleted rows are gone by after_flush, so take their contribution now.
+    deltas = session.info.setdefault('rollup_deltas', RollupDeltas())
+    for obj in session.deleted:
+        if isinstance(obj, AdRequest):
+            deltas.ad_request(*_old_values(obj, AD_REQUEST_FIELDS), sign=-1)
+        elif isinstance(obj, User):
+            deltas.influencer(*_old_values(obj, USER_FIELDS), sign=-1)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _apply_rollups(session, flush_context):
+    """Folds this flush's AdRequest and User changes into the rollup tables."""
+    deltas = session.info.pop('rollup_deltas', None) or RollupDeltas()
+    for obj in session.new:
+        if isinstance(obj, AdRequest):
+            deltas.ad_request(*(getattr(obj, f) for f in AD_REQUEST_FIELDS))
+        elif isinstance(obj, User):
+            deltas.influencer(*(getattr(obj, f) for f in USER_FIELDS))
+    for obj in session.dirty:
+        if isinstance(obj, AdRequest) and _changed(obj, AD_REQUEST_FIELDS):
+            deltas.ad_request(*_old_values(obj, AD_REQUEST_FIELDS), sign=-1)
+            deltas.ad_request(*(getattr(obj, f) for f in AD_REQUEST_FIELDS))
+        elif isinstance(obj, User) and _changed(obj, USER_FIELDS):
+            deltas.influencer(*_old_values(obj, USER_FIELDS), sign=-1)
+            deltas.influencer(*(getattr(obj, f) for f in USER_FIELDS))
+
+    conn = session.connection()
+    deltas.apply(conn)
+    for obj in session.deleted:
+        if isinstance(obj, Campaign):
+            conn.execute(db.delete(CampaignStats).where(CampaignStats.campaign_id == obj.id))
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_rollups(session):
+    session.info.pop('rollup_deltas', None)
+
+
+def forget_campaign(campaign_id):
+    """Subtracts a campaign's ad requests before they are removed with a bulk DELETE.
+
+    Query-level deletes skip the flush events, so callers doing
+    ``AdRequest.query.filter_by(campaign_id=...).delete()`` call this first.
+    """
+    deltas = RollupDeltas()
+    rows = db.session.execute(
+        db.select(AdRequest.influencer_id, AdRequest.status,
+                  db.func.count(AdRequest.id), db.func.sum(AdRequest.payment_amount))
+        .filter(AdRequest.campaign_id == campaign_id)
+        .group_by(AdRequest.influencer_id, AdRequest.status)
+    ).all()
+    for influencer_id, status, count, total in rows:
+        accepted = count if status == 'accepted' else 0
+        spend = (total or 0) if status == 'accepted' else 0
+        deltas.influencers[influencer_id][0] -= count
+        deltas.influencers[influencer_id][1] -= accepted
+        deltas.campaigns[campaign_id][0] -= count
+        deltas.campaigns[campaign_id][1] -= accepted
+        deltas.campaigns[campaign_id][2] -= spend
+        deltas.platform['ad_requests'] -= count
+        deltas.platform['accepted_requests'] -= accepted
+        deltas.platform['accepted_spend'] -= spend
+    deltas.apply(db.session.connection())
+
+
+def _live_aggregates():
+    """Computes every rollup straight from the fact tables, keyed like the rollup rows."""
+    accepted = db.case((AdRequest.status == 'accepted', 1), else_=0)
+    spend = db.case((AdRequest.status == 'accepted', AdRequest.payment_amount), else_=0)
+
+    influencers = db.session.execute(
+        db.select(AdRequest.influencer_id, db.func.count(AdRequest.id), db.func.sum(accepted))
+        .group_by(AdRequest.influencer_id)).all()
+    campaigns = db.session.execute(
+        db.select(AdRequest.campaign_id, db.func.count(AdRequest.id), db.func.sum(accepted),
+                  db.func.sum(spend))
+        .group_by(AdRequest.campaign_id)).all()
+    sponsors = db.session.execute(
+        db.select(Campaign.sponsor_id, db.func.sum(AdRequest.payment_amount))
+        .join(AdRequest, AdRequest.campaign_id == Campaign.id)
+        .filter(AdRequest.status == 'accepted')
+        .group_by(Campaign.sponsor_id)).all()
+    categories = db.session.execute(
+        db.select(User.category_id, db.func.count(User.id))
+        .filter(User.role == 'influencer', User.category_id.isnot(None))
+        .group_by(User.category_id)).all()
+
+    return {
+        InfluencerStats: {i: (int(n), int(a)) for i, n, a in influencers},
+        CampaignStats: {c: (int(n), int(a), int(s)) for c, n, a, s in campaigns},
+        SponsorStats: {s: (int(total),) for s, total in sponsors},
+        CategoryStats: {c: (int(n),) for c, n in categories},
+        PlatformStats: {
+            'ad_requests': (sum(n for _, n, _ in influencers),),
+            'accepted_requests': (sum(int(a) for _, _, a in influencers),),
+            'accepted_spend': (sum(int(t) for _, t in sponsors),),
+        },
+    }
+
+
+ROLLUP_COLUMNS = {
+    InfluencerStats: ('influencer_id', 'request_count', 'accepted_count'),
+    CampaignStats: ('campaign_id', 'request_count', 'accepted_count', 'accepted_spend'),
+    SponsorStats: ('sponsor_id', 'accepted_spend'),
+    CategoryStats: ('category_id', 'influencer_count'),
+    PlatformStats: ('name', 'value'),
+}
+
+
+def rebuild_rollups():
+    """Recomputes every rollup table from scratch in one transaction."""
+    live = _live_aggregates()
+    for model in ROLLUP_MODELS:
+        db.session.execute(db.delete(model))
+        key, *columns = ROLLUP_COLUMNS[model]
+        rows = [dict(zip([key, *columns], (k, *values))) for k, values in live[model].items()]
+        if rows:
+            db.session.execute(db.insert(model), rows)
+    db.session.commit()
+    return {model.__tablename__: len(live[model]) for model in ROLLUP_MODELS}
+
+
+def check_rollups():
+    """Compares the rollup tables with live aggregates and returns the mismatches."""
+    live = _live_aggregates()
+    mismatches = []
+    for model in ROLLUP_MODELS:
+        key, *columns = ROLLUP_COLUMNS[model]
+        stored = {row[0]: tuple(row[1:]) for row in db.session.execute(
+            db.select(*(getattr(model, c) for c in (key, *columns)))).all()}
+        zero = (0,) * len(columns)
+        for k in set(stored) | set(live[model]):
+            expected = live[model].get(k, zero)
+            actual = stored.get(k, zero)
+            if expected != actual:
+                mismatches.append(f'{model.__tablename__}[{k}]: stored {actual}, live {expected}')
+    return mismatches
+
+
+def platform_stat(name):
+    """Returns a single platform-wide counter."""
+    stat = db.session.get(PlatformStats, name)
+    return stat.value if stat else 0
@@ -0,0 +1,144 @@
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_request_context, session as cookie_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from .database import engine_options
+
+
+REPLICA_BIND_PREFIX = 'replica'
+
+
+class RoutingSession(Session):
+    """db.session, sending reads in @read_replica views to a replica engine.
+
+    Everything else goes to the primary: writes and flushes, SELECT ... FOR
+    UPDATE, every statement after this session has flushed (so a request
+    reads its own writes), and all reads by a user who committed within
+    REPLICA_STICKY_SECONDS (so the page after a POST/redirect does too).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._routes_to_replica(clause):
+            replicas = current_app.extensions.get('db_replicas')
+            if replicas:
+                return self._db.engines[random.choice(replicas)]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _routes_to_replica(self, clause):
+        if self._flushing or self.info.get('wrote'):
+            return False
+        if clause is not None and (getattr(clause, 'is_dml', False)
+                                   or getattr(clause, '_for_update_arg', None) is not None):
+            return False
+        return has_request_context() and g.get('db_route') == 'replica' and not _pinned_to_primary()
+
+
+def _pinned_to_primary():
+    return cookie_session.get('_primary_until', 0) > time.time()
+
+
+def read_replica(func):
+    """Decorator for read-only views whose queries may be served by a read replica.
+
+    Put it below the login and role decorators, so authentication and
+    ownership checks still read from the primary.
+    """
+    @wraps(func)
+    def decorated_view(*args, **kwargs):
+        g.db_route = 'replica'
+        try:
+            return func(*args, **kwargs)
+        finally:
+            g.db_route = None
+    return decorated_view
+
+
+@contextmanager
+def from_primary():
+    """Sends the reads inside the block to the primary, even in a @read_replica view.
+
+    For results that outlive the request, such as cached fragments: a row
+    rendered from a lagging replica would otherwise be cached under a fresh
+    version token and served until it expires.
+    """
+    route = g.get('db_route') if has_request_context() else None
+    if route is None:
+        yield
+        return
+    g.db_route = None
+    try:
+        yield
+    finally:
+        g.db_route = route
+
+
+def replica_binds(config):
+    """SQLALCHEMY_BINDS entries for SQLALCHEMY_REPLICA_URIS, each with its own pool settings."""
+    binds = {}
+    for n, uri in enumerate(config.get('SQLALCHEMY_REPLICA_URIS') or ()):
+        # SQLite stand-ins get the same pragmas as the primary
+        options = engine_options({**config, 'SQLALCHEMY_DATABASE_URI': uri})
+        binds[f'{REPLICA_BIND_PREFIX}{n}'] = {'url': uri, **options, **config.get('REPLICA_ENGINE_OPTIONS', {})}
+    return binds
+
+
+def init_routing(app):
+    """Registers the read replicas as binds and the primary's pool settings.
+
+    Must run before db.init_app(). Without SQLALCHEMY_REPLICA_URIS every
+    query goes to the primary.
+    """
+    if not make_url(app.config['SQLALCHEMY_DATABASE_URI']).drivername.startswith('sqlite'):
+        # SQLite primaries are pooled by the profile in app/database.py
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**app.config.get('PRIMARY_ENGINE_OPTIONS', {}),
+                                                   **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+    binds = replica_binds(app.config)
+    app.config['SQLALCHEMY_BINDS'] = {**(app.config.get('SQLALCHEMY_BINDS') or {}), **binds}
+    app.extensions['db_replicas'] = sorted(binds)
+    app.after_request(_pin_after_write)
+
+
+def _pin_after_write(response):
+    if g.pop('db_committed_writes', False):
+        cookie_session['_primary_until'] = time.time() + current_app.config.get('REPLICA_STICKY_SECONDS', 5)
+    return response
+
+
+def sync_sqlite_replicas():
+    """Copies the SQLite primary over each SQLite replica: the local stand-in for replication.
+
+    Returns the replica paths written.
+    """
+    from .models import db
+    primary = db.engines[None].url.database
+    written = []
+    for key in current_app.extensions.get('db_replicas', ()):
+        url = db.engines[key].url
+        if not url.drivername.startswith('sqlite'):
+            continue
+        source, target = sqlite3.connect(primary), sqlite3.connect(url.database)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+        written.append(url.database)
+    return written
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_written(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _note_commit(session):
+    if session.info.get('wrote') and has_request_context():
+        g.db_committed_writes = True
@@ -0,0 +1,248 @@
+import re
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload
+
+from .models import db, User, Campaign, AdRequest
+
+
+# FTS5 tables shadowing User and Campaign. rowid is the entity's primary key,
+# and prefix indexes keep search-as-you-type queries cheap.
+FTS_TABLES = {
+    'user_search': "CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5("
+                   "username, email, tokenize='unicode61', prefix='2 3')",
+    'campaign_search': "CREATE VIRTUAL TABLE IF NOT EXISTS campaign_search USING fts5("
+                       "name, description, goals, sponsor_username, tokenize='unicode61', prefix='2 3')",
+}
+
+# bm25 column weights: a hit on a name counts for more than one in free text
+USER_WEIGHTS = '10.0, 5.0'
+CAMPAIGN_WEIGHTS = '10.0, 2.0, 2.0, 5.0'
+
+USER_FIELDS = ('username', 'email')
+CAMPAIGN_FIELDS = ('name', 'description', 'goals', 'sponsor_id')
+
+
+class SearchResults:
+    """One page of ranked search results."""
+
+    def __init__(self, items, page, per_page, has_next):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.has_next = has_next
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def init_search(app):
+    """Creates the FTS tables if the database supports them and wires up syncing."""
+    enabled = False
+    if db.engine.dialect.name == 'sqlite':
+        with db.engine.begin() as conn:
+            existing = {row[0] for row in conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")}
+            try:
+                for ddl in FTS_TABLES.values():
+                    conn.exec_driver_sql(ddl)
+                enabled = True
+            except OperationalError:
+                app.logger.warning('SQLite was built without FTS5; falling back to LIKE search.')
+        if enabled and not set(FTS_TABLES) <= existing:
+            rebuild_search_index()
+    app.extensions['search'] = {'fts': enabled}
+
+
+def fts_enabled():
+    return current_app.extensions.get('search', {}).get('fts', False)
+
+
+def rebuild_search_index():
+    """Repopulates the FTS tables from the User and Campaign tables."""
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql('DELETE FROM user_search')
+        conn.exec_driver_sql(
+            'INSERT INTO user_search (rowid, username, email) SELECT id, username, email FROM user')
+        conn.exec_driver_sql('DELETE FROM campaign_search')
+        conn.exec_driver_sql(
+            'INSERT INTO campaign_search (rowid, name, description, goals, sponsor_username) '
+            'SELECT campaign.id, campaign.name, campaign.description, campaign.goals, user.username '
+            'FROM campaign LEFT JOIN user ON user.id = campaign.sponsor_id')
+        users = conn.exec_driver_sql('SELECT count(*) FROM user_search').scalar()
+        campaigns = conn.exec_driver_sql('SELECT count(*) FROM campaign_search').scalar()
+    return users, campaigns
+
+
+def index_users(conn, ids):
+    """(Re)indexes the given users in one statement per table, for bulk writers."""
+    if not fts_enabled() or not ids:
+        return
+    params = {'ids': list(ids)}
+    conn.execute(db.text('DELETE FROM user_search WHERE rowid IN :ids')
+                 .bindparams(db.bindparam('ids', expanding=True)), params)
+    conn.execute(db.text('INSERT INTO user_search (rowid, username, email) '
+                         'SELECT id, username, email FROM user WHERE id IN :ids')
+                 .bindparams(db.bindparam('ids', expanding=True)), params)
+
+
+def index_campaigns(conn, ids):
+    """(Re)indexes the given campaigns in one statement per table, for bulk writers."""
+    if not fts_enabled() or not ids:
+        return
+    params = {'ids': list(ids)}
+    conn.execute(db.text('DELETE FROM campaign_search WHERE rowid IN :ids')
+                 .bindparams(db.bindparam('ids', expanding=True)), params)
+    conn.execute(db.text('INSERT INTO campaign_search (rowid, name, description, goals, sponsor_username) '
+                         'SELECT campaign.id, campaign.name, campaign.description, campaign.goals, user.username '
+                         'FROM campaign LEFT JOIN user ON user.id = campaign.sponsor_id '
+                         'WHERE campaign.id IN :ids')
+                 .bindparams(db.bindparam('ids', expanding=True)), params)
+
+
+def match_query(text):
+    """Turns free text into an FTS5 query: every word must match as a prefix."""
+    terms = re.findall(r'\w+', text or '')
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _ranked_ids(table, weights, text, page, per_page):
+    rows = db.session.execute(
+        db.text(f'SELECT rowid FROM {table} WHERE {table} MATCH :q '
+                f'ORDER BY bm25({table}, {weights}) LIMIT :limit OFFSET :offset'),
+        {'q': text, 'limit': per_page + 1, 'offset': (page - 1) * per_page},
+    ).scalars().all()
+    return rows[:per_page], len(rows) > per_page
+
+
+def _in_rank_order(query, model, ids):
+    by_id = {obj.id: obj for obj in query.filter(model.id.in_(ids)).all()} if ids else {}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def search_users(text, page=1, per_page=25):
+    """Returns ranked users matching ``text`` on username or email."""
+    match = match_query(text)
+    if match and fts_enabled():
+        ids, has_next = _ranked_ids('user_search', USER_WEIGHTS, match, page, per_page)
+        return SearchResults(_in_rank_order(User.query, User, ids), page, per_page, has_next)
+
+    query = User.query
+    if text:
+        query = query.filter(db.or_(User.username.ilike(f'%{text}%'), User.email.ilike(f'%{text}%')))
+    rows = query.order_by(User.id).limit(per_page + 1).offset((page - 1) * per_page).all()
+    return SearchResults(rows[:per_page], page, per_page, len(rows) > per_page)
+
+
+def search_campaigns(text, page=1, per_page=25):
+    """Returns ranked campaigns matching ``text`` on name, description, goals or sponsor."""
+    query = Campaign.query.options(joinedload(Campaign.sponsor))
+    match = match_query(text)
+    if match and fts_enabled():
+        ids, has_next = _ranked_ids('campaign_search', CAMPAIGN_WEIGHTS, match, page, per_page)
+        return SearchResults(_in_rank_order(query, Campaign, ids), page, per_page, has_next)
+
+    if text:
+        query = query.filter(_campaign_like(text))
+    rows = query.order_by(Campaign.id).limit(per_page + 1).offset((page - 1) * per_page).all()
+    return SearchResults(rows[:per_page], page, per_page, len(rows) > per_page)
+
+
+def _campaign_like(text):
+    return db.or_(
+        Campaign.name.ilike(f'%{text}%'),
+        Campaign.sponsor.has(User.username.ilike(f'%{text}%')),
+    )
+
+
+def campaign_filter(text):
+    """Returns a filter clause for campaigns matching ``text``, unranked.
+
+    For callers that walk every match in their own order, such as exports.
+    """
+    match = match_query(text)
+    if match and fts_enabled():
+        return Campaign.id.in_(db.text('SELECT rowid FROM campaign_search WHERE campaign_search MATCH :q')
+                               .bindparams(q=match))
+    return _campaign_like(text)
+
+
+def _available_to(campaign_id):
+    """Filter for influencers with no ad request on ``campaign_id`` yet (an anti-join)."""
+    assigned = db.select(AdRequest.id).filter(AdRequest.campaign_id == campaign_id,
+                                              AdRequest.influencer_id == User.id)
+    return ~assigned.exists()
+
+
+def search_available_influencers(campaign_id, prefix, limit=10):
+    """Returns up to ``limit`` (id, username) pairs for influencers whose username
+    starts with ``prefix`` and who are not on the campaign yet.
+
+    Walks ix_user_role_username_lower as a range, so the cost depends on
+    ``limit``, not on the number of influencers.
+    """
+    prefix = (prefix or '').strip().lower()
+    query = (db.select(User.id, User.username)
+             .filter(User.role == 'influencer', _available_to(campaign_id))
+             .order_by(db.func.lower(User.username))
+             .limit(limit))
+    if prefix:
+        lowered = db.func.lower(User.username)
+        query = query.filter(lowered >= prefix, lowered < prefix + '\U0010ffff')
+    return db.session.execute(query).all()
+
+
+def influencer_available(campaign_id, influencer_id):
+    """True if ``influencer_id`` is an influencer not yet on ``campaign_id``."""
+    return db.session.execute(
+        db.select(User.id).filter(User.id == influencer_id, User.role == 'influencer',
+                                  _available_to(campaign_id))
+    ).first() is not None
+
+
+def _changed(obj, fields):
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _sync_search_index(session, flush_context):
+    """Mirrors User and Campaign changes into the FTS tables in the same transaction."""
+    if not (current_app and fts_enabled()):
+        return
+    conn = session.connection()
+
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            conn.execute(db.text('DELETE FROM user_search WHERE rowid = :id'), {'id': obj.id})
+        elif isinstance(obj, Campaign):
+            conn.execute(db.text('DELETE FROM campaign_search WHERE rowid = :id'), {'id': obj.id})
+
+    for obj in session.new | session.dirty:
+        is_new = obj in session.new
+        if isinstance(obj, User) and (is_new or _changed(obj, USER_FIELDS)):
+            conn.execute(db.text('DELETE FROM user_search WHERE rowid = :id'), {'id': obj.id})
+            conn.execute(db.text('INSERT INTO user_search (rowid, username, email) '
+                                 'VALUES (:id, :username, :email)'),
+                         {'id': obj.id, 'username': obj.username, 'email': obj.email})
+            if not is_new and _changed(obj, ('username',)):
+                conn.execute(db.text('UPDATE campaign_search SET sponsor_username = :username '
+                                     'WHERE rowid IN (SELECT id FROM campaign WHERE sponsor_id = :id)'),
+                             {'id': obj.id, 'username': obj.username})
+        elif isinstance(obj, Campaign) and (is_new or _changed(obj, CAMPAIGN_FIELDS)):
+            conn.execute(db.text('DELETE FROM campaign_search WHERE rowid = :id'), {'id': obj.id})
+            conn.execute(db.text('INSERT INTO campaign_search '
+                                 '(rowid, name, description, goals, sponsor_username) '
+                                 'SELECT :id, :name, :description, :goals, username '
+                                 'FROM user WHERE id = :sponsor_id'),
+                         {'id': obj.id, 'name': obj.name, 'description': obj.description,
+                          'goals': obj.goals, 'sponsor_id': obj.sponsor_id})
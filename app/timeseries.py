@@ -0,0 +1,257 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, inspect
+
+from .models import db, User, Campaign, AdRequest, AdRequestStatusChange, ActivityBucket
+
+
+GRANULARITIES = ('day', 'week', 'month')
+COUNT_METRICS = ('created', 'accepted', 'rejected', 'negotiate')
+SPEND_METRIC = 'accepted_spend'
+SPEND_SCOPES = ('', 'sponsor', 'category')
+
+# Longest range a single series request may cover, in buckets
+MAX_BUCKETS = 400
+
+
+def bucket_start(day, granularity):
+    """Returns the first day of the bucket containing ``day``."""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    raise ValueError(f'Unknown granularity: {granularity}')
+
+
+def next_bucket(start, granularity):
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+UPSERT_BUCKET = db.text(
+    'INSERT INTO activity_bucket (granularity, metric, scope, scope_id, bucket_start, value) '
+    'VALUES (:granularity, :metric, :scope, :scope_id, :bucket_start, :value) '
+    'ON CONFLICT (granularity, metric, scope, scope_id, bucket_start) DO UPDATE SET '
+    'value = activity_bucket.value + excluded.value')
+
+
+class BucketDeltas:
+    """Bucket increments collected during a flush, applied as one upsert per bucket."""
+
+    def __init__(self, when):
+        self.when = when
+        self.values = defaultdict(int)  # (metric, scope, scope_id) -> delta
+
+    def add(self, metric, value, scope='', scope_id=0):
+        if value:
+            self.values[(metric, scope, scope_id or 0)] += value
+
+    def apply(self, conn):
+        day = self.when.date()
+        params = []
+        for (metric, scope, scope_id), value in self.values.items():
+            if not value:
+                continue
+            for granularity in GRANULARITIES:
+                params.append({'granularity': granularity, 'metric': metric, 'scope': scope,
+                               'scope_id': scope_id, 'value': value,
+                               'bucket_start': bucket_start(day, granularity)})
+        if params:
+            conn.execute(UPSERT_BUCKET, params)
+
+
+def _add_spend(deltas, amount, sponsor_id, category_id):
+    deltas.add(SPEND_METRIC, amount)
+    deltas.add(SPEND_METRIC, amount, 'sponsor', sponsor_id)
+    if category_id is not None:
+        deltas.add(SPEND_METRIC, amount, 'category', category_id)
+
+
+def _spend_scopes(conn, influencer_id, campaign_id):
+    """The sponsor and influencer category an ad request's spend is booked under."""
+    return conn.execute(
+        db.select(Campaign.sponsor_id, User.category_id)
+        .select_from(Campaign)
+        .join(User, User.id == influencer_id)
+        .filter(Campaign.id == campaign_id)
+    ).one()
+
+
+def _previous(obj, field):
+    history = inspect(obj).attrs[field].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, field)
+
+
+def record_transitions(conn, transitions, now=None):
+    """Logs status transitions and adds them to the activity buckets.
+
+    ``transitions`` holds dicts with ad_request_id, influencer_id, campaign_id,
+    old_status (None for a new ad request), new_status, payment_amount and
+    old_payment_amount. Used by the flush listener and by bulk writers that
+    bypass the ORM unit of work.
+    """
+    if not transitions:
+        return
+    now = now or utcnow()
+    conn.execute(db.insert(AdRequestStatusChange), [
+        {'ad_request_id': t['ad_request_id'], 'old_status': t['old_status'],
+         'new_status': t['new_status'], 'changed_at': now}
+        for t in transitions
+    ])
+
+    deltas = BucketDeltas(now)
+    for t in transitions:
+        old_status, new_status = t['old_status'], t['new_status']
+        if old_status is None:
+            deltas.add('created', 1)
+        if new_status in COUNT_METRICS and new_status != old_status:
+            deltas.add(new_status, 1)
+
+        # Spend is booked when a request becomes accepted and reversed if it leaves that state
+        spend = 0
+        if new_status == 'accepted' and old_status != 'accepted':
+            spend = t['payment_amount'] or 0
+        elif old_status == 'accepted' and new_status != 'accepted':
+            spend = -(t['old_payment_amount'] or 0)
+        if spend:
+            _add_spend(deltas, spend, *_spend_scopes(conn, t['influencer_id'], t['campaign_id']))
+    deltas.apply(conn)
+
+
+def _transition(ad_request, old_status, old_payment_amount):
+    return {'ad_request_id': ad_request.id, 'influencer_id': ad_request.influencer_id,
+            'campaign_id': ad_request.campaign_id, 'old_status': old_status,
+            'new_status': ad_request.status or 'pending',
+            'payment_amount': ad_request.payment_amount, 'old_payment_amount': old_payment_amount}
+
+
+# An accepted ad request's spend moves with these even when its status stays put
+SPEND_FIELDS = ('payment_amount', 'influencer_id', 'campaign_id')
+
+
+def _reverse_spend(conn, deltas, obj):
+    """Takes back what ``obj`` booked while accepted, using its values from before this flush."""
+    if _previous(obj, 'status') == 'accepted':
+        _add_spend(deltas, -(_previous(obj, 'payment_amount') or 0),
+                   *_spend_scopes(conn, _previous(obj, 'influencer_id'), _previous(obj, 'campaign_id')))
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_deleted_spend(session, flush_context, instances):
+    # Deleted rows are gone by after_flush, so reverse their spend now
+    deleted = [obj for obj in session.deleted if isinstance(obj, AdRequest)]
+    if deleted:
+        deltas = session.info.setdefault('spend_deltas', BucketDeltas(utcnow()))
+        for obj in deleted:
+            _reverse_spend(session.connection(), deltas, obj)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _record_activity(session, flush_context):
+    """Logs ad request status transitions and appends them to the activity buckets."""
+    conn = session.connection()
+    deltas = session.info.pop('spend_deltas', None) or BucketDeltas(utcnow())
+    transitions = []
+    for obj in session.new:
+        if isinstance(obj, AdRequest):
+            transitions.append(_transition(obj, None, None))
+    for obj in session.dirty:
+        if not isinstance(obj, AdRequest):
+            continue
+        state = inspect(obj)
+        if state.attrs.status.history.has_changes():
+            transitions.append(_transition(obj, _previous(obj, 'status'), _previous(obj, 'payment_amount')))
+        elif obj.status == 'accepted' and any(state.attrs[f].history.has_changes() for f in SPEND_FIELDS):
+            # Still accepted, but the amount or what it is booked under changed
+            _reverse_spend(conn, deltas, obj)
+            _add_spend(deltas, obj.payment_amount or 0, *_spend_scopes(conn, obj.influencer_id, obj.campaign_id))
+    if transitions:
+        record_transitions(conn, transitions)
+    deltas.apply(conn)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_spend(session):
+    session.info.pop('spend_deltas', None)
+
+
+def forget_campaign_spend(campaign_id, now=None):
+    """Reverses a campaign's accepted spend before its ad requests are removed with a bulk DELETE.
+
+    Query-level deletes skip the flush events; the counterpart of
+    rollups.forget_campaign for the activity buckets.
+    """
+    deltas = BucketDeltas(now or utcnow())
+    rows = db.session.execute(
+        db.select(Campaign.sponsor_id, User.category_id, db.func.sum(AdRequest.payment_amount))
+        .select_from(AdRequest)
+        .join(Campaign, Campaign.id == AdRequest.campaign_id)
+        .join(User, User.id == AdRequest.influencer_id)
+        .filter(AdRequest.campaign_id == campaign_id, AdRequest.status == 'accepted')
+        .group_by(Campaign.sponsor_id, User.category_id)
+    ).all()
+    for sponsor_id, category_id, total in rows:
+        _add_spend(deltas, -(total or 0), sponsor_id, category_id)
+    deltas.apply(db.session.connection())
+
+
+def _bucket_range(granularity, start, end):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Unknown granularity: {granularity}')
+    end = bucket_start(end or utcnow().date(), granularity)
+    start = bucket_start(start or end - timedelta(days=29), granularity)
+    if start > end:
+        start, end = end, start
+    buckets = []
+    current = start
+    while current <= end and len(buckets) < MAX_BUCKETS:
+        buckets.append(current)
+        current = next_bucket(current, granularity)
+    return buckets
+
+
+def series(metric, granularity='day', start=None, end=None, scope='', scope_id=0):
+    """Returns [(bucket_start, value), ...] for every bucket from ``start`` to ``end``.
+
+    Reads one primary key range of activity_bucket, so the cost depends only on
+    the number of buckets asked for. Empty buckets are filled in with zero.
+    """
+    buckets = _bucket_range(granularity, start, end)
+    rows = dict(db.session.execute(
+        db.select(ActivityBucket.bucket_start, ActivityBucket.value)
+        .filter_by(granularity=granularity, metric=metric, scope=scope, scope_id=scope_id or 0)
+        .filter(ActivityBucket.bucket_start.between(buckets[0], buckets[-1]))
+    ).all())
+    return [(bucket, rows.get(bucket, 0)) for bucket in buckets]
+
+
+def funnel(granularity='day', start=None, end=None):
+    """Returns created/accepted/rejected/negotiate counts and spend side by side per bucket.
+
+    Every metric comes from one query over activity_bucket, pivoted here.
+    """
+    buckets = _bucket_range(granularity, start, end)
+    metrics = COUNT_METRICS + (SPEND_METRIC,)
+    values = defaultdict(int)
+    for metric, bucket, value in db.session.execute(
+            db.select(ActivityBucket.metric, ActivityBucket.bucket_start, ActivityBucket.value)
+            .filter_by(granularity=granularity, scope='', scope_id=0)
+            .filter(ActivityBucket.metric.in_(metrics),
+                    ActivityBucket.bucket_start.between(buckets[0], buckets[-1]))):
+        values[(metric, bucket)] = value
+    return [{'bucket': bucket, **{metric: values[(metric, bucket)] for metric in metrics}}
+            for bucket in buckets]
@@ -1,12 +1,35 @@
 from functools import wraps
-from flask import abort, flash, redirect, url_for, session  # Import session
+from flask import abort, flash, redirect, url_for, g
 from flask_login import current_user
-from .models import AdRequest
+from sqlalchemy.orm import contains_eager
+from .models import db, AdRequest, Campaign
+
+
+def load_ad_request(ad_request_id):
+    """Loads an ad request together with its campaign in one joined query, or 404s."""
+    ad_request = (AdRequest.query
+                  .join(AdRequest.campaign)
+                  .options(contains_eager(AdRequest.campaign))
+                  .filter(AdRequest.id == ad_request_id)
+                  .first())
+    if ad_request is None:
+        abort(404)
+    return ad_request
+
+
+def load_campaign(campaign_id):
+    """Loads a campaign by id, or 404s."""
+    campaign = db.session.get(Campaign, campaign_id)
+    if campaign is None:
+        abort(404)
+    return campaign
+
+
 def admin_required(func):
     """Decorator to restrict access to admin-only views."""
     @wraps(func)
     def decorated_view(*args, **kwargs):
-        if not current_user.is_authenticated or session.get('role') != 'admin':
+        if not current_user.is_authenticated or current_user.role != 'admin':
             flash('You do not have permission to access this page.', 'danger')
             return redirect(url_for('auth.login'))  # Redirect to login page
         return func(*args, **kwargs)
@@ -17,17 +40,21 @@ def sponsor_required(func):
     """Decorator to restrict access to sponsor-only views."""
     @wraps(func)
     def decorated_view(*args, **kwargs):
-        if not current_user.is_authenticated or session.get('role') != 'sponsor':
+        if not current_user.is_authenticated or current_user.role != 'sponsor':
             flash('You do not have permission to access this page.', 'danger')
             return redirect(url_for('auth.login'))
 
-        # Additional check for ad request editing
+        # Ownership checks: the checked object is handed to the view as
+        # g.ad_request / g.campaign so it is not fetched a second time
         if 'ad_request_id' in kwargs:
-            ad_request_id = kwargs['ad_request_id']
-            ad_request = AdRequest.query.get(ad_request_id)
-            if ad_request is None or ad_request.campaign.sponsor != current_user:
-                abort(403)  # Forbidden access if not owner or ad request doesn't exist
-        
+            g.ad_request = load_ad_request(kwargs['ad_request_id'])
+            if g.ad_request.campaign.sponsor_id != current_user.id:
+                abort(403)  # Forbidden access if not the campaign owner
+        if 'campaign_id' in kwargs:
+            g.campaign = load_campaign(kwargs['campaign_id'])
+            if g.campaign.sponsor_id != current_user.id:
+                abort(403)  # Forbidden access if not the campaign owner
+
         return func(*args, **kwargs)
     return decorated_view
 
@@ -35,9 +62,32 @@ def influencer_required(func):
     """Decorator to restrict access to influencer-only views."""
     @wraps(func)
     def decorated_view(*args, **kwargs):
-        if not current_user.is_authenticated or session.get('role') != 'influencer':
+        if not current_user.is_authenticated or current_user.role != 'influencer':
             flash('You do not have permission to access this page.', 'danger')
             return redirect(url_for('auth.login'))  # Redirect to login page
+
+        # Ownership check, handing the ad request to the view as g.ad_request
+        if 'ad_request_id' in kwargs:
+            g.ad_request = load_ad_request(kwargs['ad_request_id'])
+            if g.ad_request.influencer_id != current_user.id:
+                abort(403)  # Forbidden access if not addressed to this influencer
+
+        return func(*args, **kwargs)
+    return decorated_view
+
+
+def participant_required(func):
+    """Decorator for views on an ad request's thread: its sponsor or its influencer only."""
+    @wraps(func)
+    def decorated_view(*args, **kwargs):
+        if not current_user.is_authenticated:
+            flash('You do not have permission to access this page.', 'danger')
+            return redirect(url_for('auth.login'))
+
+        g.ad_request = load_ad_request(kwargs['ad_request_id'])
+        if current_user.id not in (g.ad_request.influencer_id, g.ad_request.campaign.sponsor_id):
+            abort(403)  # Forbidden access if not part of the conversation
+
         return func(*args, **kwargs)
     return decorated_view
 
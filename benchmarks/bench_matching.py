@@ -0,0 +1,81 @@
+"""Top-K influencer shortlist latency over synthetic feature matrices.
+
+Fills an app.matching.MatchIndex with random influencers (acceptance,
+payment history, platform coverage and niche/bio terms drawn from a small
+vocabulary), then times shortlists for random campaigns, and the
+incremental update of a batch of stale rows.
+
+    python benchmarks/bench_matching.py --influencers 100000 --queries 200 --k 10
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.matching import MatchIndex, PLATFORMS, term_bitsets  # noqa: E402
+
+VOCABULARY = ('fashion beauty travel food fitness gaming tech music dance yoga vegan parenting '
+              'finance crypto photography art design skincare makeup streetwear sneakers coffee '
+              'wine outdoors hiking cycling running football basketball cooking baking diy '
+              'home garden pets dogs cats books film comedy education science cars').split()
+
+
+def synthetic_features(n, rng, start_id=1):
+    ids = np.arange(start_id, start_id + n)
+    active = rng.random(n) > 0.02
+    accepted = rng.integers(0, 20, n)
+    decided = accepted + rng.integers(0, 20, n)
+    acceptance = ((accepted + 1) / (decided + 2)).astype(np.float32)
+    avg_payment = np.where(accepted > 0, rng.integers(50, 5000, n), np.nan).astype(np.float32)
+    platforms = (rng.integers(0, len(PLATFORMS) + 1, n) / len(PLATFORMS)).astype(np.float32)
+    words = [set(random.sample(VOCABULARY, random.randint(2, 12))) for _ in range(n)]
+    return ids, active, acceptance, avg_payment, platforms, term_bitsets(words)
+
+
+def percentile(samples, p):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--influencers', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--stale', type=int, default=500, help='rows per incremental update')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    rng = np.random.default_rng(args.seed)
+    index = MatchIndex()
+    started = time.perf_counter()
+    index.update(*synthetic_features(args.influencers, rng))
+    elapsed = (time.perf_counter() - started) * 1000
+    arrays = (index.ids, index.active, index.acceptance, index.avg_payment, index.platforms, index.bits)
+    print(f'load    {args.influencers} influencers in {elapsed:.0f} ms, '
+          f'{sum(a.nbytes for a in arrays) / 2**20:.1f} MiB of features')
+
+    timings = []
+    for _ in range(args.queries):
+        words = set(random.sample(VOCABULARY, random.randint(3, 15)))
+        exclude = rng.integers(1, args.influencers, 50).tolist()
+        started = time.perf_counter()
+        top = index.top(words, budget=int(rng.integers(100, 10000)), k=args.k, exclude=exclude)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert len(top) == args.k and not set(i for i, _ in top) & set(exclude)
+    print(f'top-{args.k}  p50 {percentile(timings, 50):6.2f} ms  p95 {percentile(timings, 95):6.2f} ms  '
+          f'max {max(timings):6.2f} ms  over {args.queries} queries')
+
+    stale = synthetic_features(args.stale, rng, start_id=int(rng.integers(1, args.influencers - args.stale)))
+    started = time.perf_counter()
+    index.update(*stale)
+    print(f'update  {args.stale} stale rows in {(time.perf_counter() - started) * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Logins per second with inline hashing versus the process pool.
+
+Simulates a threaded worker serving concurrent logins: each request thread
+verifies one password, either inline (holding the GIL for the whole hash)
+or by handing the hash to app.hashing.PoolHasher.
+
+    python benchmarks/bench_password_hashing.py --logins 200 --threads 16
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.hashing import InlineHasher, PoolHasher, HashingBusy  # noqa: E402
+
+
+def run(hasher, pwhash, logins, threads):
+    rejected = 0
+
+    def login(_):
+        nonlocal rejected
+        try:
+            assert hasher.verify(pwhash, 'correct horse battery staple')
+        except HashingBusy:
+            rejected += 1
+
+    hasher.verify(pwhash, 'warm up')  # start pool processes outside the timing
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    return (logins - rejected) / elapsed, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16, help='concurrent request threads')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='pool processes')
+    parser.add_argument('--max-pending', type=int, default=64)
+    parser.add_argument('--method', default='scrypt')
+    args = parser.parse_args()
+
+    inline = InlineHasher(args.method)
+    pwhash = inline.hash('correct horse battery staple')
+    pool = PoolHasher(args.method, workers=args.workers, max_pending=args.max_pending)
+
+    results = {}
+    for name, hasher, cores in (('inline', inline, 1), ('pool', pool, args.workers)):
+        rate, rejected = run(hasher, pwhash, args.logins, args.threads)
+        results[name] = rate
+        print(f'{name:7} {rate:8.1f} logins/s  {rate / cores:7.1f} per core  '
+              f'({cores} core{"s" if cores > 1 else ""}, {rejected} rejected with 503)')
+    pool.shutdown()
+    print(f'speedup {results["pool"] / results["inline"]:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Concurrent write throughput on SQLite, driver defaults against the app's engine profile.
+
+Several worker processes (standing in for gunicorn workers), each with a
+few threads, post messages the way influencer.view_ad_request does: insert
+the message and update the thread summary on its ad request, one
+transaction per message, with reads of the thread in between. Each
+profile runs on a fresh database file.
+
+    python benchmarks/bench_sqlite_writes.py --workers 4 --threads 4 --duration 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, insert, select, update
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import Config  # noqa: E402
+from app.database import engine_options  # noqa: E402
+from app.models import db, AdRequest, Message  # noqa: E402
+
+AD_REQUESTS = 1000
+
+
+def profiles(threads):
+    tuned = {key: getattr(Config, key) for key in dir(Config) if key.startswith('SQLITE_')}
+    tuned['SQLITE_POOL_SIZE'] = threads
+    return {
+        # What the app used before: SQLAlchemy and sqlite3 defaults (rollback journal, synchronous=FULL)
+        'default': lambda uri: {},
+        'tuned': lambda uri: engine_options({**tuned, 'SQLALCHEMY_DATABASE_URI': uri}),
+    }
+
+
+def prepare(uri, options):
+    engine = create_engine(uri, **options)
+    db.metadata.create_all(engine, tables=[AdRequest.__table__, Message.__table__])
+    with engine.begin() as conn:
+        conn.execute(insert(AdRequest), [{'id': n, 'campaign_id': 1, 'influencer_id': n, 'requirements': 'x',
+                                          'payment_amount': 100, 'status': 'pending'}
+                                         for n in range(1, AD_REQUESTS + 1)])
+    engine.dispose()
+
+
+def post_messages(engine, deadline, reads, counts, seed):
+    rng = random.Random(seed)
+    while time.monotonic() < deadline:
+        ad_request_id = rng.randint(1, AD_REQUESTS)
+        try:
+            with engine.connect() as conn:
+                for _ in range(reads):
+                    conn.execute(select(Message.id, Message.content)
+                                 .filter(Message.ad_request_id == ad_request_id)
+                                 .order_by(Message.id.desc()).limit(20)).all()
+                conn.commit()  # end the read transaction before writing, as a request would
+                message_id = conn.execute(insert(Message).values(
+                    ad_request_id=ad_request_id, sender_id=1, recipient_id=2, content='hello ' * 20,
+                )).inserted_primary_key[0]
+                conn.execute(update(AdRequest).filter(AdRequest.id == ad_request_id)
+                             .values(last_message_id=message_id, last_message_at=db.func.now()))
+                conn.commit()
+            counts['commits'] += 1
+        except OperationalError:
+            counts['locked'] += 1
+
+
+def worker(uri, options, threads, duration, reads, seed, results):
+    engine = create_engine(uri, **options)
+    deadline = time.monotonic() + duration
+    counts = [{'commits': 0, 'locked': 0} for _ in range(threads)]
+    pool = [threading.Thread(target=post_messages, args=(engine, deadline, reads, counts[n], seed * 100 + n))
+            for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put({key: sum(c[key] for c in counts) for key in ('commits', 'locked')})
+
+
+def run(name, make_options, args, directory):
+    path = os.path.join(directory, f'{name}.db')
+    uri = f'sqlite:///{path}'
+    options = make_options(uri)
+    prepare(uri, options)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(uri, options, args.threads, args.duration,
+                                                              args.reads, n, results))
+                 for n in range(args.workers)]
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    commits = sum(t['commits'] for t in totals)
+    locked = sum(t['locked'] for t in totals)
+    print(f'{name:8} {commits / args.duration:9.0f} writes/s  {commits:7} committed  '
+          f'{locked:5} "database is locked"')
+    return commits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4, help='processes')
+    parser.add_argument('--threads', type=int, default=4, help='threads per process')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per profile')
+    parser.add_argument('--reads', type=int, default=2, help='thread reads before each write')
+    parser.add_argument('--dir', help='where to put the database files (default: a temporary directory)')
+    args = parser.parse_args()
+
+    print(f'{args.workers} processes x {args.threads} threads, {args.duration:.0f} s each')
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        results = {name: run(name, make_options, args, directory)
+                   for name, make_options in profiles(args.threads).items()}
+    if results['default']:
+        print(f'tuned/default: {results["tuned"] / results["default"]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""Concurrent load driver: logs in as admins, sponsors and influencers and
+exercises their pages, then reports p50/p95/p99 latency and throughput per endpoint.
+
+Needs a database filled by seed_data.py (its manifest supplies usernames,
+the password and campaign ownership). Either point it at a running server
+or let it serve the app in-process:
+
+    python benchmarks/seed_data.py --users 10000 --reset
+    python benchmarks/load_test.py --serve --duration 60 --sponsors 8 --influencers 16 --admins 2 \\
+        --output results/$(git rev-parse --short HEAD).json
+    python benchmarks/report.py compare results/before.json results/after.json
+
+Each virtual user is a thread with its own cookie session, picking pages
+by weight with no think time, so the numbers describe a saturated server.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from report import print_summary, save, summarize  # noqa: E402
+
+CSRF_TOKEN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+DISCOVER_SORTS = ('budget', 'end_date')
+TYPEAHEAD_PREFIXES = ('i', 'in', 'inf', 'influencer1', 'influencer2', 'influencer3')
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # A redirect is the page's answer; following it would time a second request
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class VirtualUser:
+    """One logged in user with its own cookies, numbered within its role."""
+
+    def __init__(self, base_url, role, n, username, manifest, seed):
+        self.base_url = base_url.rstrip('/')
+        self.role = role
+        self.n = n
+        self.username = username
+        self.manifest = manifest
+        self.rng = random.Random(f'{seed}:{role}:{n}')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect())
+
+    def request(self, path, data=None):
+        """Returns (status, body, headers); HTTP errors and redirects are answers, not exceptions."""
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(self.base_url + path, body, timeout=30) as response:
+                return response.status, response.read(), response.headers
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), e.headers
+
+    def login(self, password, attempts=10):
+        for _ in range(attempts):
+            _, page, _ = self.request('/auth/login')
+            token = CSRF_TOKEN.search(page.decode())
+            status, _, headers = self.request('/auth/login', {
+                'csrf_token': token.group(1) if token else '', 'username': self.username,
+                'password': password})
+            if status == 429:
+                time.sleep(float(headers.get('Retry-After') or 1))
+                continue
+            if status in (301, 302, 303) and '/auth/login' not in (headers.get('Location') or ''):
+                return
+            raise RuntimeError(f'Could not log in as {self.username} (HTTP {status})')
+        raise RuntimeError(f'Could not log in as {self.username}: still rate limited')
+
+    # Ids from the seed layout
+
+    def any_campaign(self):
+        return self.rng.randint(1, self.manifest['campaigns']['count'])
+
+    def public_campaign(self):
+        private_every = self.manifest['campaigns']['private_every']
+        while (campaign_id := self.any_campaign()) % private_every == 0:
+            pass
+        return campaign_id
+
+    def own_campaign(self):
+        per_sponsor = self.manifest['campaigns']['per_sponsor']
+        return self.n * per_sponsor + self.rng.randint(1, per_sponsor)
+
+    def running(self):
+        # Campaigns running on the seed's --today, not the real one, so the feed stays the same size
+        today = self.manifest.get('today')
+        return f'active_from={today}&active_to={today}' if today else ''
+
+    def page(self, rows, per_page=10):
+        # Mostly the first pages, as real browsing is
+        return min(int(self.rng.expovariate(1 / 2)) + 1, max(1, rows // per_page))
+
+
+# role -> [(label, weight, path for a virtual user)]
+SCENARIOS = {
+    'admin': [
+        ('admin.manage_users', 3, lambda u: f'/admin/users?page={u.page(u.manifest["rows"]["user"])}'),
+        ('admin.manage_campaigns', 3,
+         lambda u: f'/admin/campaigns?page={u.page(u.manifest["rows"]["campaign"])}'),
+        ('admin.manage_ad_requests', 2, lambda u: '/admin/ad_requests'),
+        ('admin.manage_messages', 2, lambda u: '/admin/messages'),
+        ('admin.view_campaign', 3, lambda u: f'/admin/view_campaign/{u.any_campaign()}'),
+        ('admin.analytics', 1, lambda u: '/admin/analytics'),
+    ],
+    'sponsor': [
+        ('sponsor.campaigns', 4, lambda u: '/sponsor/campaigns'),
+        ('sponsor.ad_requests', 4, lambda u: f'/sponsor/ad_requests/{u.own_campaign()}'),
+        ('sponsor.influencer_typeahead', 3, lambda u: f'/sponsor/influencer_typeahead/{u.own_campaign()}'
+                                                      f'?q={u.rng.choice(TYPEAHEAD_PREFIXES)}'),
+        ('sponsor.recommended_influencers', 1, lambda u: f'/sponsor/recommended_influencers/{u.own_campaign()}'),
+    ],
+    'influencer': [
+        ('influencer.ad_requests', 4, lambda u: '/influencer/ad_requests'),
+        ('influencer.discover', 4, lambda u: f'/influencer/discover?sort={u.rng.choice(DISCOVER_SORTS)}'
+                                              f'&{u.running()}'),
+        ('influencer.view_campaign', 3, lambda u: f'/influencer/view_campaign/{u.public_campaign()}'),
+    ],
+}
+
+
+def run_user(user, deadline, samples, errors):
+    scenarios = SCENARIOS[user.role]
+    weights = [weight for _, weight, _ in scenarios]
+    while time.monotonic() < deadline:
+        label, _, path = user.rng.choices(scenarios, weights)[0]
+        started = time.perf_counter()
+        try:
+            status, _, _ = user.request(path(user))
+            ok = status < 400
+        except OSError as e:
+            ok = False
+            errors.append(f'{label}: {e}')
+        samples.append((label, time.perf_counter() - started, ok))
+
+
+def virtual_users(args, manifest):
+    users = []
+    for role, count in (('admin', args.admins), ('sponsor', args.sponsors), ('influencer', args.influencers)):
+        for n in range(count):
+            if role == 'admin':
+                number, username = n, manifest['admin']['username']
+            else:
+                # Spread virtual users over the seeded accounts
+                number = n * max(1, manifest[f'{role}s']['count'] // max(count, 1))
+                username = manifest[f'{role}s']['username'].format(n=number)
+            users.append(VirtualUser(args.base_url, role, number, username, manifest, args.seed))
+    return users
+
+
+def serve(database):
+    """Starts the app on a free local port in a background thread; returns its base URL."""
+    import logging
+    from werkzeug.serving import make_server
+    from app import create_app
+    from seed_data import bench_config
+
+    # No login throttling: every virtual user signs in from the same address
+    app = create_app(bench_config(database, PROFILING_ENABLED=False))
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # one access log line per request otherwise
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--serve', action='store_true', help="run the app in-process on the manifest's database")
+    parser.add_argument('--manifest', default='instance/bench_manifest.json')
+    parser.add_argument('--admins', type=int, default=1)
+    parser.add_argument('--sponsors', type=int, default=4)
+    parser.add_argument('--influencers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='seconds of measured load')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds of unmeasured load first')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='save the results as JSON here')
+    args = parser.parse_args()
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    if args.serve:
+        args.base_url = serve(manifest['database'])
+
+    users = virtual_users(args, manifest)
+    for user in users:
+        user.login(manifest['password'])
+    print(f'{len(users)} virtual users logged in to {args.base_url}')
+
+    samples, errors = [], []
+    if args.warmup:
+        threads = [threading.Thread(target=run_user, args=(user, time.monotonic() + args.warmup, [], []))
+                   for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=run_user, args=(user, started + args.duration, samples, errors))
+               for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summary = summarize(samples, time.monotonic() - started)
+
+    print_summary(summary)
+    for error in errors[:10]:
+        print(f'  {error}')
+    if args.output:
+        save(args.output, summary, args, manifest)
+        print(f'results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Latency and throughput reports for load_test.py runs, and comparisons between them.
+
+    python benchmarks/report.py show results/run.json
+    python benchmarks/report.py compare results/before.json results/after.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of an already sorted list."""
+    return samples[min(len(samples) - 1, max(0, int(round(len(samples) * p / 100 + 0.5)) - 1))]
+
+
+def summarize(samples, elapsed):
+    """Per-endpoint figures for ``samples``, a list of (endpoint, seconds, ok) tuples,
+    collected over ``elapsed`` seconds. Latencies are reported in milliseconds."""
+    by_endpoint = defaultdict(list)
+    errors = defaultdict(int)
+    for endpoint, seconds, ok in samples:
+        by_endpoint[endpoint].append(seconds * 1000)
+        if not ok:
+            errors[endpoint] += 1
+
+    def figures(latencies, failed):
+        latencies.sort()
+        row = {'requests': len(latencies), 'errors': failed, 'rps': round(len(latencies) / elapsed, 2),
+               'mean_ms': round(sum(latencies) / len(latencies), 2), 'max_ms': round(latencies[-1], 2)}
+        row.update({f'p{p}_ms': round(percentile(latencies, p), 2) for p in PERCENTILES})
+        return row
+
+    endpoints = {name: figures(latencies, errors[name]) for name, latencies in sorted(by_endpoint.items())}
+    everything = [latency for latencies in by_endpoint.values() for latency in latencies]
+    total = figures(everything, sum(errors.values())) if everything else {}
+    return {'elapsed_s': round(elapsed, 2), 'endpoints': endpoints, 'total': total}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(path, summary, args, manifest=None):
+    """Writes ``summary`` with enough context (commit, host, options, data size) to compare runs later."""
+    result = {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'options': {key: value for key, value in vars(args).items() if key != 'password'},
+        'data': manifest and manifest.get('rows'),
+        **summary,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def print_summary(summary, out=sys.stdout):
+    columns = ('requests', 'errors', 'rps') + tuple(f'p{p}_ms' for p in PERCENTILES) + ('max_ms',)
+    width = max([len(name) for name in summary['endpoints']] + [10])
+    out.write(f'{"endpoint":{width}}' + ''.join(f'{column:>10}' for column in columns) + '\n')
+    rows = list(summary['endpoints'].items())
+    if summary.get('total'):
+        rows.append(('total', summary['total']))
+    for name, row in rows:
+        out.write(f'{name:{width}}' + ''.join(f'{row[column]:>10}' for column in columns) + '\n')
+
+
+def print_comparison(before, after, out=sys.stdout):
+    """Side by side p50/p95/p99 and throughput, with the change as a percentage."""
+    columns = tuple(f'p{p}_ms' for p in PERCENTILES) + ('rps',)
+    names = sorted(set(before['endpoints']) | set(after['endpoints']))
+    width = max([len(name) for name in names] + [10])
+    out.write(f'{before.get("commit")} -> {after.get("commit")}\n')
+    out.write(f'{"endpoint":{width}}' + ''.join(f'{column:>26}' for column in columns) + '\n')
+    for name, old, new in [(name, before['endpoints'].get(name), after['endpoints'].get(name))
+                           for name in names] + [('total', before.get('total'), after.get('total'))]:
+        cells = []
+        for column in columns:
+            if not old or not new:
+                cells.append(f'{"-":>26}')
+                continue
+            change = f'{(new[column] - old[column]) / old[column] * 100:+.0f}%' if old[column] else ''
+            cells.append(f'{f"{old[column]} -> {new[column]} {change}":>26}')
+        out.write(f'{name:{width}}' + ''.join(cells) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('show').add_argument('result')
+    compare = commands.add_parser('compare')
+    compare.add_argument('before')
+    compare.add_argument('after')
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        print_summary(load(args.result))
+    else:
+        print_comparison(load(args.before), load(args.after))
+
+
+if __name__ == '__main__':
+    main()
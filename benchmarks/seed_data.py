@@ -0,0 +1,259 @@
+"""Fills a database with seeded synthetic users, campaigns, ad requests and messages.
+
+The same --seed, --today and sizes always produce the same rows. Usernames follow
+the pattern admin, sponsor<n> and influencer<n>, all with one password, and
+a manifest JSON records the id layout so load_test.py can log in as anyone
+and find their campaigns.
+
+    python benchmarks/seed_data.py --database sqlite:///instance/bench.db --users 10000
+    python benchmarks/seed_data.py --users 1000000 --requests-per-campaign 10   # ~10M rows
+
+Rows are written with executemany in --chunk-size batches, bypassing the
+ORM; the search index, rollups, conversation counters and activity series
+are then brought up to date the same way the bulk writers in the app do.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import Config  # noqa: E402
+from app import create_app  # noqa: E402
+from app.hashing import hash_password  # noqa: E402
+from app.models import (db, User, Category, Campaign, AdRequest, Message,  # noqa: E402
+                        SocialMediaLink)
+from app.rollups import rebuild_rollups  # noqa: E402
+from app.search import fts_enabled, rebuild_search_index  # noqa: E402
+from app.timeseries import record_transitions  # noqa: E402
+
+PLATFORMS = ('facebook', 'instagram', 'twitter', 'youtube', 'linkedin', 'tiktok')
+STATUSES = (('pending', 0.45), ('accepted', 0.3), ('rejected', 0.15), ('negotiate', 0.1))
+WORDS = ('fashion beauty travel food fitness gaming tech music dance yoga vegan parenting finance '
+         'photography art design skincare makeup streetwear sneakers coffee outdoors hiking cycling '
+         'running football cooking baking home garden pets books film comedy science cars').split()
+# Activity is spread over this many days before --today
+HISTORY_DAYS = 365
+# Fixed so that reruns on different days seed the same dates
+DEFAULT_TODAY = '2026-01-01'
+# Every Nth campaign is private, so load tests can tell which ones influencers may open
+PRIVATE_EVERY = 5
+
+
+def bench_config(database, **overrides):
+    """A Config subclass pointing at ``database`` with request-path extras turned off."""
+    return type('BenchConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': database,
+        'SQL_LOG_SAMPLE_RATE': 0.0,
+        'RATE_LIMIT_ENABLED': False,
+        **overrides,
+    })
+
+
+def words(rng, low, high):
+    return ' '.join(rng.sample(WORDS, rng.randint(low, high)))
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+class Layout:
+    """Where every generated row lives, derived from the sizes alone."""
+
+    def __init__(self, args):
+        self.users = args.users
+        self.sponsors = max(1, int(args.users * args.sponsor_share))
+        self.influencers = max(1, args.users - self.sponsors - 1)
+        self.categories = args.categories
+        self.campaigns_per_sponsor = args.campaigns_per_sponsor
+        self.requests_per_campaign = min(args.requests_per_campaign, self.influencers)
+        self.messages_per_request = args.messages_per_request
+        self.links_per_influencer = min(args.links_per_influencer, len(PLATFORMS))
+        # Ids: 1 is the admin, then sponsors, then influencers
+        self.first_sponsor = 2
+        self.first_influencer = self.first_sponsor + self.sponsors
+        self.campaigns = self.sponsors * self.campaigns_per_sponsor
+        self.ad_requests = self.campaigns * self.requests_per_campaign
+        self.messages = self.ad_requests * self.messages_per_request
+
+    def manifest(self, args):
+        return {
+            'seed': args.seed, 'today': args.today.isoformat(), 'password': args.password,
+            'database': args.database,
+            'admin': {'id': 1, 'username': 'admin'},
+            'sponsors': {'first_id': self.first_sponsor, 'count': self.sponsors, 'username': 'sponsor{n}'},
+            'influencers': {'first_id': self.first_influencer, 'count': self.influencers,
+                            'username': 'influencer{n}'},
+            # Sponsor n (0-based) owns campaign ids n * per_sponsor + 1 .. (n + 1) * per_sponsor
+            'campaigns': {'count': self.campaigns, 'per_sponsor': self.campaigns_per_sponsor,
+                          'private_every': PRIVATE_EVERY},
+            'rows': {'category': self.categories, 'user': self.users, 'campaign': self.campaigns,
+                     'ad_request': self.ad_requests, 'message': self.messages,
+                     'social_media_link': self.influencers * self.links_per_influencer},
+        }
+
+
+def generate_users(layout, rng, pwhash):
+    yield {'id': 1, 'username': 'admin', 'email': 'admin@example.com', 'role': 'admin',
+           'password_hash': pwhash, 'is_active': True, 'is_flagged': False}
+    for n in range(layout.sponsors):
+        yield {'id': layout.first_sponsor + n, 'username': f'sponsor{n}', 'email': f'sponsor{n}@example.com',
+               'role': 'sponsor', 'password_hash': pwhash, 'is_active': True, 'is_flagged': False}
+    for n in range(layout.influencers):
+        yield {'id': layout.first_influencer + n, 'username': f'influencer{n}',
+               'email': f'influencer{n}@example.com', 'role': 'influencer', 'password_hash': pwhash,
+               'is_active': True, 'is_flagged': rng.random() < 0.01,
+               'category_id': rng.randint(1, layout.categories), 'niche': words(rng, 1, 3),
+               'bio': words(rng, 3, 12)}
+
+
+def generate_links(layout, rng):
+    for n in range(layout.influencers):
+        for platform in rng.sample(PLATFORMS, layout.links_per_influencer):
+            yield {'influencer_id': layout.first_influencer + n, 'platform': platform,
+                   'url': f'https://{platform}.example.com/influencer{n}'}
+
+
+def generate_campaigns(layout, rng, today):
+    campaign_id = 0
+    for n in range(layout.sponsors):
+        for _ in range(layout.campaigns_per_sponsor):
+            campaign_id += 1
+            start = today - timedelta(days=rng.randint(0, HISTORY_DAYS))
+            yield {'id': campaign_id, 'name': f'{words(rng, 1, 3).title()} {campaign_id}',
+                   'description': words(rng, 8, 20), 'goals': words(rng, 3, 8),
+                   'start_date': start, 'end_date': start + timedelta(days=rng.randint(7, 180)),
+                   'budget': rng.choice((500, 1000, 2500, 5000, 10000, 25000)),
+                   'visibility': 'private' if campaign_id % PRIVATE_EVERY == 0 else 'public',
+                   'sponsor_id': layout.first_sponsor + n, 'category_id': rng.randint(1, layout.categories)}
+
+
+def generate_ad_requests(layout, rng, now):
+    statuses, weights = zip(*STATUSES)
+    ad_request_id = 0
+    for campaign_id in range(1, layout.campaigns + 1):
+        # Older campaigns first, so created_at grows with the id like real data
+        created = now - timedelta(seconds=HISTORY_DAYS * 86400 * (1 - campaign_id / (layout.campaigns + 1)))
+        for influencer in rng.sample(range(layout.influencers), layout.requests_per_campaign):
+            ad_request_id += 1
+            yield {'id': ad_request_id, 'campaign_id': campaign_id,
+                   'influencer_id': layout.first_influencer + influencer,
+                   'requirements': words(rng, 5, 15), 'payment_amount': rng.randint(1, 100) * 50,
+                   'status': rng.choices(statuses, weights)[0], 'created_at': created}
+
+
+def generate_messages(ad_requests, layout, rng):
+    for ad_request in ad_requests:
+        sponsor_id = layout.first_sponsor + (ad_request['campaign_id'] - 1) // layout.campaigns_per_sponsor
+        timestamp = ad_request['created_at']
+        for n in range(layout.messages_per_request):
+            sender, recipient = ((sponsor_id, ad_request['influencer_id']) if n % 2 == 0
+                                 else (ad_request['influencer_id'], sponsor_id))
+            timestamp += timedelta(minutes=rng.randint(1, 600))
+            yield {'ad_request_id': ad_request['id'], 'sender_id': sender, 'recipient_id': recipient,
+                   'content': words(rng, 3, 20), 'timestamp': timestamp}
+
+
+def insert(model, rows, chunk_size, label):
+    started, total = time.perf_counter(), 0
+    for chunk in chunks(rows, chunk_size):
+        db.session.execute(db.insert(model), chunk)
+        db.session.commit()
+        total += len(chunk)
+    print(f'{label:18} {total:>10} rows in {time.perf_counter() - started:6.1f} s')
+    return total
+
+
+def seed(args):
+    rng = random.Random(args.seed)
+    layout = Layout(args)
+    today = args.today
+    now = datetime.combine(today, datetime.min.time())
+
+    db.session.execute(db.insert(Category), [{'id': n, 'name': f'Category {n}'}
+                                             for n in range(1, layout.categories + 1)])
+    db.session.commit()
+    pwhash = hash_password(args.password)  # one hash for everyone; hashing millions would dominate
+    insert(User, generate_users(layout, rng, pwhash), args.chunk_size, 'users')
+    insert(SocialMediaLink, generate_links(layout, rng), args.chunk_size, 'social links')
+    insert(Campaign, generate_campaigns(layout, rng, today), args.chunk_size, 'campaigns')
+
+    started = time.perf_counter()
+    for chunk in chunks(generate_ad_requests(layout, rng, now), args.chunk_size):
+        db.session.execute(db.insert(AdRequest), chunk)
+        # Creation straight into the final status, dated when the chunk was created
+        record_transitions(db.session.connection(), [
+            {'ad_request_id': r['id'], 'influencer_id': r['influencer_id'], 'campaign_id': r['campaign_id'],
+             'old_status': None, 'new_status': r['status'], 'payment_amount': r['payment_amount'],
+             'old_payment_amount': None} for r in chunk], now=chunk[0]['created_at'])
+        if layout.messages_per_request:
+            for messages in chunks(generate_messages(chunk, layout, rng), args.chunk_size):
+                db.session.execute(db.insert(Message), messages)
+        db.session.commit()
+    print(f'{"ad requests":18} {layout.ad_requests:>10} rows in {time.perf_counter() - started:6.1f} s '
+          f'(+ {layout.messages} messages)')
+
+    started = time.perf_counter()
+    # Thread summaries and unread counters, as the conversation state migration backfills them
+    db.session.execute(db.text(
+        'UPDATE ad_request SET '
+        'last_message_id = (SELECT max(id) FROM message WHERE message.ad_request_id = ad_request.id), '
+        'last_message_at = (SELECT max(timestamp) FROM message WHERE message.ad_request_id = ad_request.id)'))
+    db.session.execute(db.text(
+        'INSERT INTO conversation_state (user_id, ad_request_id, last_read_message_id, unread_count) '
+        'SELECT recipient_id, ad_request_id, 0, count(*) FROM message GROUP BY recipient_id, ad_request_id'))
+    db.session.commit()
+    rebuild_rollups()
+    if fts_enabled():
+        rebuild_search_index()
+    print(f'{"derived tables":18} {"":>10}      in {time.perf_counter() - started:6.1f} s')
+    return layout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default='sqlite:///' + os.path.abspath('instance/bench.db'))
+    parser.add_argument('--manifest', default='instance/bench_manifest.json')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--sponsor-share', type=float, default=0.1)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--campaigns-per-sponsor', type=int, default=5)
+    parser.add_argument('--requests-per-campaign', type=int, default=8)
+    parser.add_argument('--messages-per-request', type=int, default=3)
+    parser.add_argument('--links-per-influencer', type=int, default=2)
+    parser.add_argument('--password', default='benchmark-password')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--today', type=date.fromisoformat, default=DEFAULT_TODAY,
+                        help='date the generated history ends on (YYYY-MM-DD)')
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--reset', action='store_true', help='drop and recreate every table first')
+    args = parser.parse_args()
+
+    app = create_app(bench_config(args.database))
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+            db.create_all()
+        if db.session.execute(db.select(db.func.count(User.id))).scalar():
+            sys.exit(f'{args.database} already has users; pass --reset to start over.')
+        started = time.perf_counter()
+        layout = seed(args)
+        manifest = layout.manifest(args)
+
+    print(f'{sum(manifest["rows"].values())} rows in {time.perf_counter() - started:.1f} s')
+    os.makedirs(os.path.dirname(os.path.abspath(args.manifest)), exist_ok=True)
+    with open(args.manifest, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f'manifest written to {args.manifest}')
+
+
+if __name__ == '__main__':
+    main()
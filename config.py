@@ -5,6 +5,139 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key' 
 
     # Database configuration
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///yourdatabase.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///yourdatabase.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False 
-    SQLALCHEMY_ECHO = True
+    SQLALCHEMY_ECHO = False  # see SQL_LOG_SAMPLE_RATE
+
+    # SQLite engine profile (app/database.py), applied to file databases on
+    # every new connection. WAL lets readers run alongside the single writer;
+    # busy_timeout makes writers queue for the lock instead of failing, and a
+    # COMMIT that still finds the database locked is retried with jitter.
+    # The pool is per worker process: size it to the worker's thread count.
+    SQLITE_TUNING_ENABLED = True
+    SQLITE_JOURNAL_MODE = 'WAL'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')  # FULL survives power loss, NORMAL in WAL survives crashes
+    SQLITE_CACHE_SIZE_KB = 65536  # page cache per connection
+    SQLITE_MMAP_SIZE = 256 * 2**20  # bytes of the file read through memory mapping
+    SQLITE_BUSY_TIMEOUT = 5000  # ms
+    SQLITE_COMMIT_RETRIES = 5
+    SQLITE_COMMIT_RETRY_DELAY = 0.01  # seconds, doubled per retry
+    SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', '5'))
+    SQLITE_POOL_MAX_OVERFLOW = 5
+    SQLITE_POOL_TIMEOUT = 30  # seconds to wait for a pooled connection
+
+    # Read/write splitting (app/routing.py). Views marked @read_replica send
+    # their reads to one of these replicas; writes, reads after a write in the
+    # same request, and every read by a user for REPLICA_STICKY_SECONDS after
+    # they committed go to the primary. Locally, two SQLite files stand in:
+    # DATABASE_REPLICA_URLS=sqlite:///replica.db and `flask sync-replica`.
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri]
+    REPLICA_STICKY_SECONDS = 5  # longer than the replication lag you expect
+    # Pool settings for non-SQLite primaries and for replicas
+    PRIMARY_ENGINE_OPTIONS = {'pool_size': 10, 'max_overflow': 5, 'pool_pre_ping': True, 'pool_recycle': 1800}
+    REPLICA_ENGINE_OPTIONS = {'pool_size': 20, 'max_overflow': 10, 'pool_pre_ping': True, 'pool_recycle': 1800}
+
+    # Request, SQL and template timings, served at /metrics in the Prometheus
+    # text format. Statements slower than SLOW_QUERY_THRESHOLD are kept with
+    # their stacks (see /admin/slow_queries) and always logged; other
+    # statements are logged as JSON lines to the 'app.sql' logger at
+    # SQL_LOG_SAMPLE_RATE. Admins can send X-Profile: 1 (or cumulative,
+    # tottime, ncalls) to get a cProfile summary instead of the page.
+    INSTRUMENTATION_ENABLED = True
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    SLOW_QUERY_THRESHOLD = 0.1  # seconds
+    SLOW_QUERY_SAMPLES = 100
+    SQL_LOG_SAMPLE_RATE = float(os.environ.get('SQL_LOG_SAMPLE_RATE', '0.01'))
+    PROFILING_ENABLED = True
+
+    # Query budgets (@query_budget on views) and the per-request N+1 detector.
+    # None means on in debug and testing, off otherwise. QUERY_DETECTOR_RAISE
+    # turns detector warnings into errors, as the pytest fixture does.
+    QUERY_BUDGETS_ENFORCED = None
+    QUERY_DETECTOR_ENABLED = None
+    QUERY_DETECTOR_RAISE = False
+    QUERY_REPEAT_THRESHOLD = 5
+
+    # User identity cache used by the Flask-Login user loader.
+    # 'memory' is per process; 'sqlite' shares one cache file across workers,
+    # so role changes and deactivations reach every worker at once. None picks
+    # 'memory' in debug and testing and 'sqlite' otherwise. With 'memory' under
+    # several workers, such changes take up to USER_CACHE_TTL to reach the others.
+    USER_CACHE_BACKEND = os.environ.get('USER_CACHE_BACKEND')
+    USER_CACHE_PATH = os.environ.get('USER_CACHE_PATH', 'instance/user_cache.db')
+    USER_CACHE_TTL = 300  # seconds
+    USER_CACHE_SIZE = 10000
+
+    # Rendered campaign page fragments, keyed by per-campaign version tokens.
+    # A local LRU per process, backed by a shared cache file when the backend is 'sqlite'.
+    # The version tokens live in the shared file too, so invalidations from any
+    # web worker, `flask worker` or `flask import` reach every process. None
+    # picks 'memory' in debug and testing and 'sqlite' otherwise.
+    FRAGMENT_CACHE_ENABLED = True
+    FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND')
+    FRAGMENT_CACHE_PATH = os.environ.get('FRAGMENT_CACHE_PATH', 'instance/fragment_cache.db')
+    FRAGMENT_CACHE_TTL = 300  # seconds
+    FRAGMENT_CACHE_SIZE = 2000
+    FRAGMENT_CACHE_SHARED_SIZE = 20000
+    # First pages of the influencer discovery feed are shared by everyone and
+    # no invalidation reaches them, so they are only kept this briefly.
+    DISCOVER_CACHE_TTL = 30  # seconds
+
+    # Influencer recommendations are scored from in-memory feature matrices,
+    # updated incrementally from this process's writes and fully rebuilt this
+    # often to pick up writes from other workers.
+    MATCHING_REBUILD_INTERVAL = 600  # seconds
+    MATCHING_SHORTLIST_SIZE = 10
+
+    # Password hashing. 'pool' runs hashes on a process pool and answers 503
+    # once PASSWORD_HASH_MAX_PENDING hashes are already queued or running.
+    PASSWORD_HASH_BACKEND = os.environ.get('PASSWORD_HASH_BACKEND', 'inline')
+    PASSWORD_HASH_METHOD = 'scrypt'  # stored hashes using other parameters are upgraded on login
+    PASSWORD_HASH_WORKERS = None  # defaults to the CPU count
+    PASSWORD_HASH_MAX_PENDING = 64
+    PASSWORD_HASH_TIMEOUT = 10  # seconds
+
+    # Login throttling with token buckets, as (attempts, seconds); attempts is also the burst.
+    # 'memory' buckets are per process; 'sqlite' shares one bucket file across workers.
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_PATH = os.environ.get('RATE_LIMIT_PATH', 'instance/ratelimit.db')
+    RATE_LIMIT_IDLE_TTL = 3600  # seconds before an untouched bucket is dropped
+    LOGIN_RATE_LIMIT_PER_IP = (20, 60)
+    LOGIN_RATE_LIMIT_PER_USERNAME = (5, 60)
+    # Reverse proxies in front of the app that append to X-Forwarded-For.
+    # Without them every login would share the proxy's address, and its IP
+    # bucket. 0 trusts no X-Forwarded-For header; never set it higher than
+    # the real number of proxies, or clients can pick their own address.
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', '0'))
+
+    # Background jobs (app/jobs.py), stored in the job table and run by
+    # `flask worker`. JOBS_EAGER runs them at the end of the request that
+    # queued them instead; None means in debug and testing. Workers in other
+    # processes reach live inboxes only through the 'sqlite' broker backend.
+    JOBS_EAGER = None
+    JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', '4'))
+    JOB_BATCH_SIZE = 100  # jobs of one kind handed to a batch handler at once
+    JOB_POLL_INTERVAL = 0.5  # seconds an idle worker thread waits before looking again
+    JOB_MAX_ATTEMPTS = 5
+    JOB_RETRY_BASE = 2  # seconds before the first retry, doubled per attempt, with jitter
+    JOB_RETRY_MAX = 600
+    JOB_TIMEOUT = 300  # seconds before a running job is assumed abandoned and requeued
+    JOB_RETENTION = 7 * 86400  # seconds finished jobs (and their idempotency keys) are kept
+
+    # Closing campaigns past their end date and expiring their pending ad
+    # requests (app/lifecycle.py). `flask worker` queues the sweep every
+    # interval; 0 turns that off, leaving `flask close-campaigns` (e.g. from cron).
+    CAMPAIGN_SWEEP_INTERVAL = int(os.environ.get('CAMPAIGN_SWEEP_INTERVAL', '3600'))
+    CAMPAIGN_SWEEP_BATCH_SIZE = 500  # campaigns per pass, and ad requests per UPDATE
+
+    # Pub/sub behind the live inbox (Server-Sent Events). 'memory' only reaches
+    # streams in the same process; 'sqlite' relays through a file shared by all workers.
+    # None means 'memory' while jobs run eagerly in the web process and 'sqlite'
+    # otherwise, so messages published by `flask worker` reach the streams.
+    BROKER_BACKEND = os.environ.get('BROKER_BACKEND')
+    BROKER_PATH = os.environ.get('BROKER_PATH', 'instance/broker.db')
+    BROKER_POLL_INTERVAL = 0.25  # seconds between reads of the shared file
+    BROKER_BUFFER_SIZE = 100  # events buffered per open stream before they are dropped
+    INBOX_HEARTBEAT = 15  # seconds between keepalive comments
+    INBOX_STREAM_TIMEOUT = 300  # seconds before a stream ends and the browser reconnects
@@ -0,0 +1,43 @@
+"""Add indexes on foreign keys and dashboard filter columns
+
+Revision ID: 1a2b3c4d5e6f
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '1a2b3c4d5e6f'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# Tables are still created by db.create_all(), which also creates these
+# indexes on a fresh database, so every index is guarded with if_not_exists.
+INDEXES = [
+    ('ix_user_role', 'user', ['role']),
+    ('ix_user_is_flagged', 'user', ['is_flagged']),
+    ('ix_campaign_sponsor_id', 'campaign', ['sponsor_id']),
+    ('ix_campaign_visibility', 'campaign', ['visibility']),
+    ('ix_ad_request_status', 'ad_request', ['status']),
+    ('ix_ad_request_campaign_id_influencer_id', 'ad_request', ['campaign_id', 'influencer_id']),
+    ('ix_ad_request_influencer_id_status', 'ad_request', ['influencer_id', 'status']),
+    ('ix_message_timestamp_id', 'message', ['timestamp', 'id']),
+    ('ix_message_ad_request_id_timestamp', 'message', ['ad_request_id', 'timestamp', 'id']),
+    ('ix_message_sender_id_timestamp', 'message', ['sender_id', 'timestamp', 'id']),
+    ('ix_message_recipient_id_timestamp', 'message', ['recipient_id', 'timestamp', 'id']),
+    ('ix_social_media_link_influencer_id', 'social_media_link', ['influencer_id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,70 @@
+"""Add user.category_id and the analytics rollup tables
+
+Revision ID: 2b3c4d5e6f70
+Revises: 1a2b3c4d5e6f
+Create Date: 2026-10-18 10:00:00.000000
+
+Run `flask rebuild-rollups` after upgrading to populate the new tables.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b3c4d5e6f70'
+down_revision = '1a2b3c4d5e6f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('user')}
+    if 'category_id' not in columns:
+        with op.batch_alter_table('user') as batch_op:
+            batch_op.add_column(sa.Column('category_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('fk_user_category_id', 'category', ['category_id'], ['id'])
+    op.create_index('ix_user_category_id', 'user', ['category_id'], unique=False, if_not_exists=True)
+
+    op.create_table('influencer_stats',
+        sa.Column('influencer_id', sa.Integer(), sa.ForeignKey('user.id'), primary_key=True),
+        sa.Column('request_count', sa.Integer(), nullable=False),
+        sa.Column('accepted_count', sa.Integer(), nullable=False),
+        if_not_exists=True,
+    )
+    op.create_index('ix_influencer_stats_accepted_count', 'influencer_stats', ['accepted_count'], unique=False, if_not_exists=True)
+    op.create_table('campaign_stats',
+        sa.Column('campaign_id', sa.Integer(), sa.ForeignKey('campaign.id'), primary_key=True),
+        sa.Column('request_count', sa.Integer(), nullable=False),
+        sa.Column('accepted_count', sa.Integer(), nullable=False),
+        sa.Column('accepted_spend', sa.Integer(), nullable=False),
+        if_not_exists=True,
+    )
+    op.create_table('sponsor_stats',
+        sa.Column('sponsor_id', sa.Integer(), sa.ForeignKey('user.id'), primary_key=True),
+        sa.Column('accepted_spend', sa.Integer(), nullable=False),
+        if_not_exists=True,
+    )
+    op.create_index('ix_sponsor_stats_accepted_spend', 'sponsor_stats', ['accepted_spend'], unique=False, if_not_exists=True)
+    op.create_table('category_stats',
+        sa.Column('category_id', sa.Integer(), sa.ForeignKey('category.id'), primary_key=True),
+        sa.Column('influencer_count', sa.Integer(), nullable=False),
+        if_not_exists=True,
+    )
+    op.create_index('ix_category_stats_influencer_count', 'category_stats', ['influencer_count'], unique=False, if_not_exists=True)
+    op.create_table('platform_stats',
+        sa.Column('name', sa.String(length=50), primary_key=True),
+        sa.Column('value', sa.Integer(), nullable=False),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_table('platform_stats', if_exists=True)
+    op.drop_table('category_stats', if_exists=True)
+    op.drop_table('sponsor_stats', if_exists=True)
+    op.drop_table('campaign_stats', if_exists=True)
+    op.drop_table('influencer_stats', if_exists=True)
+    op.drop_index('ix_user_category_id', table_name='user', if_exists=True)
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('category_id')
@@ -0,0 +1,51 @@
+"""Add ad request timestamps, status change log and activity buckets
+
+Revision ID: 3c4d5e6f7081
+Revises: 2b3c4d5e6f70
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c4d5e6f7081'
+down_revision = '2b3c4d5e6f70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('ad_request')}
+    if 'created_at' not in columns:
+        with op.batch_alter_table('ad_request') as batch_op:
+            batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+
+    op.create_table('ad_request_status_change',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('ad_request_id', sa.Integer(), sa.ForeignKey('ad_request.id'), nullable=False),
+        sa.Column('old_status', sa.String(length=20), nullable=True),
+        sa.Column('new_status', sa.String(length=20), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=False),
+        if_not_exists=True,
+    )
+    op.create_index('ix_ad_request_status_change_ad_request_id', 'ad_request_status_change',
+                    ['ad_request_id', 'changed_at'], unique=False, if_not_exists=True)
+    op.create_table('activity_bucket',
+        sa.Column('granularity', sa.String(length=5), primary_key=True),
+        sa.Column('metric', sa.String(length=20), primary_key=True),
+        sa.Column('scope', sa.String(length=10), primary_key=True),
+        sa.Column('scope_id', sa.Integer(), primary_key=True),
+        sa.Column('bucket_start', sa.Date(), primary_key=True),
+        sa.Column('value', sa.Integer(), nullable=False),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_table('activity_bucket', if_exists=True)
+    op.drop_index('ix_ad_request_status_change_ad_request_id', table_name='ad_request_status_change', if_exists=True)
+    op.drop_table('ad_request_status_change', if_exists=True)
+    with op.batch_alter_table('ad_request') as batch_op:
+        batch_op.drop_column('created_at')
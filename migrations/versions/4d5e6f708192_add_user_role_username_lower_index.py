@@ -0,0 +1,25 @@
+"""Add a (role, lower(username)) index for the influencer typeahead
+
+Revision ID: 4d5e6f708192
+Revises: 3c4d5e6f7081
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d5e6f708192'
+down_revision = '3c4d5e6f7081'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_user_role_username_lower', 'user', ['role', sa.text('lower(username)')],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_user_role_username_lower', table_name='user', if_exists=True)
@@ -0,0 +1,23 @@
+"""Add message (recipient_id, id) index for inbox streams
+
+Revision ID: 6f708192a3b4
+Revises: 5e6f708192a3
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '6f708192a3b4'
+down_revision = '5e6f708192a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_message_recipient_id_id', 'message', ['recipient_id', 'id'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_message_recipient_id_id', table_name='message')
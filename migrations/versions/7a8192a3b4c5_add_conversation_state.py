@@ -0,0 +1,45 @@
+"""Add conversation read markers and last message columns
+
+Revision ID: 7a8192a3b4c5
+Revises: 6f708192a3b4
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a8192a3b4c5'
+down_revision = '6f708192a3b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('ad_request')}
+    with op.batch_alter_table('ad_request') as batch_op:
+        if 'last_message_id' not in columns:
+            batch_op.add_column(sa.Column('last_message_id', sa.Integer(), nullable=True))
+        if 'last_message_at' not in columns:
+            batch_op.add_column(sa.Column('last_message_at', sa.DateTime(), nullable=True))
+
+    op.create_table('conversation_state',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), primary_key=True),
+        sa.Column('ad_request_id', sa.Integer(), sa.ForeignKey('ad_request.id'), primary_key=True),
+        sa.Column('last_read_message_id', sa.Integer(), nullable=False),
+        sa.Column('unread_count', sa.Integer(), nullable=False),
+        if_not_exists=True,
+    )
+
+    # Existing threads get their last message; older messages count as read
+    op.execute('UPDATE ad_request SET '
+               'last_message_id = (SELECT max(id) FROM message WHERE message.ad_request_id = ad_request.id), '
+               'last_message_at = (SELECT max(timestamp) FROM message WHERE message.ad_request_id = ad_request.id)')
+
+
+def downgrade():
+    op.drop_table('conversation_state', if_exists=True)
+    with op.batch_alter_table('ad_request') as batch_op:
+        batch_op.drop_column('last_message_at')
+        batch_op.drop_column('last_message_id')
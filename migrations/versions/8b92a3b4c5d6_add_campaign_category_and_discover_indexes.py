@@ -0,0 +1,39 @@
+"""Add campaign.category_id and the discovery feed covering indexes
+
+Revision ID: 8b92a3b4c5d6
+Revises: 7a8192a3b4c5
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b92a3b4c5d6'
+down_revision = '7a8192a3b4c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('campaign')}
+    if 'category_id' not in columns:
+        with op.batch_alter_table('campaign') as batch_op:
+            batch_op.add_column(sa.Column('category_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('fk_campaign_category_id', 'category', ['category_id'], ['id'])
+
+    op.create_index('ix_campaign_discover_budget', 'campaign',
+                    ['visibility', 'budget', 'id', 'end_date', 'start_date', 'category_id'],
+                    unique=False, if_not_exists=True)
+    op.create_index('ix_campaign_discover_end_date', 'campaign',
+                    ['visibility', 'end_date', 'id', 'start_date', 'budget', 'category_id'],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_campaign_discover_end_date', table_name='campaign', if_exists=True)
+    op.drop_index('ix_campaign_discover_budget', table_name='campaign', if_exists=True)
+    with op.batch_alter_table('campaign') as batch_op:
+        batch_op.drop_constraint('fk_campaign_category_id', type_='foreignkey')
+        batch_op.drop_column('category_id')
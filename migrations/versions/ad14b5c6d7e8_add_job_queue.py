@@ -0,0 +1,49 @@
+"""Add the background job table
+
+Revision ID: ad14b5c6d7e8
+Revises: 9ca3b4c5d6e7
+Create Date: 2026-10-18 20:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ad14b5c6d7e8'
+down_revision = '9ca3b4c5d6e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=200), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('worker', sa.String(length=100), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('idempotency_key'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_job_status_run_at', 'job', ['status', 'run_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index('ix_job_status_kind_run_at', 'job', ['status', 'kind', 'run_at', 'id'], unique=False,
+                    if_not_exists=True)
+    op.create_index('ix_job_finished_at', 'job', ['finished_at'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_job_finished_at', table_name='job')
+    op.drop_index('ix_job_status_kind_run_at', table_name='job')
+    op.drop_index('ix_job_status_run_at', table_name='job')
+    op.drop_table('job')
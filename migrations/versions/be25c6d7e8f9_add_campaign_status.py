@@ -0,0 +1,50 @@
+"""Add campaign.status and closed_at, the lifecycle sweep indexes, and status in the discovery indexes
+
+Revision ID: be25c6d7e8f9
+Revises: ad14b5c6d7e8
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'be25c6d7e8f9'
+down_revision = 'ad14b5c6d7e8'
+branch_labels = None
+depends_on = None
+
+DISCOVER_INDEXES = {
+    'ix_campaign_discover_budget': ['budget', 'id', 'end_date', 'start_date', 'category_id'],
+    'ix_campaign_discover_end_date': ['end_date', 'id', 'start_date', 'budget', 'category_id'],
+}
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('campaign')}
+    with op.batch_alter_table('campaign') as batch_op:
+        if 'status' not in columns:
+            batch_op.add_column(sa.Column('status', sa.String(length=10), nullable=False, server_default='active'))
+        if 'closed_at' not in columns:
+            batch_op.add_column(sa.Column('closed_at', sa.DateTime(), nullable=True))
+
+    op.create_index('ix_campaign_status_end_date', 'campaign', ['status', 'end_date', 'id'],
+                    unique=False, if_not_exists=True)
+    op.create_index('ix_ad_request_campaign_id_status', 'ad_request', ['campaign_id', 'status'],
+                    unique=False, if_not_exists=True)
+    # The feed now filters on status too, so it joins visibility in the equality prefix
+    for name, rest in DISCOVER_INDEXES.items():
+        op.drop_index(name, table_name='campaign', if_exists=True)
+        op.create_index(name, 'campaign', ['visibility', 'status', *rest], unique=False)
+
+
+def downgrade():
+    for name, rest in DISCOVER_INDEXES.items():
+        op.drop_index(name, table_name='campaign', if_exists=True)
+        op.create_index(name, 'campaign', ['visibility', *rest], unique=False)
+    op.drop_index('ix_ad_request_campaign_id_status', table_name='ad_request', if_exists=True)
+    op.drop_index('ix_campaign_status_end_date', table_name='campaign', if_exists=True)
+    with op.batch_alter_table('campaign') as batch_op:
+        batch_op.drop_column('closed_at')
+        batch_op.drop_column('status')
@@ -0,0 +1,25 @@
+"""Index influencer_stats.request_count for the top influencers ranking
+
+Revision ID: cf36d7e8f9a0
+Revises: be25c6d7e8f9
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cf36d7e8f9a0'
+down_revision = 'be25c6d7e8f9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_influencer_stats_request_count', 'influencer_stats', ['request_count'],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_influencer_stats_request_count', table_name='influencer_stats', if_exists=True)
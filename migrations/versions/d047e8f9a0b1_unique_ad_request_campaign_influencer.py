@@ -0,0 +1,45 @@
+"""Make (campaign_id, influencer_id) unique on ad_request, merging existing duplicates
+
+Revision ID: d047e8f9a0b1
+Revises: cf36d7e8f9a0
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd047e8f9a0b1'
+down_revision = 'cf36d7e8f9a0'
+branch_labels = None
+depends_on = None
+
+# Every ad request but the oldest for its (campaign, influencer) pair
+DUPLICATES = ('SELECT d.id FROM ad_request d WHERE EXISTS ('
+              'SELECT 1 FROM ad_request k WHERE k.campaign_id = d.campaign_id '
+              'AND k.influencer_id = d.influencer_id AND k.id < d.id)')
+
+
+def upgrade():
+    # Duplicates' messages move to the surviving ad request; their status
+    # log and read markers go with them. Rollups still count the removed
+    # rows, so run `flask rebuild-rollups` if this deleted anything.
+    op.execute(f'UPDATE message SET ad_request_id = ('
+               f'SELECT MIN(k.id) FROM ad_request k JOIN ad_request d '
+               f'ON k.campaign_id = d.campaign_id AND k.influencer_id = d.influencer_id '
+               f'WHERE d.id = message.ad_request_id) '
+               f'WHERE ad_request_id IN ({DUPLICATES})')
+    op.execute(f'DELETE FROM ad_request_status_change WHERE ad_request_id IN ({DUPLICATES})')
+    op.execute(f'DELETE FROM conversation_state WHERE ad_request_id IN ({DUPLICATES})')
+    op.execute(f'DELETE FROM ad_request WHERE id IN ({DUPLICATES})')
+
+    op.drop_index('ix_ad_request_campaign_id_influencer_id', table_name='ad_request', if_exists=True)
+    op.create_index('ix_ad_request_campaign_id_influencer_id', 'ad_request', ['campaign_id', 'influencer_id'],
+                    unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_ad_request_campaign_id_influencer_id', table_name='ad_request', if_exists=True)
+    op.create_index('ix_ad_request_campaign_id_influencer_id', 'ad_request', ['campaign_id', 'influencer_id'],
+                    unique=False)
@@ -0,0 +1,42 @@
+import pytest
+
+from app import create_app
+from app.models import db
+from config import Config
+
+pytest_plugins = ['app.pytest_plugin']
+
+
+class TestConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_ECHO = False
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SQL_LOG_SAMPLE_RATE = 0
+
+
+@pytest.fixture
+def app():
+    """A fresh app on an in-memory database; its context is not left pushed,
+    so each request gets its own ``g`` as it would in production."""
+    app = create_app(TestConfig)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    app.extensions['password_hasher'].shutdown()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """Logs ``client`` in as a user, without going through the login form."""
+    def login(user_id):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+    return login
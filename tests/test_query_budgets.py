@@ -0,0 +1,53 @@
+"""Every @query_budget list view, over enough rows that a per-row lazy load
+repeats past QUERY_REPEAT_THRESHOLD and fails the request."""
+from datetime import date, timedelta
+
+import pytest
+
+from app.models import db, User, Category, Campaign, AdRequest, Message
+
+ROWS = 8  # comfortably above QUERY_REPEAT_THRESHOLD
+
+
+@pytest.fixture
+def seeded(app):
+    today = date.today()
+    with app.app_context():
+        admin = User(username='admin', email='admin@example.com', role='admin', password_hash='x')
+        sponsor = User(username='sponsor', email='sponsor@example.com', role='sponsor', password_hash='x')
+        categories = [Category(name=f'Category {n}') for n in range(ROWS)]
+        db.session.add_all([admin, sponsor, *categories])
+        db.session.flush()
+        influencers = [User(username=f'influencer{n}', email=f'influencer{n}@example.com', role='influencer',
+                            password_hash='x', category_id=categories[n].id) for n in range(ROWS)]
+        campaigns = [Campaign(name=f'Campaign {n}', description='d', start_date=today,
+                              end_date=today + timedelta(days=30), budget=1000, sponsor_id=sponsor.id,
+                              category_id=categories[n].id) for n in range(ROWS)]
+        db.session.add_all([*influencers, *campaigns])
+        db.session.flush()
+        for campaign in campaigns:
+            for influencer in influencers:
+                ad_request = AdRequest(campaign_id=campaign.id, influencer_id=influencer.id,
+                                       requirements='r', payment_amount=100)
+                db.session.add(ad_request)
+                db.session.flush()
+                db.session.add(Message(ad_request_id=ad_request.id, sender_id=sponsor.id,
+                                       recipient_id=influencer.id, content='hello'))
+        db.session.commit()
+        return {'admin': admin.id, 'sponsor': sponsor.id, 'influencer': influencers[0].id,
+                'campaign': campaigns[0].id}
+
+
+@pytest.mark.parametrize('role, url', [
+    ('admin', '/admin/users'),
+    ('admin', '/admin/campaigns'),
+    ('admin', '/admin/ad_requests'),
+    ('admin', '/admin/messages'),
+    ('sponsor', '/sponsor/campaigns'),
+    ('sponsor', '/sponsor/ad_requests/{campaign}'),
+    ('influencer', '/influencer/ad_requests'),
+])
+def test_list_view_has_no_n_plus_one(client, login, seeded, no_n_plus_one, role, url):
+    login(seeded[role])
+    response = client.get(url.format(**seeded))
+    assert response.status_code == 200